@@ -1,6 +1,19 @@
 from .base_adapter import GitServerAdapter
-from .github_adapter import GitHubAdapter
-from .gitlab_adapter import GitLabAdapter
-from .bitbucket_adapter import BitbucketAdapter
-from .azure_devops_adapter import AzureDevOpsAdapter
-__all__ = ['GitServerAdapter', 'GitHubAdapter', 'GitLabAdapter', 'BitbucketAdapter', 'AzureDevOpsAdapter']
\ No newline at end of file
+from .registry import available_adapters, create_adapter, get_adapter_class, register_adapter
+
+__all__ = ['GitServerAdapter', 'GitHubAdapter', 'GitLabAdapter', 'BitbucketAdapter', 'AzureDevOpsAdapter',
+           'available_adapters', 'create_adapter', 'get_adapter_class', 'register_adapter']
+
+_CLASSES = {
+    'GitHubAdapter': 'github',
+    'GitLabAdapter': 'gitlab',
+    'BitbucketAdapter': 'bitbucket',
+    'AzureDevOpsAdapter': 'azure',
+}
+
+
+def __getattr__(name):
+    # Adapters pull in requests, so each is loaded only when it is used
+    if name in _CLASSES:
+        return get_adapter_class(_CLASSES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,21 +1,28 @@
 # adapters/azure_devops_adapter.py
 import os
-import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, Union
 from .base_adapter import GitServerAdapter
+from utils.credentials import get_credential_pool, parse_tokens
+from utils.http import AuthSession
 from utils.logger import get_logger
 
 class AzureDevOpsAdapter(GitServerAdapter):
     """Adapter for Azure DevOps"""
     
-    def __init__(self, token: str = None, org_url: str = None):
-        self.token = token or os.environ.get('AZURE_DEVOPS_TOKEN')
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'AzureDevOpsAdapter':
+        return cls(options.get('azure_devops_token'), options.get('azure_devops_org_url'))
+    
+    def __init__(self, token: Union[str, List[str]] = None, org_url: str = None):
+        # Several tokens (a list or "tok1,tok2") are pooled and requests spread across them
+        tokens = parse_tokens(token or os.environ.get('AZURE_DEVOPS_TOKEN'))
         self.org_url = org_url or os.environ.get('AZURE_DEVOPS_ORG_URL')
-        self.headers = {
-            'Authorization': f'Basic {self.token}',
-            'Accept': 'application/json'
-        }
+        # Shared with every other adapter using these tokens, so quota and benched tokens are known process-wide
+        self.credentials = get_credential_pool(self.org_url, tokens, 'Authorization', 'Basic {token}', 'azure')
+        self.token = tokens[0] if tokens else None
+        self.headers = {'Accept': 'application/json'}
         self.logger = get_logger()
+        self.session = AuthSession(self.credentials)
     
     def search_prs(self, query: str, state: str = "active", limit: int = 10) -> List[Dict[str, Any]]:
         """Search for pull requests across Azure DevOps"""
@@ -27,7 +34,7 @@ class AzureDevOpsAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Searching Azure DevOps PRs with query: {query}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -62,7 +69,7 @@ class AzureDevOpsAdapter(GitServerAdapter):
         if not username:
             # Get authenticated user's PRs
             user_url = f"{self.org_url}/_apis/user"
-            user_response = requests.get(user_url, headers=self.headers)
+            user_response = self.session.get(user_url, headers=self.headers)
             user_response.raise_for_status()
             user_data = user_response.json()
             username = user_data['displayName']
@@ -75,7 +82,7 @@ class AzureDevOpsAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs for user: {username}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -113,7 +120,7 @@ class AzureDevOpsAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs from repository: {repo_name}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -141,32 +148,54 @@ class AzureDevOpsAdapter(GitServerAdapter):
     def get_pr_details(self, repo_url: str, pr_id: int) -> Dict[str, Any]:
         repo_name = repo_url.split('/')[-1].replace('.git', '')
         url = f"{self.org_url}/_apis/git/repositories/{repo_name}/pullrequests/{pr_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         return response.json()
     
     def get_diff(self, repo_url: str, pr_id: int) -> str:
         repo_name = repo_url.split('/')[-1].replace('.git', '')
         url = f"{self.org_url}/_apis/git/repositories/{repo_name}/pullrequests/{pr_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         
         # Azure DevOps doesn't provide a direct diff endpoint, so we generate it from commits
-        pr_details = response.json()
-        target_commit = pr_details['lastMergeTargetCommit']['commitId']
-        source_commit = pr_details['lastMergeSourceCommit']['commitId']
-        
+        target_commit, source_commit = self.get_pr_shas(response.json())
+        return self.get_compare_diff(repo_url, target_commit, source_commit)
+    
+    def get_pr_shas(self, pr_details: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        base = pr_details.get('lastMergeTargetCommit', {}).get('commitId')
+        head = pr_details.get('lastMergeSourceCommit', {}).get('commitId')
+        return base, head
+    
+    def get_pr_author(self, pr_details: Dict[str, Any]) -> Optional[str]:
+        return (pr_details.get('createdBy') or {}).get('uniqueName')
+    
+    def get_compare_diff(self, repo_url: str, base_sha: str, head_sha: str) -> str:
+        repo_name = repo_url.split('/')[-1].replace('.git', '')
         diff_url = f"{self.org_url}/_apis/git/repositories/{repo_name}/diffs/commits"
         diff_params = {
-            'baseVersion': target_commit,
-            'targetVersion': source_commit,
+            'baseVersion': base_sha,
+            'targetVersion': head_sha,
             'diffCommonCommit': True
         }
         
-        diff_response = requests.get(diff_url, headers=self.headers, params=diff_params)
+        diff_response = self.session.get(diff_url, headers=self.headers, params=diff_params)
         diff_response.raise_for_status()
         return diff_response.text
     
+    def get_pr_refs(self, pr_id: int, pr_details: Dict[str, Any]) -> List[str]:
+        return [pr_details['sourceRefName'], pr_details['targetRefName']]
+    
+    def git_remote_url(self, repo_url: str) -> Optional[str]:
+        if not self.org_url:
+            return None
+        repo_name = repo_url.split('/')[-1].replace('.git', '')
+        return f"{self.org_url.rstrip('/')}/_git/{repo_name}"
+    
+    def git_auth_header(self) -> Optional[str]:
+        token = self.credentials.best_token()
+        return f'Basic {token}' if token else None
+    
     def post_comment(self, repo_url: str, pr_id: int, comment: str, path: str = None, line: int = None):
         repo_name = repo_url.split('/')[-1].replace('.git', '')
         url = f"{self.org_url}/_apis/git/repositories/{repo_name}/pullrequests/{pr_id}/threads"
@@ -195,6 +224,6 @@ class AzureDevOpsAdapter(GitServerAdapter):
                 }
             }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self.session.post(url, headers=self.headers, json=payload)
         response.raise_for_status()
         return response.json()
\ No newline at end of file
@@ -1,10 +1,17 @@
 # adapters/base_adapter.py
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from utils.credentials import rate_limit_from_headers
+
 
 class GitServerAdapter(ABC):
     """Abstract base class for git server adapters"""
     
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'GitServerAdapter':
+        """Build the adapter from PRReviewAgent keyword arguments (e.g. ``github_token``)"""
+        return cls()
+    
     @abstractmethod
     def get_pr_details(self, repo_url: str, pr_id: int) -> Dict[str, Any]:
         pass
@@ -13,6 +20,55 @@ class GitServerAdapter(ABC):
     def get_diff(self, repo_url: str, pr_id: int) -> str:
         pass
     
+    def iter_diff_chunks(self, repo_url: str, pr_id: int) -> Iterator[bytes]:
+        """The PR diff as a stream of byte chunks, so huge diffs need not be held in memory"""
+        yield self.get_diff(repo_url, pr_id).encode('utf-8')
+    
+    def get_pr_shas(self, pr_details: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """Base and head commit SHAs from get_pr_details output"""
+        return None, None
+    
+    def get_pr_author(self, pr_details: Dict[str, Any]) -> Optional[str]:
+        """Login of the PR author from get_pr_details output"""
+        return None
+    
+    def get_pr_size(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Optional[int]]]:
+        """Lines added and deleted and files changed (``additions``, ``deletions``, ``files``; None if unknown)"""
+        return None
+    
+    def pr_size_from_details(self, pr_details: Dict[str, Any]) -> Optional[Dict[str, Optional[int]]]:
+        """get_pr_size output from get_pr_details output, or None if the server does not include it there"""
+        return None
+    
+    def get_compare_diff(self, repo_url: str, base_sha: str, head_sha: str) -> str:
+        """Unified diff between two commits, e.g. the interdiff between two reviewed heads"""
+        raise NotImplementedError(f"{type(self).__name__} cannot compare commits")
+    
+    def get_pr_refs(self, pr_id: int, pr_details: Dict[str, Any]) -> List[str]:
+        """Git refs holding the PR head and base, for fetching into a local mirror"""
+        return []
+    
+    def poll_prs(self, repo_url: str, since: Optional[str] = None, etag: Optional[str] = None) -> Dict[str, Any]:
+        """Open PRs updated after ``since`` (the server's ``updated_at`` format), for watch mode.
+        
+        Sends ``etag`` as If-None-Match. Returns ``prs`` (each with ``id``,
+        ``head_sha``, ``updated_at`` and ``title``), the new ``etag``,
+        ``not_modified`` when the server answered 304, and ``rate_limit``.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot poll for PR changes")
+    
+    def git_remote_url(self, repo_url: str) -> Optional[str]:
+        """HTTPS clone URL of ``repo_url`` on this adapter's configured host, or None if git fetches are unsupported.
+        
+        Only the owner and repository name are taken from ``repo_url``, so a
+        caller-supplied URL can never send the token to another host.
+        """
+        return None
+    
+    def git_auth_header(self) -> Optional[str]:
+        """Authorization header value for git over HTTPS, if a token is configured"""
+        return None
+    
     @abstractmethod
     def post_comment(self, repo_url: str, pr_id: int, comment: str, path: str = None, line: int = None):
         pass
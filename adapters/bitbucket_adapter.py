@@ -1,21 +1,29 @@
 # adapters/bitbucket_adapter.py
 import os
-import requests
-from typing import Dict, Any, List
+import base64
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
 from .base_adapter import GitServerAdapter
+from utils.credentials import get_credential_pool, parse_tokens
+from utils.http import AuthSession
 from utils.logger import get_logger
 
 class BitbucketAdapter(GitServerAdapter):
     """Adapter for Bitbucket Cloud and Server"""
     
-    def __init__(self, token: str = None, base_url: str = "https://api.bitbucket.org/2.0"):
-        self.token = token or os.environ.get('BITBUCKET_TOKEN')
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'BitbucketAdapter':
+        return cls(options.get('bitbucket_token'), options.get('bitbucket_url', 'https://api.bitbucket.org/2.0'))
+    
+    def __init__(self, token: Union[str, List[str]] = None, base_url: str = "https://api.bitbucket.org/2.0"):
+        # Several tokens (a list or "tok1,tok2") are pooled and requests spread across them
+        tokens = parse_tokens(token or os.environ.get('BITBUCKET_TOKEN'))
         self.base_url = base_url.rstrip('/')
-        self.headers = {
-            'Authorization': f'Bearer {self.token}',
-            'Accept': 'application/json'
-        }
+        # Shared with every other adapter using these tokens, so quota and benched tokens are known process-wide
+        self.credentials = get_credential_pool(self.base_url, tokens, 'Authorization', 'Bearer {token}', 'bitbucket')
+        self.token = tokens[0] if tokens else None
+        self.headers = {'Accept': 'application/json'}
         self.logger = get_logger()
+        self.session = AuthSession(self.credentials)
     
     def search_prs(self, query: str, state: str = "OPEN", limit: int = 10) -> List[Dict[str, Any]]:
         """Search for pull requests across Bitbucket"""
@@ -27,7 +35,7 @@ class BitbucketAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Searching Bitbucket PRs with query: {query}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -59,7 +67,7 @@ class BitbucketAdapter(GitServerAdapter):
         if not username:
             # Get authenticated user's PRs
             user_url = f"{self.base_url}/user"
-            user_response = requests.get(user_url, headers=self.headers)
+            user_response = self.session.get(user_url, headers=self.headers)
             user_response.raise_for_status()
             user_data = user_response.json()
             username = user_data['username']
@@ -72,7 +80,7 @@ class BitbucketAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs for user: {username}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -113,7 +121,7 @@ class BitbucketAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs from {owner}/{repo}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -142,7 +150,7 @@ class BitbucketAdapter(GitServerAdapter):
         repo = parts[-1].replace('.git', '')
         
         url = f"{self.base_url}/repositories/{owner}/{repo}/pullrequests/{pr_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         return response.json()
     
@@ -152,10 +160,73 @@ class BitbucketAdapter(GitServerAdapter):
         repo = parts[-1].replace('.git', '')
         
         url = f"{self.base_url}/repositories/{owner}/{repo}/pullrequests/{pr_id}/diff"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         return response.text
     
+    def iter_diff_chunks(self, repo_url: str, pr_id: int) -> Iterator[bytes]:
+        parts = repo_url.rstrip('/').split('/')
+        owner = parts[-2]
+        repo = parts[-1].replace('.git', '')
+        
+        url = f"{self.base_url}/repositories/{owner}/{repo}/pullrequests/{pr_id}/diff"
+        with self.session.get(url, headers=self.headers, stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=1 << 16)
+    
+    def get_pr_shas(self, pr_details: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        base = pr_details.get('destination', {}).get('commit', {}).get('hash')
+        head = pr_details.get('source', {}).get('commit', {}).get('hash')
+        return base, head
+    
+    def get_pr_author(self, pr_details: Dict[str, Any]) -> Optional[str]:
+        author = pr_details.get('author') or {}
+        return author.get('nickname') or author.get('display_name')
+    
+    def get_pr_size(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Optional[int]]]:
+        parts = repo_url.rstrip('/').split('/')
+        owner = parts[-2]
+        repo = parts[-1].replace('.git', '')
+        
+        # The first page is enough to tell a small PR from a huge one
+        url = f"{self.base_url}/repositories/{owner}/{repo}/pullrequests/{pr_id}/diffstat"
+        response = self.session.get(url, headers=self.headers, params={'pagelen': 500})
+        response.raise_for_status()
+        page = response.json()
+        files = page.get('values', [])
+        return {'additions': sum(item.get('lines_added') or 0 for item in files),
+                'deletions': sum(item.get('lines_removed') or 0 for item in files),
+                'files': page.get('size') or len(files)}
+    
+    def get_compare_diff(self, repo_url: str, base_sha: str, head_sha: str) -> str:
+        parts = repo_url.rstrip('/').split('/')
+        owner = parts[-2]
+        repo = parts[-1].replace('.git', '')
+        
+        # Bitbucket diff specs name the newer commit first
+        url = f"{self.base_url}/repositories/{owner}/{repo}/diff/{head_sha}..{base_sha}"
+        response = self.session.get(url, headers=self.headers)
+        response.raise_for_status()
+        return response.text
+    
+    def get_pr_refs(self, pr_id: int, pr_details: Dict[str, Any]) -> List[str]:
+        # Bitbucket has no pull request refs, so fetch both branches
+        return [f"refs/heads/{pr_details['source']['branch']['name']}",
+                f"refs/heads/{pr_details['destination']['branch']['name']}"]
+    
+    def git_remote_url(self, repo_url: str) -> Optional[str]:
+        if self.base_url != "https://api.bitbucket.org/2.0":
+            # Clone URLs of other Bitbucket installations cannot be derived from the API URL
+            return None
+        parts = repo_url.rstrip('/').split('/')
+        return f"https://bitbucket.org/{parts[-2]}/{parts[-1].replace('.git', '')}.git"
+    
+    def git_auth_header(self) -> Optional[str]:
+        token = self.credentials.best_token()
+        if not token:
+            return None
+        return "Basic " + base64.b64encode(f"x-token-auth:{token}".encode()).decode()
+    
     def post_comment(self, repo_url: str, pr_id: int, comment: str, path: str = None, line: int = None):
         parts = repo_url.rstrip('/').split('/')
         owner = parts[-2]
@@ -175,6 +246,6 @@ class BitbucketAdapter(GitServerAdapter):
                 "to": line
             }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self.session.post(url, headers=self.headers, json=payload)
         response.raise_for_status()
         return response.json()
\ No newline at end of file
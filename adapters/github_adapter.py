@@ -1,27 +1,35 @@
 import os
-import requests
-from typing import Dict, Any, Tuple, List
-from .base_adapter import GitServerAdapter
+import base64
+from typing import Dict, Any, Iterator, Tuple, List, Optional, Union
+from .base_adapter import GitServerAdapter, rate_limit_from_headers
+from utils.credentials import get_credential_pool, parse_tokens
+from utils.http import AuthSession
 from utils.logger import get_logger
 
 class GitHubAdapter(GitServerAdapter):
     """Adapter for GitHub"""
     
-    def __init__(self, token: str = None):
-        self.token = token or os.environ.get('GITHUB_TOKEN')
-        self.headers = {
-            'Authorization': f'token {self.token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        self.logger = get_logger()
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'GitHubAdapter':
+        return cls(options.get('github_token'))
+    
+    def __init__(self, token: Union[str, List[str]] = None):
+        # Several tokens (a list or "tok1,tok2") are pooled and requests spread across them
+        tokens = parse_tokens(token or os.environ.get('GITHUB_TOKEN'))
         self.base_url = "https://api.github.com"
+        # Shared with every other adapter using these tokens, so quota and benched tokens are known process-wide
+        self.credentials = get_credential_pool(self.base_url, tokens, 'Authorization', 'token {token}', 'github')
+        self.token = tokens[0] if tokens else None
+        self.headers = {'Accept': 'application/vnd.github.v3+json'}
+        self.logger = get_logger()
+        self.session = AuthSession(self.credentials)
     
     def get_pr_details(self, repo_url: str, pr_id: int) -> Dict[str, Any]:
         owner, repo = self._parse_repo_url(repo_url)
         url = f"{self.base_url}/repos/{owner}/{repo}/pulls/{pr_id}"
         
         self.logger.debug(f"Fetching PR details from {url}")
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         return response.json()
     
@@ -31,10 +39,56 @@ class GitHubAdapter(GitServerAdapter):
         headers = {**self.headers, 'Accept': 'application/vnd.github.v3.diff'}
         
         self.logger.debug(f"Fetching diff from {url}")
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         response.raise_for_status()
         return response.text
     
+    def iter_diff_chunks(self, repo_url: str, pr_id: int) -> Iterator[bytes]:
+        owner, repo = self._parse_repo_url(repo_url)
+        url = f"{self.base_url}/repos/{owner}/{repo}/pulls/{pr_id}"
+        headers = {**self.headers, 'Accept': 'application/vnd.github.v3.diff'}
+        
+        self.logger.debug(f"Streaming diff from {url}")
+        with self.session.get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=1 << 16)
+    
+    def get_pr_shas(self, pr_details: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        return pr_details.get('base', {}).get('sha'), pr_details.get('head', {}).get('sha')
+    
+    def get_pr_author(self, pr_details: Dict[str, Any]) -> Optional[str]:
+        return (pr_details.get('user') or {}).get('login')
+    
+    def get_pr_size(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Optional[int]]]:
+        return self.pr_size_from_details(self.get_pr_details(repo_url, pr_id))
+    
+    def pr_size_from_details(self, pr_details: Dict[str, Any]) -> Optional[Dict[str, Optional[int]]]:
+        return {'additions': pr_details.get('additions'), 'deletions': pr_details.get('deletions'),
+                'files': pr_details.get('changed_files')}
+    
+    def get_compare_diff(self, repo_url: str, base_sha: str, head_sha: str) -> str:
+        owner, repo = self._parse_repo_url(repo_url)
+        url = f"{self.base_url}/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}"
+        headers = {**self.headers, 'Accept': 'application/vnd.github.v3.diff'}
+        
+        self.logger.debug(f"Fetching compare diff from {url}")
+        response = self.session.get(url, headers=headers)
+        response.raise_for_status()
+        return response.text
+    
+    def get_pr_refs(self, pr_id: int, pr_details: Dict[str, Any]) -> List[str]:
+        return [f"refs/pull/{pr_id}/head", f"refs/heads/{pr_details['base']['ref']}"]
+    
+    def git_remote_url(self, repo_url: str) -> Optional[str]:
+        owner, repo = self._parse_repo_url(repo_url)
+        return f"https://github.com/{owner}/{repo}.git"
+    
+    def git_auth_header(self) -> Optional[str]:
+        token = self.credentials.best_token()
+        if not token:
+            return None
+        return "Basic " + base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    
     def post_comment(self, repo_url: str, pr_id: int, comment: str, path: str = None, line: int = None):
         owner, repo = self._parse_repo_url(repo_url)
         
@@ -50,7 +104,7 @@ class GitHubAdapter(GitServerAdapter):
             url = f"{self.base_url}/repos/{owner}/{repo}/issues/{pr_id}/comments"
             
         self.logger.debug(f"Posting comment to {url}")
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self.session.post(url, headers=self.headers, json=payload)
         response.raise_for_status()
         return response.json()
     
@@ -65,7 +119,7 @@ class GitHubAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Searching PRs with query: {query}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -96,7 +150,7 @@ class GitHubAdapter(GitServerAdapter):
         if not username:
             # Get authenticated user's PRs
             url = f"{self.base_url}/user"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers)
             response.raise_for_status()
             user_data = response.json()
             username = user_data['login']
@@ -116,7 +170,7 @@ class GitHubAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs from {owner}/{repo}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
@@ -136,6 +190,38 @@ class GitHubAdapter(GitServerAdapter):
         
         return results
     
+    def poll_prs(self, repo_url: str, since: Optional[str] = None, etag: Optional[str] = None) -> Dict[str, Any]:
+        owner, repo = self._parse_repo_url(repo_url)
+        url = f"{self.base_url}/repos/{owner}/{repo}/pulls"
+        params = {'state': 'open', 'sort': 'updated', 'direction': 'desc', 'per_page': 100}
+        # GitHub does not charge 304 answers to the rate limit
+        headers = {**self.headers, 'If-None-Match': etag} if etag else self.headers
+        
+        response = self.session.get(url, headers=headers, params=params)
+        # The pool's combined quota when several tokens share the load
+        rate_limit = self.credentials.rate_limit() or rate_limit_from_headers(response.headers)
+        if response.status_code == 304:
+            return {'prs': [], 'etag': etag, 'not_modified': True, 'rate_limit': rate_limit}
+        response.raise_for_status()
+        new_etag = response.headers.get('ETag')
+        
+        prs = []
+        while True:
+            page = response.json()
+            for pr in page:
+                # Sorted by update time, so the first PR older than ``since`` ends the scan
+                if since and pr['updated_at'] < since:
+                    return {'prs': prs, 'etag': new_etag, 'not_modified': False, 'rate_limit': rate_limit}
+                prs.append({'id': pr['number'], 'head_sha': pr['head']['sha'], 'updated_at': pr['updated_at'],
+                            'title': pr['title']})
+            next_url = response.links.get('next', {}).get('url')
+            if not next_url or not page:
+                break
+            response = self.session.get(next_url, headers=self.headers)
+            response.raise_for_status()
+            rate_limit = self.credentials.rate_limit() or rate_limit_from_headers(response.headers) or rate_limit
+        return {'prs': prs, 'etag': new_etag, 'not_modified': False, 'rate_limit': rate_limit}
+    
     def _parse_repo_url(self, repo_url: str) -> Tuple[str, str]:
         # Convert https://github.com/owner/repo.git to (owner, repo)
         parts = repo_url.rstrip('/').replace('.git', '').split('/')
@@ -1,24 +1,42 @@
 import os
+import time
+import base64
 import requests
-from typing import Dict, Any, List
-from .base_adapter import GitServerAdapter
+from typing import Dict, Any, List, Optional, Tuple, Union
+from .base_adapter import GitServerAdapter, rate_limit_from_headers
+from utils.credentials import get_credential_pool, parse_tokens
+from utils.http import AuthSession
+from utils.cache import LRUCache
 from utils.logger import get_logger
 
+# Project renames are rare; an hour of staleness only affects displayed names
+PROJECT_CACHE_TTL = 3600
+_projects = LRUCache(512)
+
 class GitLabAdapter(GitServerAdapter):
     """Adapter for GitLab"""
     
-    def __init__(self, token: str = None, base_url: str = "https://gitlab.com"):
-        self.token = token or os.environ.get('GITLAB_TOKEN')
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'GitLabAdapter':
+        return cls(options.get('gitlab_token'), options.get('gitlab_url', 'https://gitlab.com'))
+    
+    def __init__(self, token: Union[str, List[str]] = None, base_url: str = "https://gitlab.com"):
+        # Several tokens (a list or "tok1,tok2") are pooled and requests spread across them
+        tokens = parse_tokens(token or os.environ.get('GITLAB_TOKEN'))
         self.base_url = base_url.rstrip('/')
-        self.headers = {'Private-Token': self.token}
+        # Shared with every other adapter using these tokens, so quota and benched tokens are known process-wide
+        self.credentials = get_credential_pool(self.base_url, tokens, 'Private-Token', '{token}', 'gitlab')
+        self.token = tokens[0] if tokens else None
+        self.headers = {}
         self.logger = get_logger()
+        self.session = AuthSession(self.credentials)
     
     def get_pr_details(self, repo_url: str, pr_id: int) -> Dict[str, Any]:
         project_id = self._parse_repo_url(repo_url)
         url = f"{self.base_url}/api/v4/projects/{project_id}/merge_requests/{pr_id}"
         
         self.logger.debug(f"Fetching PR details from {url}")
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         return response.json()
     
@@ -27,19 +45,60 @@ class GitLabAdapter(GitServerAdapter):
         url = f"{self.base_url}/api/v4/projects/{project_id}/merge_requests/{pr_id}/changes"
         
         self.logger.debug(f"Fetching diff from {url}")
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
         changes = response.json()
         
+        return self._format_changes(changes.get('changes', []))
+    
+    def get_pr_shas(self, pr_details: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        diff_refs = pr_details.get('diff_refs') or {}
+        return diff_refs.get('base_sha'), diff_refs.get('head_sha') or pr_details.get('sha')
+    
+    def get_pr_author(self, pr_details: Dict[str, Any]) -> Optional[str]:
+        return (pr_details.get('author') or {}).get('username')
+    
+    def get_pr_size(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Optional[int]]]:
+        return self.pr_size_from_details(self.get_pr_details(repo_url, pr_id))
+    
+    def pr_size_from_details(self, pr_details: Dict[str, Any]) -> Optional[Dict[str, Optional[int]]]:
+        # GitLab reports no line counts, and caps the file count as e.g. "1000+"
+        changes = str(pr_details.get('changes_count') or '').rstrip('+')
+        return {'additions': None, 'deletions': None, 'files': int(changes) if changes.isdigit() else None}
+    
+    def get_compare_diff(self, repo_url: str, base_sha: str, head_sha: str) -> str:
+        project_id = self._parse_repo_url(repo_url)
+        url = f"{self.base_url}/api/v4/projects/{project_id}/repository/compare"
+        params = {'from': base_sha, 'to': head_sha}
+        
+        self.logger.debug(f"Fetching compare diff from {url}")
+        response = self.session.get(url, headers=self.headers, params=params)
+        response.raise_for_status()
+        return self._format_changes(response.json().get('diffs', []))
+    
+    def _format_changes(self, changes: List[Dict[str, Any]]) -> str:
         # Format changes as a unified diff
         diff_lines = []
-        for change in changes.get('changes', []):
+        for change in changes:
             diff_lines.append(f"--- a/{change['old_path']}")
             diff_lines.append(f"+++ b/{change['new_path']}")
             diff_lines.extend(change['diff'].split('\n'))
         
         return '\n'.join(diff_lines)
     
+    def get_pr_refs(self, pr_id: int, pr_details: Dict[str, Any]) -> List[str]:
+        return [f"refs/merge-requests/{pr_id}/head", f"refs/heads/{pr_details['target_branch']}"]
+    
+    def git_remote_url(self, repo_url: str) -> Optional[str]:
+        parts = repo_url.replace('.git', '').strip('/').split('/')
+        return f"{self.base_url}/{parts[-2]}/{parts[-1]}.git"
+    
+    def git_auth_header(self) -> Optional[str]:
+        token = self.credentials.best_token()
+        if not token:
+            return None
+        return "Basic " + base64.b64encode(f"oauth2:{token}".encode()).decode()
+    
     def post_comment(self, repo_url: str, pr_id: int, comment: str, path: str = None, line: int = None):
         project_id = self._parse_repo_url(repo_url)
         url = f"{self.base_url}/api/v4/projects/{project_id}/merge_requests/{pr_id}/notes"
@@ -58,7 +117,7 @@ class GitLabAdapter(GitServerAdapter):
             }
             
         self.logger.debug(f"Posting comment to {url}")
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self.session.post(url, headers=self.headers, json=payload)
         response.raise_for_status()
         return response.json()
     
@@ -76,24 +135,13 @@ class GitLabAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Searching PRs with query: {query}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
         for mr in response.json():
             # Get project details to extract repo info
-            project_url = f"{self.base_url}/api/v4/projects/{mr['project_id']}"
-            project_response = requests.get(project_url, headers=self.headers)
-            
-            if project_response.status_code == 200:
-                project = project_response.json()
-                repo_name = project['name']
-                repo_owner = project['namespace']['full_path']
-                repo_url = project['web_url']
-            else:
-                repo_name = f"project-{mr['project_id']}"
-                repo_owner = "unknown"
-                repo_url = f"{self.base_url}/projects/{mr['project_id']}"
+            repo_owner, repo_name, repo_url = self._project_info(mr['project_id'])
             
             results.append({
                 'id': mr['iid'],
@@ -115,7 +163,7 @@ class GitLabAdapter(GitServerAdapter):
         if not username:
             # Get authenticated user's PRs
             url = f"{self.base_url}/api/v4/user"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers)
             response.raise_for_status()
             user_data = response.json()
             username = user_data['username']
@@ -131,24 +179,13 @@ class GitLabAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs for user: {username}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         results = []
         for mr in response.json():
             # Get project details
-            project_url = f"{self.base_url}/api/v4/projects/{mr['project_id']}"
-            project_response = requests.get(project_url, headers=self.headers)
-            
-            if project_response.status_code == 200:
-                project = project_response.json()
-                repo_name = project['name']
-                repo_owner = project['namespace']['full_path']
-                repo_url = project['web_url']
-            else:
-                repo_name = f"project-{mr['project_id']}"
-                repo_owner = "unknown"
-                repo_url = f"{self.base_url}/projects/{mr['project_id']}"
+            repo_owner, repo_name, repo_url = self._project_info(mr['project_id'])
             
             results.append({
                 'id': mr['iid'],
@@ -178,22 +215,11 @@ class GitLabAdapter(GitServerAdapter):
         }
         
         self.logger.debug(f"Fetching PRs from project: {project_id}")
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.session.get(url, headers=self.headers, params=params)
         response.raise_for_status()
         
         # Get project details
-        project_url = f"{self.base_url}/api/v4/projects/{project_id}"
-        project_response = requests.get(project_url, headers=self.headers)
-        
-        if project_response.status_code == 200:
-            project = project_response.json()
-            repo_name = project['name']
-            repo_owner = project['namespace']['full_path']
-            repo_url = project['web_url']
-        else:
-            repo_name = f"project-{project_id}"
-            repo_owner = "unknown"
-            repo_url = f"{self.base_url}/projects/{project_id}"
+        repo_owner, repo_name, repo_url = self._project_info(project_id)
         
         results = []
         for mr in response.json():
@@ -212,6 +238,52 @@ class GitLabAdapter(GitServerAdapter):
         
         return results
     
+    def poll_prs(self, repo_url: str, since: Optional[str] = None, etag: Optional[str] = None) -> Dict[str, Any]:
+        project_id = self._parse_repo_url(repo_url)
+        url = f"{self.base_url}/api/v4/projects/{project_id}/merge_requests"
+        params = {'state': 'opened', 'order_by': 'updated_at', 'sort': 'desc', 'per_page': 100}
+        if since:
+            params['updated_after'] = since
+        headers = {**self.headers, 'If-None-Match': etag} if etag else self.headers
+        
+        response = self.session.get(url, headers=headers, params=params)
+        # The pool's combined quota when several tokens share the load
+        rate_limit = self.credentials.rate_limit() or rate_limit_from_headers(response.headers)
+        if response.status_code == 304:
+            return {'prs': [], 'etag': etag, 'not_modified': True, 'rate_limit': rate_limit}
+        response.raise_for_status()
+        new_etag = response.headers.get('ETag')
+        
+        prs = []
+        while True:
+            for mr in response.json():
+                prs.append({'id': mr['iid'], 'head_sha': mr.get('sha'), 'updated_at': mr['updated_at'],
+                            'title': mr['title']})
+            next_page = response.headers.get('X-Next-Page')
+            if not next_page:
+                break
+            response = self.session.get(url, headers=self.headers, params={**params, 'page': next_page})
+            response.raise_for_status()
+            rate_limit = self.credentials.rate_limit() or rate_limit_from_headers(response.headers) or rate_limit
+        return {'prs': prs, 'etag': new_etag, 'not_modified': False, 'rate_limit': rate_limit}
+    
+    def _project_info(self, project_id) -> Tuple[str, str, str]:
+        """Namespace, name and web URL of a project; lists of MRs share a few projects, so lookups are cached"""
+        key = f"{self.base_url}/{project_id}"
+        info = _projects.get(key)
+        if info is not None:
+            return info
+        
+        project_url = f"{self.base_url}/api/v4/projects/{project_id}"
+        project_response = self.session.get(project_url, headers=self.headers)
+        if project_response.status_code != 200:
+            return "unknown", f"project-{project_id}", f"{self.base_url}/projects/{project_id}"
+        
+        project = project_response.json()
+        info = (project['namespace']['full_path'], project['name'], project['web_url'])
+        _projects.set(key, info, time.time() + PROJECT_CACHE_TTL)
+        return info
+    
     def _parse_repo_url(self, repo_url: str) -> str:
         # Convert https://gitlab.com/owner/repo.git to URL-encoded project ID
         parts = repo_url.replace('.git', '').strip('/').split('/')
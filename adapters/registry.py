@@ -0,0 +1,66 @@
+import importlib
+from typing import Any, Dict, List, Type, Union
+from .base_adapter import GitServerAdapter
+
+# Third-party packages add servers by declaring an entry point in this group, e.g.
+#   [project.entry-points."pr_review_agent.adapters"]
+#   gitea = "pr_review_gitea:GiteaAdapter"
+ENTRY_POINT_GROUP = 'pr_review_agent.adapters'
+
+# "module:Class", imported on first use so a run only loads the adapter it needs
+BUILTIN_ADAPTERS = {
+    'github': 'adapters.github_adapter:GitHubAdapter',
+    'gitlab': 'adapters.gitlab_adapter:GitLabAdapter',
+    'bitbucket': 'adapters.bitbucket_adapter:BitbucketAdapter',
+    'azure': 'adapters.azure_devops_adapter:AzureDevOpsAdapter',
+}
+
+_adapters: Dict[str, Union[str, Type[GitServerAdapter]]] = dict(BUILTIN_ADAPTERS)
+_plugins_loaded = False
+
+
+def register_adapter(name: str, adapter: Union[str, Type[GitServerAdapter]]):
+    """Make ``adapter`` (a class or a "module:Class" path) available as git server ``name``"""
+    _adapters[name.lower()] = adapter
+
+
+def _load_plugins():
+    """Add adapters declared as entry points; scanning installed packages is slow, so only on demand"""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    from importlib import metadata
+    try:
+        entry_points = metadata.entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python < 3.10
+        entry_points = metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+    for entry_point in entry_points:
+        _adapters.setdefault(entry_point.name.lower(), entry_point.value)
+
+
+def available_adapters() -> List[str]:
+    """Names of built-in and plugin git servers"""
+    _load_plugins()
+    return list(_adapters)
+
+
+def get_adapter_class(name: str) -> Type[GitServerAdapter]:
+    name = name.lower()
+    if name not in _adapters:
+        _load_plugins()
+    if name not in _adapters:
+        raise ValueError(f"Unsupported git server: {name} (available: {', '.join(available_adapters())})")
+
+    adapter = _adapters[name]
+    if isinstance(adapter, str):
+        module_name, _, class_name = adapter.partition(':')
+        adapter = getattr(importlib.import_module(module_name), class_name)
+        _adapters[name] = adapter
+    return adapter
+
+
+def create_adapter(name: str, options: Dict[str, Any]) -> GitServerAdapter:
+    """Instantiate the adapter for ``name`` from PRReviewAgent keyword arguments"""
+    return get_adapter_class(name).from_options(options)
@@ -1,6 +1,15 @@
 from .base_analyzer import BaseAnalyzer
 from .static_analyzer import StaticAnalyzer
-from .gemini_analyzer import GeminiAnalyzer
+from .noise_filter import NoiseFilter
+from .router import HunkRouter
 from .code_analyzer import CodeAnalyzer
 
-__all__ = ['BaseAnalyzer', 'StaticAnalyzer', 'GeminiAnalyzer', 'CodeAnalyzer']
\ No newline at end of file
+__all__ = ['BaseAnalyzer', 'StaticAnalyzer', 'GeminiAnalyzer', 'NoiseFilter', 'HunkRouter', 'CodeAnalyzer']
+
+
+def __getattr__(name):
+    # The LLM stack pulls in requests, so load it only when it is used
+    if name == 'GeminiAnalyzer':
+        from .gemini_analyzer import GeminiAnalyzer
+        return GeminiAnalyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
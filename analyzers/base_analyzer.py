@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List
+from models import Feedback
 
 class BaseAnalyzer(ABC):
     
     @abstractmethod
-    def analyze(self, diff: str) -> List[Dict[str, Any]]:
+    def analyze(self, diff: str) -> List[Feedback]:
         pass
\ No newline at end of file
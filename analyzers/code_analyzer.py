@@ -1,44 +1,130 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Set, Union
 from .static_analyzer import StaticAnalyzer
-from .gemini_analyzer import GeminiAnalyzer
+from .noise_filter import NoiseFilter
+from .router import HunkRouter
+from models import Feedback, FeedbackBatch
+from utils.diff_parser import Hunk, parse_hunks
+from utils.mapped_diff import MappedDiff, MappedSections, iter_sections
+from utils.metrics import span
+from utils.usage import summarize_calls
 from utils.logger import get_logger
 
 class CodeAnalyzer:
     
-    def __init__(self, gemini_api_key: str = None, verbose: bool = False):
+    def __init__(self, gemini_api_key: str = None, verbose: bool = False, use_ai: bool = True):
         self.static_analyzer = StaticAnalyzer()
-        self.gemini_analyzer = GeminiAnalyzer(gemini_api_key)
+        self.gemini_analyzer = None
+        if use_ai:
+            from .gemini_analyzer import GeminiAnalyzer
+            self.gemini_analyzer = GeminiAnalyzer(gemini_api_key)
+        self.noise_filter = NoiseFilter.from_env()
+        self.router = HunkRouter.from_env()
         self.logger = get_logger()
         self.verbose = verbose
+        # Per-stage details of the most recent analyze_diff call
+        self.report: Dict[str, Any] = {}
+        # AI findings of the most recent analyze_diff call, fresh and reused
+        self.ai_feedback: List[Feedback] = []
+        # Paths of the most recent analyze_diff call the LLM reviewed in full (or whose findings were reused),
+        # findings or not
+        self.ai_reviewed: Set[str] = set()
+        # Diff the most recent analysis ran on (after noise filtering); static positions refer to it.
+        # Spilled diffs are kept as MappedSections, valid until the caller closes the diff
+        self.analyzed_diff = ''
     
-    def analyze_diff(self, diff: str) -> List[Dict[str, Any]]:
-        feedback = []
+    def analyze_diff(self, diff: Union[str, MappedDiff], reuse: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> FeedbackBatch:
+        return FeedbackBatch(self.iter_diff(diff, reuse))
+    
+    def iter_diff(self, diff: Union[str, MappedDiff], reuse: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Iterator[Feedback]:
+        """Yield unique feedback as it is produced: static findings first, then AI findings.
+        
+        ``reuse`` maps file paths to AI findings from an earlier review in which
+        the file's changes were the same; those files are not sent to the LLM.
+        """
+        seen = set()
+        self.report = {}
+        self.ai_feedback = []
+        self.ai_reviewed = set()
+        
+        if self.noise_filter:
+            with span('noise_filter'):
+                diff, self.report['noise_filter'] = self.noise_filter.filter(diff)
+            skipped = self.report['noise_filter']['files_skipped']
+            if skipped and self.verbose:
+                self.logger.info(f"Skipped {skipped} noisy files "
+                                 f"(~{self.report['noise_filter']['tokens_saved']} tokens)")
+        elif isinstance(diff, MappedDiff):
+            diff = MappedSections(diff)
         
+        self.analyzed_diff = diff
         if self.verbose:
             self.logger.info("Running static analysis")
-        feedback.extend(self.static_analyzer.analyze(diff))
+        with span('static_analysis'):
+            static_feedback = self.static_analyzer.analyze(diff)
+        yield from self._unseen(static_feedback, seen)
         
-        if self.gemini_analyzer.api_key:
+        if self.gemini_analyzer and self.gemini_analyzer.enabled:
+            # One file section at a time, so a spilled diff is never decoded whole
+            hunks = [hunk for first, text in iter_sections(diff) for hunk in parse_hunks(text, first)]
+            reused = set()
+            if reuse is not None:
+                reused = {hunk.path for hunk in hunks if hunk.path in reuse}
+                hunks, carried = self._reuse_findings(hunks, reuse)
+                yield from self._unseen(self._collect_ai(carried), seen)
+            
+            candidates = hunks
+            hunks, self.report['routing'] = self.router.route(hunks, static_feedback, self._llm_cost)
             if self.verbose:
-                self.logger.info("Running AI analysis")
-            feedback.extend(self.gemini_analyzer.analyze(diff))
-        else:
+                self.logger.info(f"Running AI analysis on {len(hunks)}/{self.report['routing']['hunks_total']} hunks")
+            self.gemini_analyzer.reset_usage()
+            try:
+                with span('llm_analysis', hunks=len(hunks)):
+                    yield from self._unseen(self._collect_ai(self.gemini_analyzer.iter_findings(hunks)), seen)
+                self.ai_reviewed = reused | self._reviewed_paths(candidates, hunks)
+            finally:
+                calls = self.gemini_analyzer.reset_usage()
+                self.report['llm_usage'] = {**summarize_calls(calls), 'calls_detail': calls}
+        elif self.gemini_analyzer:
             self.logger.warning("No Gemini API key provided, skipping AI analysis")
-        
-        feedback = self._deduplicate_feedback(feedback)
-        
-        return feedback
     
-    def _deduplicate_feedback(self, feedback: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        seen = set()
-        unique_feedback = []
+    def _reuse_findings(self, hunks: List[Hunk], reuse: Dict[str, List[Dict[str, Any]]]):
+        """Split off hunks of files whose previous AI findings still apply"""
+        paths = {hunk.path for hunk in hunks if hunk.path in reuse}
+        remaining = [hunk for hunk in hunks if hunk.path not in paths]
+        carried = [Feedback.from_dict(item) for path in sorted(paths) for item in reuse[path]]
         
+        self.report['incremental'] = {
+            'files_reused': len(paths),
+            'hunks_reused': len(hunks) - len(remaining),
+            'hunks_analyzed': len(remaining),
+            'findings_reused': len(carried)
+        }
+        if self.verbose:
+            self.logger.info(f"Reusing AI findings for {len(paths)} unchanged files, "
+                             f"analyzing {len(remaining)}/{len(hunks)} hunks")
+        return remaining, carried
+    
+    def _reviewed_paths(self, candidates: List[Hunk], sent: List[Hunk]) -> Set[str]:
+        """Paths all of whose hunks went to the LLM and came back"""
+        sent_ids = {id(hunk) for hunk in sent}
+        partial = {hunk.path for hunk in candidates if id(hunk) not in sent_ids}
+        return {hunk.path for hunk in sent} - partial - self.gemini_analyzer.failed_paths
+    
+    def _collect_ai(self, feedback) -> Iterator[Feedback]:
+        for item in feedback:
+            self.ai_feedback.append(item)
+            yield item
+    
+    def _llm_cost(self, hunk) -> int:
+        """Estimated tokens to send a hunk; cached hunks are free"""
+        if self.gemini_analyzer.is_cached(hunk):
+            return 0
+        return self.gemini_analyzer.estimate_tokens(hunk)
+    
+    def _unseen(self, feedback, seen: set) -> Iterator[Feedback]:
         for item in feedback:
             # Create a unique identifier for this feedback item
-            identifier = (item.get('line'), item.get('message', '')[:100])
-            
+            identifier = (item.line, item.message[:100])
             if identifier not in seen:
                 seen.add(identifier)
-                unique_feedback.append(item)
-        
-        return unique_feedback
\ No newline at end of file
+                yield item
@@ -1,60 +1,404 @@
 import os
-import requests
 import json
-import re
-from typing import List, Dict, Any
+import hashlib
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple
 from .base_analyzer import BaseAnalyzer
+from .json_stream import JSONArrayStream, extract_array
+from .llm_providers import HedgedProvider, providers_from_env
+from models import Feedback
+from utils.cache import FindingsCache
+from utils.diff_parser import Hunk, parse_hunks
+from utils.metrics import CACHE_LOOKUPS, span
+from utils.tokens import estimate_tokens
+from utils.usage import call_cost
 from utils.logger import get_logger
 
+# Bump whenever the prompt changes so cached findings are not reused across versions
+PROMPT_VERSION = "3"
+
+FEEDBACK_TYPES = ("error", "warning", "info", "suggestion")
+
+# Structured output schema (OpenAPI subset accepted by Gemini)
+RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "hunk": {"type": "INTEGER"},
+            "type": {"type": "STRING", "enum": list(FEEDBACK_TYPES)},
+            "message": {"type": "STRING"},
+            "line": {"type": "INTEGER", "nullable": True},
+            "code_snippet": {"type": "STRING", "nullable": True},
+            "suggestion": {"type": "STRING", "nullable": True}
+        },
+        "required": ["hunk", "type", "message"],
+        "propertyOrdering": ["hunk", "type", "message", "line", "code_snippet", "suggestion"]
+    }
+}
+
 class GeminiAnalyzer(BaseAnalyzer):
-    """Uses Gemini AI to analyze code changes"""
+    """Uses Gemini AI (or any configured LLM backend) to analyze code changes"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: Optional[FindingsCache] = None, stream: bool = None,
+                 provider: Optional[HedgedProvider] = None):
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
-        self.url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+        self.provider = provider or HedgedProvider(
+            providers_from_env(self.api_key),
+            hedge_percentile=float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95)),
+            min_samples=int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))
+        )
+        # Identity of the whole backend chain, so cached findings follow configuration changes
+        self.model = self.provider.identity
+        self.stream = stream if stream is not None else os.environ.get('GEMINI_STREAM', 'false').lower() == 'true'
+        # Upper bound on in-flight hunk requests; the adaptive limiter decides the actual level
+        self.max_concurrency = int(os.environ.get('LLM_MAX_CONCURRENCY', 32))
+        # A file's hunks share one request, up to this many hunks and estimated diff tokens
+        self.batch_hunks = max(1, int(os.environ.get('LLM_BATCH_HUNKS', 10)))
+        self.batch_tokens = int(os.environ.get('LLM_BATCH_TOKENS', 4000))
+        self.generation_config = {
+            "temperature": 0.2,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
+            "responseMimeType": "application/json",
+            "responseSchema": RESPONSE_SCHEMA,
+        }
         self.logger = get_logger()
+        self._cache = cache
+        self._cache_loaded = cache is not None
+        # Usage records of every API call since the last reset_usage()
+        self.calls: List[Dict[str, Any]] = []
+        self._calls_lock = threading.Lock()
+        # Paths whose request failed during the most recent iter_findings, so their findings are incomplete
+        self.failed_paths: Set[str] = set()
+        # Optional repository context (definitions, callers) to send along with each hunk
+        self.context_provider: Optional[Callable[[Hunk], str]] = None
+        self._context_memo: Dict[Tuple[str, int, str], str] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        """A Gemini key or a non-Gemini backend is configured"""
+        return bool(self.api_key) or any(p.name != 'gemini' for p in self.provider.providers)
+    
+    @property
+    def cache(self) -> Optional[FindingsCache]:
+        # Opened lazily so analyzers without an API key never touch the disk
+        if not self._cache_loaded:
+            self._cache = FindingsCache.from_env()
+            self._cache_loaded = True
+        return self._cache
     
-    def analyze(self, diff: str) -> List[Dict[str, Any]]:
+    def analyze(self, diff: str) -> List[Feedback]:
         """Use Gemini AI to analyze the code changes"""
-        if not self.api_key:
+        if not self.enabled:
             self.logger.warning("No Gemini API key provided, skipping AI analysis")
             return []
         
+        return self.analyze_hunks(parse_hunks(diff))
+    
+    def analyze_hunks(self, hunks: List[Hunk]) -> List[Feedback]:
+        """Analyze hunks, sending only those without cached findings to the API"""
+        return list(self.iter_findings(hunks))
+    
+    def iter_findings(self, hunks: List[Hunk]) -> Iterator[Feedback]:
+        """Yield findings hunk by hunk; in stream mode each one as soon as it is parsed.
+
+        Cache misses are batched per file (see ``_batches``) so each request
+        carries several hunks. Without streaming, batches are requested
+        concurrently (bounded by the backend's adaptive limiter) and findings
+        are yielded in diff order.
+        """
+        self.failed_paths = set()
+        keys = [self._cache_key(hunk) for hunk in hunks]
+        cached = [self.cache.get(key) if self.cache else None for key in keys]
+        misses = [hunk for hunk, findings in zip(hunks, cached) if findings is None]
+        if self.cache:
+            CACHE_LOOKUPS.inc(len(hunks) - len(misses), cache='findings', result='hit')
+            CACHE_LOOKUPS.inc(len(misses), cache='findings', result='miss')
+        
+        batches = self._batches(misses)
+        # Batch of each missed hunk and the hunk's position in it
+        placement = {id(hunk): (batch, index) for batch in batches for index, hunk in enumerate(batch)}
+        futures = {}
+        executor = None
+        if batches and not self.stream:
+            executor = ThreadPoolExecutor(max_workers=min(len(batches), self.max_concurrency),
+                                          thread_name_prefix='llm-review')
+            # Each request runs in a copy of this context, so its span nests under the review
+            futures = {id(batch): executor.submit(contextvars.copy_context().run, self._request_findings, batch)
+                       for batch in batches}
+        
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "X-goog-api-key": self.api_key
-            }
-            
-            prompt = self._create_prompt(diff)
-            
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": prompt}
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.2,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
-            
-            self.logger.debug("Sending request to Gemini API")
-            response = requests.post(self.url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            
-            return self._parse_response(response.json())
+            for hunk, key, findings in zip(hunks, keys, cached):
+                if findings is not None:
+                    yield from self._relocate(findings, hunk)
+                    continue
                 
+                batch, index = placement[id(hunk)]
+                if self.stream:
+                    if index == 0:
+                        yield from self._stream_and_cache(batch)
+                    continue
+                
+                per_hunk, cacheable = futures[id(batch)].result()
+                if per_hunk is None:
+                    continue
+                if cacheable and self.cache:
+                    self.cache.set(key, per_hunk[index])
+                yield from self._relocate(per_hunk[index], hunk)
+        finally:
+            if executor:
+                # Consumer stopped early: drop requests that have not started
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        self.logger.debug(f"AI analysis: {len(hunks) - len(misses)} cached hunks, "
+                          f"{len(misses)} sent to the LLM in {len(batches)} requests")
+    
+    def reset_usage(self) -> List[Dict[str, Any]]:
+        """Return the recorded calls and start a fresh record"""
+        with self._calls_lock:
+            calls, self.calls = self.calls, []
+        return calls
+    
+    def is_cached(self, hunk: Hunk) -> bool:
+        # A peek: the lookup in iter_findings is the one that counts and refreshes the entry
+        return bool(self.cache) and self.cache.contains(self._cache_key(hunk))
+    
+    def estimate_tokens(self, hunk: Hunk) -> int:
+        """Estimated prompt tokens for sending this hunk"""
+        return estimate_tokens(self._hunk_prompt(hunk))
+    
+    def set_context_provider(self, provider: Optional[Callable[[Hunk], str]]):
+        """Use ``provider(hunk)`` as repository context in prompts (None to disable)"""
+        self.context_provider = provider
+        self._context_memo = {}
+    
+    def _context(self, hunk: Hunk) -> str:
+        if not self.context_provider:
+            return ''
+        key = (hunk.path, hunk.new_start, hunk.normalized())
+        if key not in self._context_memo:
+            try:
+                self._context_memo[key] = self.context_provider(hunk) or ''
+            except Exception as e:
+                self.logger.warning(f"No repository context for {hunk.path}: {e}")
+                self._context_memo[key] = ''
+        return self._context_memo[key]
+    
+    def _cache_key(self, hunk: Hunk) -> str:
+        """Content address of a hunk under the current prompt, context and model settings"""
+        parts = [hunk.normalized(), PROMPT_VERSION, self.model, self.generation_config]
+        context = self._context(hunk)
+        if context:
+            parts.append(context)
+        material = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    def _batches(self, hunks: List[Hunk]) -> List[List[Hunk]]:
+        """Group hunks by file, starting a new batch at the hunk or token limit"""
+        batches: List[List[Hunk]] = []
+        by_path: Dict[str, Tuple[List[Hunk], int]] = {}
+        for hunk in hunks:
+            tokens = estimate_tokens(hunk.text)
+            batch, total = by_path.get(hunk.path, (None, 0))
+            if batch is None or len(batch) >= self.batch_hunks or total + tokens > self.batch_tokens:
+                batch, total = [], 0
+                batches.append(batch)
+            batch.append(hunk)
+            by_path[hunk.path] = (batch, total + tokens)
+        return batches
+    
+    def _batch_config(self, batch: List[Hunk]) -> Dict[str, Any]:
+        if len(batch) == 1:
+            return self.generation_config
+        # Room for each hunk's findings; one hunk's worth would truncate a busy file
+        output = min(8192, self.generation_config["maxOutputTokens"] * len(batch))
+        return {**self.generation_config, "maxOutputTokens": output}
+    
+    def _request_findings(self, batch: List[Hunk]) -> Tuple[Optional[List[List[Dict[str, Any]]]], bool]:
+        """Send a batch of hunks to the LLM, returning each hunk's relative findings and whether to cache them"""
+        path = batch[0].path
+        prompt = self._batch_prompt(batch)
+        estimated = estimate_tokens(prompt)
+        
+        self.logger.debug(f"Sending {len(batch)} hunks from {path} to the LLM")
+        try:
+            with span('llm.request', path=path, hunks=len(batch), estimated_prompt_tokens=estimated) as request:
+                result = self.provider.generate(
+                    prompt,
+                    self._batch_config(batch),
+                    parse=lambda result: self._parse_response(result.text, result.finish_reason),
+                    on_attempt=lambda record: self._record_call({**record, "path": path, "hunks": len(batch),
+                                                                 "estimated_prompt_tokens": estimated})
+                )
+                request.set(provider=result.provider, model=result.model, finish_reason=result.finish_reason)
+            findings, clean = result.parsed
+        except (ValueError, KeyError) as e:
+            self.logger.error(f"Failed to parse AI response: {e}")
+            self._failed(batch)
+            # Fallback: return as a single info item on the first hunk, never cached
+            return [[{
+                "type": "info",
+                "message": f"AI Analysis completed but response format was unexpected",
+                "line": None,
+                "code_snippet": None,
+                "suggestion": "Check the AI response format"
+            }]] + [[] for _ in batch[1:]], False
         except Exception as e:
             self.logger.error(f"Error in AI analysis: {e}")
-            return []
+            self._failed(batch)
+            return None, False
+        
+        per_hunk = [[] for _ in batch]
+        for item in findings:
+            index = self._hunk_index(item, batch)
+            if index is None:
+                clean = False
+                continue
+            per_hunk[index].append(self._to_relative(item, batch[index]))
+        
+        # Partial or truncated answers are used but not cached, so a later run can do better
+        return per_hunk, clean
     
-    def _create_prompt(self, diff: str) -> str:
+    def _hunk_index(self, item: Dict[str, Any], batch: List[Hunk]) -> Optional[int]:
+        """Position in the batch of the hunk a finding belongs to (its id is 1-based), or None if unknown"""
+        hunk_id = item.pop('hunk', None)
+        if len(batch) == 1:
+            return 0
+        if isinstance(hunk_id, int) and 1 <= hunk_id <= len(batch):
+            return hunk_id - 1
+        # No usable id: fall back to the hunk whose new lines contain the finding
+        line = item.get('line')
+        if isinstance(line, int):
+            for index, hunk in enumerate(batch):
+                if hunk.new_start <= line < hunk.new_start + len(hunk.lines):
+                    return index
+        self.logger.warning(f"Dropped an AI finding for {batch[0].path} that names no hunk of the request")
+        return None
+    
+    def _stream_and_cache(self, batch: List[Hunk]) -> Iterator[Feedback]:
+        per_hunk = [[] for _ in batch]
+        stream = self._stream_findings(batch)
+        with span('llm.stream', path=batch[0].path, hunks=len(batch)):
+            while True:
+                try:
+                    index, item = next(stream)
+                except StopIteration as stop:
+                    if stop.value and self.cache:
+                        for hunk, findings in zip(batch, per_hunk):
+                            self.cache.set(self._cache_key(hunk), findings)
+                    return
+                per_hunk[index].append(item)
+                yield from self._relocate([item], batch[index])
+    
+    def _stream_findings(self, batch: List[Hunk]):
+        """Yield (batch position, hunk-relative finding) from a streamed answer as each object completes.
+        
+        Returns True once the stream finished cleanly, so the caller knows it may cache.
+        """
+        prompt = self._batch_prompt(batch)
+        call = {
+            "provider": self.provider.name,
+            "model": self.model,
+            "path": batch[0].path,
+            "hunks": len(batch),
+            "estimated_prompt_tokens": estimate_tokens(prompt),
+            "status": "error",
+            "stream": True
+        }
+        parser = JSONArrayStream()
+        usage = {}
+        finish_reason = None
+        started = time.perf_counter()
+        
+        self.logger.debug(f"Streaming {len(batch)} hunks from {batch[0].path} to the LLM")
+        try:
+            for chunk in self.provider.stream(prompt, self._batch_config(batch)):
+                usage = chunk.usage or usage
+                finish_reason = chunk.finish_reason or finish_reason
+                if chunk.model:
+                    call["provider"], call["model"] = chunk.provider, chunk.model
+                for item in parser.feed(chunk.text):
+                    item = self._validate_finding(item)
+                    index = self._hunk_index(item, batch) if item is not None else None
+                    if index is None:
+                        parser.errors += 1
+                        continue
+                    if "first_finding_ms" not in call:
+                        call["first_finding_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    yield index, self._to_relative(item, batch[index])
+            
+            call["status"] = "ok"
+            if parser.errors:
+                self.logger.warning(f"Skipped {parser.errors} malformed findings in streamed response")
+            return parser.done and not parser.errors and finish_reason in (None, 'STOP')
+        except Exception as e:
+            self.logger.error(f"Error in streamed AI analysis: {e}")
+            self._failed(batch)
+            return False
+        finally:
+            call["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._record_call({**call, **usage})
+    
+    def _failed(self, batch: List[Hunk]):
+        # Requests run on worker threads
+        with self._calls_lock:
+            self.failed_paths.update(hunk.path for hunk in batch)
+    
+    def _record_call(self, call: Dict[str, Any]):
+        call.setdefault("prompt_tokens", 0)
+        call.setdefault("output_tokens", 0)
+        call["cost_usd"] = call_cost(call.get("model", ""), call["prompt_tokens"], call["output_tokens"])
+        with self._calls_lock:
+            self.calls.append(call)
+    
+    def _to_relative(self, item: Dict[str, Any], hunk: Hunk) -> Dict[str, Any]:
+        if isinstance(item.get('line'), int):
+            item['line'] -= hunk.new_start
+        return item
+    
+    def _relocate(self, findings: List[Dict[str, Any]], hunk: Hunk) -> List[Feedback]:
+        """Place hunk-relative findings (as cached) at the hunk's current position"""
+        relocated = []
+        for item in findings:
+            line = item.get('line')
+            relocated.append(Feedback(
+                type=item['type'],
+                message=item['message'],
+                line=line + hunk.new_start if isinstance(line, int) else None,
+                code_snippet=item.get('code_snippet'),
+                suggestion=item.get('suggestion'),
+                path=hunk.path,
+                rule=item.get('rule')
+            ))
+        return relocated
+    
+    def _hunk_diff(self, hunk: Hunk) -> str:
+        return f"--- a/{hunk.path}\n+++ b/{hunk.path}\n{hunk.text}"
+    
+    def _hunk_prompt(self, hunk: Hunk) -> str:
+        return self._batch_prompt([hunk])
+    
+    def _batch_prompt(self, batch: List[Hunk]) -> str:
+        diff = '\n\n'.join(f"Hunk {i}:\n{self._hunk_diff(hunk)}" for i, hunk in enumerate(batch, 1))
+        # Hunks of one file often pull in the same definitions; send each block once
+        contexts = []
+        for hunk in batch:
+            context = self._context(hunk)
+            if context and context not in contexts:
+                contexts.append(context)
+        return self._create_prompt(diff, '\n'.join(contexts))
+    
+    def _create_prompt(self, diff: str, context: str = '') -> str:
+        if context:
+            context = f"""
+        Relevant definitions and call sites from the repository (for reference; review only the changes):
+        {context}
+        """
         return f"""
         You are an expert code reviewer. Analyze the following code changes from a pull request and provide specific, actionable feedback.
         
@@ -67,52 +411,98 @@ class GeminiAnalyzer(BaseAnalyzer):
         6. Error handling and edge cases
         
         For each issue found, provide:
+        - The id of the hunk it is in (the number after "Hunk")
         - Type (error, warning, info, or suggestion)
         - A clear message explaining the issue
-        - The line number (if applicable)
+        - The line number in the new version of the file (if applicable)
         - A code snippet showing the problematic code
         - Suggested fix (if applicable)
         
         Format your response as a valid JSON array of objects with these fields:
+        - hunk (number)
         - type (string)
         - message (string)
         - line (number or null)
         - code_snippet (string or null)
         - suggestion (string or null)
-        
-        Code changes (in unified diff format):
+        {context}
+        Code changes (unified diff hunks, each labelled with its id):
         {diff}
         
         Response (JSON only):
         """
     
-    def _parse_response(self, response_data: Dict) -> List[Dict[str, Any]]:
-        """Parse the Gemini response and extract feedback"""
-        try:
-            candidates = response_data.get('candidates', [{}])
-            if candidates:
-                content = candidates[0].get('content', {})
-                parts = content.get('parts', [{}])
-                if parts:
-                    feedback_text = parts[0].get('text', '').strip()
-                    
-                    # Try to extract JSON from the response
-                    json_match = re.search(r'\[\s*\{.*\}\s*\]', feedback_text, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group(0)
-                        return json.loads(json_str)
-                    else:
-                        # Fallback: try to parse the entire response as JSON
-                        return json.loads(feedback_text)
-        except (json.JSONDecodeError, KeyError) as e:
-            self.logger.error(f"Failed to parse AI response: {e}")
-            # Fallback: return as a single info item
-            return [{
-                "type": "info",
-                "message": f"AI Analysis completed but response format was unexpected",
-                "line": None,
-                "code_snippet": None,
-                "suggestion": "Check the AI response format"
-            }]
+    def _parse_response(self, feedback_text: str, finish_reason: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Parse the LLM answer and extract feedback.
+        
+        Returns the valid findings and whether the response was complete and
+        fully valid. Raises ValueError when nothing usable could be extracted.
+        """
+        feedback_text = feedback_text.strip()
+        truncated = finish_reason not in (None, 'STOP')
         
-        return []
\ No newline at end of file
+        items, parser = extract_array(feedback_text)
+        if not parser.done and not items:
+            # No array at all: accept a single finding object
+            single = json.loads(feedback_text) if feedback_text else []
+            items = [single] if isinstance(single, dict) else single
+            parser.done = isinstance(items, list)
+            if not parser.done:
+                raise ValueError("response is not a JSON array of findings")
+        
+        findings = []
+        for item in items:
+            finding = self._validate_finding(item)
+            if finding is None:
+                parser.errors += 1
+            else:
+                findings.append(finding)
+        
+        if parser.errors:
+            self.logger.warning(f"Dropped {parser.errors} malformed findings from AI response")
+        if not findings and parser.errors:
+            raise ValueError("no valid findings in AI response")
+        
+        return findings, parser.done and not parser.errors and not truncated
+    
+    def _validate_finding(self, item: Any) -> Optional[Dict[str, Any]]:
+        """Normalize one finding, or return None if it is unusable"""
+        if not isinstance(item, dict):
+            return None
+        
+        message = item.get('message')
+        if not isinstance(message, str) or not message.strip():
+            return None
+        
+        feedback_type = item.get('type')
+        feedback_type = feedback_type.lower().strip() if isinstance(feedback_type, str) else 'info'
+        if feedback_type not in FEEDBACK_TYPES:
+            feedback_type = 'info'
+        
+        line = item.get('line')
+        if isinstance(line, str) and line.strip().isdigit():
+            line = int(line)
+        elif isinstance(line, float) and line.is_integer():
+            line = int(line)
+        if not isinstance(line, int) or isinstance(line, bool):
+            line = None
+        
+        finding = {
+            "type": feedback_type,
+            "message": message.strip(),
+            "line": line,
+            "code_snippet": self._optional_text(item.get('code_snippet')),
+            "suggestion": self._optional_text(item.get('suggestion'))
+        }
+        hunk_id = item.get('hunk')
+        if isinstance(hunk_id, str) and hunk_id.strip().isdigit():
+            hunk_id = int(hunk_id)
+        if isinstance(hunk_id, int) and not isinstance(hunk_id, bool):
+            # Consumed by _hunk_index, never cached
+            finding["hunk"] = hunk_id
+        return finding
+    
+    def _optional_text(self, value: Any) -> Optional[str]:
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
@@ -0,0 +1,96 @@
+import re
+import json
+from typing import Any, List, Tuple
+
+_SPECIAL = re.compile(r'[\[\]{}"\\]')
+
+
+class JSONArrayStream:
+    """Incremental parser that yields each object of a JSON array once complete.
+
+    Text is fed in arbitrary chunks; only structural characters are visited,
+    so parsing is linear in the input. Anything before the opening bracket
+    (prose, markdown fences) is ignored, and objects that fail to decode are
+    counted in ``errors`` instead of aborting the stream.
+    """
+
+    def __init__(self):
+        self.depth = 0  # 0 until the array opens, 1 inside it
+        self.in_string = False
+        self.done = False
+        self.errors = 0
+        self._skip_first = False
+        self._capturing = False
+        self._parts: List[str] = []
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        if self.done or not chunk:
+            return items
+
+        start = 0 if self._capturing else None
+        skip = 0 if self._skip_first else -1
+        self._skip_first = False
+
+        for match in _SPECIAL.finditer(chunk):
+            i = match.start()
+            if i == skip:
+                continue
+            ch = match.group()
+
+            if self.in_string:
+                if ch == '\\':
+                    skip = i + 1
+                    self._skip_first = skip == len(chunk)
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = self.depth > 0
+            elif ch in '[{':
+                if self.depth == 0:
+                    if ch == '[':
+                        self.depth = 1
+                    continue
+                if self.depth == 1 and ch == '{':
+                    start = i
+                    self._capturing = True
+                self.depth += 1
+            elif ch in ']}':
+                if self.depth == 0:
+                    continue
+                self.depth -= 1
+                if self.depth == 1 and self._capturing and ch == '}':
+                    text = ''.join(self._parts) + chunk[start:i + 1]
+                    self._parts = []
+                    self._capturing = False
+                    start = None
+                    try:
+                        items.append(json.loads(text))
+                    except ValueError:
+                        self.errors += 1
+                elif self.depth == 0:
+                    self.done = True
+                    break
+
+        if self._capturing and start is not None:
+            self._parts.append(chunk[start:])
+
+        return items
+
+
+_ARRAY_START = re.compile(r'\[\s*[{\]]')
+
+
+def extract_array(text: str) -> Tuple[List[Any], JSONArrayStream]:
+    """Objects of the first JSON array of objects in ``text``.
+
+    Returns the decoded objects and the parser, whose ``done`` and ``errors``
+    tell whether the array was complete and how many objects were malformed.
+    """
+    parser = JSONArrayStream()
+    match = _ARRAY_START.search(text)
+    if match is None:
+        return [], parser
+    return parser.feed(text[match.start():]), parser
@@ -0,0 +1,431 @@
+import os
+import json
+import time
+import random
+import threading
+import requests
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from utils.concurrency import AdaptiveLimiter, get_limiter, parse_retry_after
+from utils.http import get_session
+from utils.logger import get_logger
+
+# Attempts of every HedgedProvider run here: analyzers are built per review, threads are not
+_attempts = ThreadPoolExecutor(max_workers=int(os.environ.get('LLM_ATTEMPT_WORKERS', 64)),
+                               thread_name_prefix='llm-hedge')
+
+
+@dataclass
+class LLMResult:
+    """Text and usage returned by one LLM call"""
+    text: str
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    finish_reason: Optional[str] = None  # normalized to Gemini's STOP/MAX_TOKENS/...
+    http_status: Optional[int] = None
+    latency_ms: float = 0.0
+    hedged: bool = False
+    # What the caller's ``parse`` made of the text (see HedgedProvider.generate)
+    parsed: Any = None
+
+
+@dataclass
+class LLMChunk:
+    """One piece of a streamed answer; usage is set on the chunk that carries it"""
+    text: str = ''
+    usage: Dict[str, int] = field(default_factory=dict)
+    finish_reason: Optional[str] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+
+
+class LLMProvider(ABC):
+    """A backend that turns a prompt into text"""
+
+    name = 'llm'
+
+    # Attempts per request when the backend answers 429/503
+    MAX_THROTTLE_RETRIES = 2
+    # Seconds before the first retry of a throttled request without Retry-After; doubles per retry up to the cap
+    THROTTLE_BACKOFF = 0.5
+    THROTTLE_BACKOFF_MAX = 8.0
+    # A backend reads a prompt much faster than it writes an answer; weighs the two in a request's size
+    PROMPT_WEIGHT = 0.1
+
+    def __init__(self, model: str, timeout: float = 30):
+        self.model = model
+        self.timeout = timeout
+        self.logger = get_logger()
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        """Shared by every provider instance talking to the same backend"""
+        return get_limiter(self.identity)
+
+    @contextmanager
+    def _post(self, url: str, headers: Dict[str, str], body: Dict[str, Any], stream: bool = False):
+        """POST under the adaptive concurrency limit, retrying after throttling.
+
+        A Retry-After pauses the backend's limiter; without one the retry
+        waits a jittered exponential backoff, outside the slot, so throttled
+        requests do not come back in lockstep.
+
+        The slot is held until the caller leaves the context, so streamed
+        responses count against concurrency while they are being read.
+        Latency reaches the limiter with the request's size (``_size``).
+        """
+        payload = json.dumps(body).encode('utf-8')
+        backoff = None
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            if backoff:
+                # Waited without a slot, so the limiter can hand it to other requests meanwhile
+                time.sleep(backoff)
+                backoff = None
+            with self.limiter.slot() as slot:
+                started = time.monotonic()
+                try:
+                    response = get_session().post(url, headers=headers, data=payload, timeout=self.timeout,
+                                                  stream=stream)
+                except requests.Timeout:
+                    slot.timed_out()
+                    raise
+                slot.mark_latency(time.monotonic() - started, self._size(payload, None if stream else response))
+
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    slot.throttled(retry_after)
+                    if attempt < self.MAX_THROTTLE_RETRIES:
+                        response.close()
+                        if retry_after is None:
+                            backoff = self._throttle_backoff(attempt)
+                        self.logger.debug(f"{self.identity} throttled ({response.status_code}), retrying"
+                                          + (f" in {backoff:.2f}s" if backoff else ""))
+                        continue
+
+                with response:
+                    response.raise_for_status()
+                    yield response
+                return
+
+    def _size(self, payload: bytes, response: Optional[requests.Response]) -> float:
+        """Thousands of weighted characters: the prompt, plus the answer once it was read in full.
+
+        A streamed request's latency is its time to the first byte, which
+        the prompt decides.
+        """
+        answer = len(response.content) if response is not None else 0
+        return max(1.0, self.PROMPT_WEIGHT * len(payload) + answer) / 1000
+
+    def _throttle_backoff(self, attempt: int) -> float:
+        """Full jitter: uniform up to THROTTLE_BACKOFF * 2^attempt, capped"""
+        return random.uniform(0, min(self.THROTTLE_BACKOFF_MAX, self.THROTTLE_BACKOFF * 2 ** attempt))
+
+    @abstractmethod
+    def generate(self, prompt: str, generation_config: Dict[str, Any]) -> LLMResult:
+        pass
+
+    def stream(self, prompt: str, generation_config: Dict[str, Any]) -> Iterator[LLMChunk]:
+        """Stream the answer; backends without streaming return it in one chunk"""
+        result = self.generate(prompt, generation_config)
+        yield LLMChunk(result.text, {'prompt_tokens': result.prompt_tokens,
+                                     'output_tokens': result.output_tokens}, result.finish_reason)
+
+    def _sse_events(self, response) -> Iterator[Dict[str, Any]]:
+        for line in response.iter_lines():
+            line = line.decode('utf-8') if isinstance(line, bytes) else line
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                return
+            yield json.loads(payload)
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini generateContent / streamGenerateContent"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: str = None, model: str = None, api_base: str = None, timeout: float = 30):
+        super().__init__(model or os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash'), timeout)
+        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
+        self.api_base = (api_base or os.environ.get(
+            'GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')).rstrip('/')
+        self.url = f"{self.api_base}/models/{self.model}:generateContent"
+        self.stream_url = f"{self.api_base}/models/{self.model}:streamGenerateContent?alt=sse"
+
+    def generate(self, prompt: str, generation_config: Dict[str, Any]) -> LLMResult:
+        started = time.perf_counter()
+        with self._post(self.url, self._headers(), self._body(prompt, generation_config)) as response:
+            data = response.json()
+        usage = data.get('usageMetadata', {})
+        return LLMResult(
+            text=self._text(data),
+            provider=self.name,
+            model=self.model,
+            prompt_tokens=usage.get('promptTokenCount', 0),
+            output_tokens=usage.get('candidatesTokenCount', 0),
+            finish_reason=(data.get('candidates') or [{}])[0].get('finishReason'),
+            http_status=response.status_code,
+            latency_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+
+    def stream(self, prompt: str, generation_config: Dict[str, Any]) -> Iterator[LLMChunk]:
+        with self._post(self.stream_url, self._headers(), self._body(prompt, generation_config),
+                        stream=True) as response:
+            for event in self._sse_events(response):
+                usage = event.get('usageMetadata', {})
+                yield LLMChunk(
+                    text=self._text(event),
+                    usage={'prompt_tokens': usage.get('promptTokenCount', 0),
+                           'output_tokens': usage.get('candidatesTokenCount', 0)} if usage else {},
+                    finish_reason=(event.get('candidates') or [{}])[0].get('finishReason')
+                )
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "X-goog-api-key": self.api_key
+        }
+
+    def _body(self, prompt: str, generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": prompt}
+                    ]
+                }
+            ],
+            "generationConfig": generation_config
+        }
+
+    def _text(self, data: Dict[str, Any]) -> str:
+        candidates = data.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts') or []
+        return ''.join(part.get('text', '') for part in parts)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any /v1/chat/completions endpoint (vLLM, llama.cpp, Ollama, LM Studio, ...)"""
+
+    name = 'openai'
+
+    FINISH_REASONS = {'stop': 'STOP', 'length': 'MAX_TOKENS', 'content_filter': 'SAFETY'}
+
+    def __init__(self, base_url: str, model: str, api_key: str = None, timeout: float = 30):
+        super().__init__(model, timeout)
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+
+    def generate(self, prompt: str, generation_config: Dict[str, Any]) -> LLMResult:
+        started = time.perf_counter()
+        with self._post(f"{self.base_url}/chat/completions", self._headers(),
+                        self._body(prompt, generation_config)) as response:
+            data = response.json()
+        choice = (data.get('choices') or [{}])[0]
+        usage = data.get('usage') or {}
+        return LLMResult(
+            text=(choice.get('message') or {}).get('content') or '',
+            provider=self.name,
+            model=self.model,
+            prompt_tokens=usage.get('prompt_tokens', 0),
+            output_tokens=usage.get('completion_tokens', 0),
+            finish_reason=self.FINISH_REASONS.get(choice.get('finish_reason'), choice.get('finish_reason')),
+            http_status=response.status_code,
+            latency_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+
+    def stream(self, prompt: str, generation_config: Dict[str, Any]) -> Iterator[LLMChunk]:
+        body = {**self._body(prompt, generation_config), 'stream': True,
+                'stream_options': {'include_usage': True}}
+        with self._post(f"{self.base_url}/chat/completions", self._headers(), body, stream=True) as response:
+            for event in self._sse_events(response):
+                choice = (event.get('choices') or [{}])[0]
+                usage = event.get('usage') or {}
+                yield LLMChunk(
+                    text=(choice.get('delta') or {}).get('content') or '',
+                    usage={'prompt_tokens': usage.get('prompt_tokens', 0),
+                           'output_tokens': usage.get('completion_tokens', 0)} if usage else {},
+                    finish_reason=self.FINISH_REASONS.get(choice.get('finish_reason'))
+                )
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _body(self, prompt: str, generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": generation_config.get('temperature'),
+            "top_p": generation_config.get('topP'),
+            "max_tokens": generation_config.get('maxOutputTokens')
+        }
+
+
+class HedgedProvider(LLMProvider):
+    """Tries backends in order, hedging slow primaries and falling back on errors.
+
+    If the primary has not answered once its latency percentile has elapsed, the
+    same request goes to the next backend and the first valid answer wins.
+    Errors and invalid answers fall through to the remaining backends.
+    """
+
+    name = 'hedged'
+
+    def __init__(self, providers: List[LLMProvider], hedge_percentile: float = 0.95,
+                 min_samples: int = 20, window: int = 200):
+        super().__init__('|'.join(p.identity for p in providers), max(p.timeout for p in providers))
+        self.providers = providers
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'fallbacks': 0}
+        self._latencies: Dict[str, deque] = {p.identity: deque(maxlen=window) for p in providers}
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self) -> str:
+        return self.model
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def hedge_delay(self, provider: LLMProvider) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._latencies[provider.identity])
+        if len(samples) < self.min_samples or len(self.providers) < 2 or self.hedge_percentile >= 1:
+            return None
+        return samples[int(self.hedge_percentile * (len(samples) - 1))] / 1000
+
+    def generate(self, prompt: str, generation_config: Dict[str, Any],
+                 parse: Callable[[LLMResult], Any] = None,
+                 on_attempt: Callable[[Dict[str, Any]], None] = None) -> LLMResult:
+        """Return the first valid answer.
+
+        ``parse`` turns an answer into what the caller needs, raising
+        ValueError or KeyError for an unusable one, which then counts as a
+        failed attempt. Its value is kept in the result's ``parsed``, so
+        the answer is parsed once.
+
+        ``on_attempt`` is called with a usage record for every attempt,
+        including hedges that lose the race.
+        """
+        self._count('requests')
+        remaining = list(self.providers)
+        pending = {}
+        last_error: Optional[Exception] = None
+
+        while remaining or pending:
+            if remaining:
+                provider = remaining.pop(0)
+                hedged = bool(pending)
+                if hedged:
+                    self._count('hedged')
+                elif provider is not self.providers[0]:
+                    self._count('fallbacks')
+                future = _attempts.submit(self._attempt, provider, prompt, generation_config, hedged, on_attempt)
+                pending[future] = provider
+
+            delay = self.hedge_delay(next(iter(pending.values()))) if remaining and len(pending) == 1 else None
+            done, _ = wait(list(pending), timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than its usual percentile: hedge with the next backend
+                continue
+
+            for future in done:
+                pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if parse:
+                    try:
+                        result.parsed = parse(result)
+                    except (ValueError, KeyError) as e:
+                        last_error = ValueError(f"invalid answer from {result.provider}:{result.model}: {e}")
+                        continue
+                if result.hedged:
+                    self._count('hedge_wins')
+                return result
+
+        raise last_error or RuntimeError("no LLM backends configured")
+
+    def stream(self, prompt: str, generation_config: Dict[str, Any]) -> Iterator[LLMChunk]:
+        """Stream from the first backend that starts answering; no hedging mid-stream"""
+        last_error: Optional[Exception] = None
+        for provider in self.providers:
+            started = False
+            try:
+                for chunk in provider.stream(prompt, generation_config):
+                    started = True
+                    chunk.provider, chunk.model = provider.name, provider.model
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                self._count('fallbacks')
+                self.logger.warning(f"LLM backend {provider.identity} failed, falling back: {e}")
+        raise last_error or RuntimeError("no LLM backends configured")
+
+    def _attempt(self, provider: LLMProvider, prompt: str, generation_config: Dict[str, Any],
+                 hedged: bool, on_attempt: Optional[Callable[[Dict[str, Any]], None]]) -> LLMResult:
+        started = time.perf_counter()
+        record = {'provider': provider.name, 'model': provider.model, 'hedged': hedged, 'status': 'error'}
+        try:
+            result = provider.generate(prompt, generation_config)
+            result.hedged = hedged
+            record.update(status='ok', http_status=result.http_status,
+                          prompt_tokens=result.prompt_tokens, output_tokens=result.output_tokens)
+            return result
+        except requests.HTTPError as e:
+            record['http_status'] = e.response.status_code if e.response is not None else None
+            raise
+        finally:
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            record['latency_ms'] = latency_ms
+            if record['status'] == 'ok':
+                with self._lock:
+                    self._latencies[provider.identity].append(latency_ms)
+            if on_attempt:
+                on_attempt(record)
+
+
+def providers_from_env(api_key: str = None) -> List[LLMProvider]:
+    """Backends from LLM_BACKENDS, e.g. "gemini:gemini-2.0-flash,openai:http://localhost:8000/v1#qwen2.5-coder".
+
+    Defaults to a single Gemini backend.
+    """
+    specs = [spec.strip() for spec in os.environ.get('LLM_BACKENDS', '').split(',') if spec.strip()]
+    timeout = float(os.environ.get('LLM_TIMEOUT', 30))
+    if not specs:
+        return [GeminiProvider(api_key, timeout=timeout)]
+
+    providers = []
+    for spec in specs:
+        kind, _, target = spec.partition(':')
+        if kind == 'gemini':
+            providers.append(GeminiProvider(api_key, model=target or None, timeout=timeout))
+        elif kind == 'openai':
+            base_url, _, model = target.partition('#')
+            providers.append(OpenAICompatibleProvider(base_url, model or 'default', timeout=timeout))
+        else:
+            raise ValueError(f"Unsupported LLM backend: {spec}")
+    return providers
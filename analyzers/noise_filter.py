@@ -0,0 +1,224 @@
+import os
+import math
+import fnmatch
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from utils.diff_parser import FileDiff, split_files, walk_diff
+from utils.mapped_diff import MappedDiff, MappedSections
+from utils.tokens import estimate_tokens
+from utils.logger import get_logger
+
+DEFAULT_PATTERNS = [
+    # Lockfiles
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock',
+    'Pipfile.lock', 'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum', '*.lock',
+    # Vendored code
+    'vendor/*', '*/vendor/*', 'node_modules/*', '*/node_modules/*', 'third_party/*', '*/third_party/*',
+    # Generated code and build output
+    '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.pb.cc', '*.pb.h', '*.generated.*', '*.g.dart',
+    'dist/*', 'build/*',
+    # Minified bundles and source maps
+    '*.min.js', '*.min.css', '*.map',
+]
+
+
+class NoiseFilter:
+    """Drops or summarizes files nobody reviews before any analyzer runs"""
+
+    def __init__(self, patterns: Optional[List[str]] = None, gitattributes: Optional[str] = None,
+                 mode: str = 'drop', max_line_length: int = 1000, max_avg_line_length: int = 300,
+                 max_entropy: float = 5.5, min_heuristic_bytes: int = 2048):
+        self.patterns = list(DEFAULT_PATTERNS if patterns is None else patterns)
+        self.attributes = self._parse_gitattributes(gitattributes or '')
+        self.mode = mode
+        self.max_line_length = max_line_length
+        self.max_avg_line_length = max_avg_line_length
+        self.max_entropy = max_entropy
+        self.min_heuristic_bytes = min_heuristic_bytes
+        self.logger = get_logger()
+
+    @classmethod
+    def from_env(cls) -> Optional['NoiseFilter']:
+        """Build the filter from environment settings, or None if disabled"""
+        if os.environ.get('NOISE_FILTER_DISABLED', 'false').lower() == 'true':
+            return None
+
+        patterns = list(DEFAULT_PATTERNS)
+        extra = os.environ.get('NOISE_FILTER_PATTERNS', '')
+        patterns.extend(p.strip() for p in extra.split(',') if p.strip())
+
+        gitattributes = None
+        attributes_path = os.environ.get('NOISE_FILTER_GITATTRIBUTES')
+        if attributes_path and os.path.exists(attributes_path):
+            with open(attributes_path, encoding='utf-8') as f:
+                gitattributes = f.read()
+
+        return cls(
+            patterns=patterns,
+            gitattributes=gitattributes,
+            mode=os.environ.get('NOISE_FILTER_MODE', 'drop'),
+            max_line_length=int(os.environ.get('NOISE_FILTER_MAX_LINE_LENGTH', 1000))
+        )
+
+    def filter(self, diff: Union[str, MappedDiff]) -> Tuple[Union[str, MappedSections], Dict[str, Any]]:
+        """Return the diff without noisy files and a report of what was skipped.
+
+        A spilled diff comes back as the line ranges to keep, never as text.
+        """
+        if isinstance(diff, MappedDiff):
+            return self._filter_mapped(diff)
+
+        skipped = []
+        kept_sections = []
+        files = split_files(diff)
+
+        for file_diff in files:
+            self._filter_file(file_diff, kept_sections, skipped)
+
+        if not skipped:
+            return diff, self._report(skipped, len(files))
+
+        return '\n'.join(kept_sections), self._report(skipped, len(files))
+
+    def _filter_mapped(self, diff: MappedDiff) -> Tuple[MappedSections, Dict[str, Any]]:
+        skipped = []
+        sections = diff.sections()
+        kept = list(self._kept_sections(diff, sections, skipped))
+        return MappedSections(diff, kept), self._report(skipped, len(sections))
+
+    def _kept_sections(self, diff: MappedDiff, sections: List[Tuple[int, int]],
+                       skipped: List[Dict[str, Any]]) -> Iterator[Tuple[int, int]]:
+        """(start, end) line ranges to keep, classifying one file section at a time from its lines"""
+        for start, end in sections:
+            header = []
+            for line in diff.lines(start, end):
+                if line.startswith('@@'):
+                    break
+                header.append(line)
+                if line == 'GIT binary patch':
+                    break
+            files = split_files('\n'.join(header))
+            file_diff = files[0] if files else FileDiff(path='', start=0, lines=header)
+            added = (line[1:] for _, kind, line in walk_diff(diff.lines(start, end)) if kind == 'added')
+            reason = self.classify(file_diff, added)
+            if reason is None:
+                yield start, end
+                continue
+
+            size = diff.byte_size(start, end)
+            skipped.append({'path': file_diff.path, 'reason': reason, 'bytes': size, 'tokens': size // 4})
+            self.logger.debug(f"Skipping {file_diff.path} ({reason})")
+            if self.mode == 'summarize':
+                yield start, start + len(file_diff.header)
+
+    def _filter_file(self, file_diff: FileDiff, kept_sections: List[str], skipped: List[Dict[str, Any]]):
+        body = file_diff.text
+        reason = self.classify(file_diff)
+        if reason is None:
+            kept_sections.append(body)
+            return
+
+        skipped.append({
+            'path': file_diff.path,
+            'reason': reason,
+            'bytes': len(body.encode('utf-8')),
+            'tokens': estimate_tokens(body)
+        })
+        self.logger.debug(f"Skipping {file_diff.path} ({reason})")
+        if self.mode == 'summarize':
+            kept_sections.append('\n'.join(file_diff.header))
+
+    def classify(self, file_diff: FileDiff, added_lines: Optional[Iterable[str]] = None) -> Optional[str]:
+        """Return why a file should be skipped, or None to keep it; ``added_lines`` defaults to the file's own"""
+        if file_diff.is_binary:
+            return 'binary'
+
+        attribute = self._attribute_for(file_diff.path)
+        if attribute is False:
+            return None
+        if attribute:
+            return attribute
+
+        if self._matches(file_diff.path, self.patterns):
+            return 'path pattern'
+
+        return self._heuristic(file_diff.added_lines if added_lines is None else added_lines)
+
+    def _heuristic(self, added_lines: Iterable[str]) -> Optional[str]:
+        """Detect minified or encoded content from the added lines, in one pass"""
+        count = total = 0
+        characters = Counter()
+        pending = []
+        for line in added_lines:
+            if len(line) > self.max_line_length:
+                return 'minified (long lines)'
+            count += 1
+            total += len(line)
+            pending.append(line)
+            if len(pending) >= 1024:
+                characters.update(''.join(pending))
+                pending.clear()
+        characters.update(''.join(pending))
+
+        if not count or total < self.min_heuristic_bytes:
+            return None
+        if total / count > self.max_avg_line_length:
+            return 'minified (average line length)'
+        if _entropy(characters) > self.max_entropy:
+            return 'high entropy'
+        return None
+
+    def _attribute_for(self, path: str):
+        """Last matching .gitattributes rule wins, as in git"""
+        result = None
+        for pattern, value in self.attributes:
+            if self._matches(path, [pattern]):
+                result = value
+        return result
+
+    def _matches(self, path: str, patterns: List[str]) -> bool:
+        basename = path.rsplit('/', 1)[-1]
+        for pattern in patterns:
+            if '/' in pattern.strip('/'):
+                if fnmatch.fnmatch(path, pattern.lstrip('/').replace('**/', '*')):
+                    return True
+            elif pattern.startswith('/'):
+                if fnmatch.fnmatch(path, pattern[1:]):
+                    return True
+            elif fnmatch.fnmatch(basename, pattern.rstrip('/')) or fnmatch.fnmatch(path, pattern):
+                return True
+        return False
+
+    def _parse_gitattributes(self, text: str) -> List[Tuple[str, Any]]:
+        """Extract linguist-generated/linguist-vendored rules"""
+        rules = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            pattern, *attrs = line.split()
+            for attr in attrs:
+                name, _, value = attr.lstrip('-!').partition('=')
+                if name not in ('linguist-generated', 'linguist-vendored'):
+                    continue
+                enabled = not attr.startswith(('-', '!')) and value.lower() not in ('false', '0')
+                rules.append((pattern, name.replace('linguist-', '') if enabled else False))
+        return rules
+
+    def _report(self, skipped: List[Dict[str, Any]], total_files: int) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'files_total': total_files,
+            'files_skipped': len(skipped),
+            'bytes_saved': sum(item['bytes'] for item in skipped),
+            'tokens_saved': sum(item['tokens'] for item in skipped),
+            'skipped': skipped
+        }
+
+
+def _entropy(characters: Counter) -> float:
+    """Shannon entropy in bits per character of the counted text"""
+    length = sum(characters.values())
+    if not length:
+        return 0.0
+    return -sum(count / length * math.log2(count / length) for count in characters.values())
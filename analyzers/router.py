@@ -0,0 +1,115 @@
+import os
+import re
+import math
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from models import Feedback
+from utils.diff_parser import Hunk
+from utils.logger import get_logger
+
+SENSITIVE_PATHS = re.compile(
+    r'(auth|login|session|security|crypto|password|secret|token|permission|acl|iam|payment|billing'
+    r'|migrations?/|settings|config|\.env|dockerfile|\.github/workflows|requirements|setup\.py)',
+    re.IGNORECASE
+)
+
+RISKY_KEYWORDS = re.compile(
+    r'(\beval\(|\bexec\(|subprocess|os\.system|shell\s*=\s*True|pickle\.loads?|yaml\.load\(|marshal'
+    r'|verify\s*=\s*False|\bmd5\b|\bsha1\b|random\.random|innerHTML|dangerouslySetInnerHTML'
+    r'|\bexecute\(|\bSELECT\b|\bINSERT\b|\bDELETE\b|\bUPDATE\b|password|secret|token|api_?key'
+    r'|chmod|tempfile\.mktemp|\bassert\b|except\s*:|threading|\bLock\(|async\s+def)',
+    re.IGNORECASE
+)
+
+SEVERITY_WEIGHTS = {
+    "error": 5.0,
+    "warning": 2.0,
+    "info": 0.5,
+    "suggestion": 0.2
+}
+
+
+class HunkRouter:
+    """Scores hunks cheaply and picks the ones worth sending to the LLM"""
+
+    def __init__(self, threshold: float = 0.0, top_k: Optional[int] = None, token_budget: Optional[int] = None):
+        self.threshold = threshold
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.logger = get_logger()
+
+    @classmethod
+    def from_env(cls) -> 'HunkRouter':
+        top_k = os.environ.get('LLM_ROUTING_TOP_K')
+        budget = os.environ.get('LLM_TOKEN_BUDGET')
+        return cls(
+            threshold=float(os.environ.get('LLM_ROUTING_THRESHOLD', 0.0)),
+            top_k=int(top_k) if top_k else None,
+            token_budget=int(budget) if budget else None
+        )
+
+    def score(self, hunk: Hunk, static_feedback: List[Feedback]) -> float:
+        """Risk score from static findings, path, change size and keywords"""
+        score = 0.0
+
+        for item in static_feedback:
+            # Static findings carry 1-based positions within the diff
+            line = item.line
+            if isinstance(line, int) and hunk.start < line <= hunk.end + 1:
+                score += SEVERITY_WEIGHTS.get(item.type, 0.5)
+
+        if SENSITIVE_PATHS.search(hunk.path):
+            score += 3.0
+
+        changed = [line[1:] for line in hunk.lines if line[:1] in ('+', '-')]
+        score += min(3.0, math.log2(1 + len(changed)) / 2)
+
+        keyword_hits = sum(1 for line in changed if RISKY_KEYWORDS.search(line))
+        score += min(5.0, keyword_hits * 1.0)
+
+        return round(score, 2)
+
+    def route(self, hunks: List[Hunk], static_feedback: List[Feedback],
+              cost: Callable[[Hunk], int]) -> Tuple[List[Hunk], Dict[str, Any]]:
+        """Select hunks for the LLM, returning them in diff order with a report.
+
+        Hunks that cost nothing (e.g. already cached) are always selected.
+        """
+        scored = [(self.score(hunk, static_feedback), cost(hunk), i, hunk) for i, hunk in enumerate(hunks)]
+
+        free = [entry for entry in scored if entry[1] == 0]
+        candidates = [entry for entry in scored if entry[1] > 0 and entry[0] >= self.threshold]
+        candidates.sort(key=lambda entry: (-entry[0], entry[2]))
+
+        if self.top_k is not None:
+            candidates = candidates[:self.top_k]
+
+        selected = list(free)
+        spent = 0
+        for entry in candidates:
+            if self.token_budget is not None and spent + entry[1] > self.token_budget:
+                continue
+            spent += entry[1]
+            selected.append(entry)
+
+        selected_ids = {entry[2] for entry in selected}
+        skipped_tokens = sum(entry[1] for entry in scored if entry[2] not in selected_ids)
+
+        report = {
+            'threshold': self.threshold,
+            'top_k': self.top_k,
+            'token_budget': self.token_budget,
+            'hunks_total': len(hunks),
+            'hunks_sent': len(selected_ids),
+            'tokens_estimated': spent,
+            'tokens_skipped': skipped_tokens,
+            'hunks': [
+                {'path': hunk.path, 'line': hunk.new_start, 'score': score, 'sent': i in selected_ids}
+                for score, _, i, hunk in scored
+            ]
+        }
+
+        if len(selected_ids) < len(hunks):
+            self.logger.debug(f"Routing {len(selected_ids)}/{len(hunks)} hunks to the LLM "
+                              f"(~{skipped_tokens} tokens skipped)")
+
+        return [hunk for _, _, i, hunk in sorted(selected, key=lambda entry: entry[2])], report
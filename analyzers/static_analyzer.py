@@ -1,8 +1,13 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Union
 from .base_analyzer import BaseAnalyzer
+from models import Feedback
+from utils.mapped_diff import MappedDiff, MappedSections, iter_sections
 from utils.logger import get_logger
 
+# Spilled diffs are scanned this many bytes at a time
+CHUNK_BYTES = 128 * 1024
+
 class StaticAnalyzer(BaseAnalyzer):
     """Performs static analysis on code changes"""
     
@@ -16,59 +21,63 @@ class StaticAnalyzer(BaseAnalyzer):
             'hardcoded_secret': re.compile(r'(password|secret|key|token)\s*=\s*[\'"][^\'"]+[\'"]', re.IGNORECASE)
         }
     
-    def analyze(self, diff: str) -> List[Dict[str, Any]]:
+    def analyze(self, diff: Union[str, MappedDiff, MappedSections]) -> List[Feedback]:
         """Perform static analysis on the diff"""
         feedback = []
-        lines = diff.split('\n')
         
-        for i, line in enumerate(lines):
-            if line.startswith('+') and not line.startswith('+++'):
-                code = line[1:].strip()
-                
-                # Check for various code issues
-                feedback.extend(self._check_print_statements(code, i))
-                feedback.extend(self._check_todo_comments(code, i))
-                feedback.extend(self._check_empty_except(code, i))
-                feedback.extend(self._check_hardcoded_secrets(code, i))
+        for first, text in iter_sections(diff, CHUNK_BYTES):
+            for i, line in enumerate(text.split('\n'), first):
+                if line.startswith('+') and not line.startswith('+++'):
+                    code = line[1:].strip()
+                    
+                    # Check for various code issues
+                    feedback.extend(self._check_print_statements(code, i))
+                    feedback.extend(self._check_todo_comments(code, i))
+                    feedback.extend(self._check_empty_except(code, i))
+                    feedback.extend(self._check_hardcoded_secrets(code, i))
         
         return feedback
     
-    def _check_print_statements(self, code: str, line_num: int) -> List[Dict[str, Any]]:
+    def _check_print_statements(self, code: str, line_num: int) -> List[Feedback]:
         if self.patterns['print_statement'].search(code):
-            return [{
-                "type": "warning",
-                "message": "Consider using logging instead of print statements for production code",
-                "line": line_num + 1,
-                "code": code
-            }]
+            return [Feedback(
+                type="warning",
+                message="Consider using logging instead of print statements for production code",
+                line=line_num + 1,
+                code_snippet=code,
+                rule="print_statement"
+            )]
         return []
     
-    def _check_todo_comments(self, code: str, line_num: int) -> List[Dict[str, Any]]:
+    def _check_todo_comments(self, code: str, line_num: int) -> List[Feedback]:
         if self.patterns['todo_comment'].search(code):
-            return [{
-                "type": "info",
-                "message": "TODO/FIXME comment found - remember to address before merging",
-                "line": line_num + 1,
-                "code": code
-            }]
+            return [Feedback(
+                type="info",
+                message="TODO/FIXME comment found - remember to address before merging",
+                line=line_num + 1,
+                code_snippet=code,
+                rule="todo_comment"
+            )]
         return []
     
-    def _check_empty_except(self, code: str, line_num: int) -> List[Dict[str, Any]]:
+    def _check_empty_except(self, code: str, line_num: int) -> List[Feedback]:
         if self.patterns['empty_except'].search(code):
-            return [{
-                "type": "warning",
-                "message": "Empty except clause found - consider specifying exception types",
-                "line": line_num + 1,
-                "code": code
-            }]
+            return [Feedback(
+                type="warning",
+                message="Empty except clause found - consider specifying exception types",
+                line=line_num + 1,
+                code_snippet=code,
+                rule="empty_except"
+            )]
         return []
     
-    def _check_hardcoded_secrets(self, code: str, line_num: int) -> List[Dict[str, Any]]:
+    def _check_hardcoded_secrets(self, code: str, line_num: int) -> List[Feedback]:
         if self.patterns['hardcoded_secret'].search(code):
-            return [{
-                "type": "error",
-                "message": "Potential hardcoded secret found - use environment variables instead",
-                "line": line_num + 1,
-                "code": code
-            }]
+            return [Feedback(
+                type="error",
+                message="Potential hardcoded secret found - use environment variables instead",
+                line=line_num + 1,
+                code_snippet=code,
+                rule="hardcoded_secret"
+            )]
         return []
\ No newline at end of file
@@ -1,15 +1,27 @@
 import os
-import json
-from flask import Flask, request, jsonify
+import hmac
+import hashlib
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import nullcontext
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 import sys
 sys.path.append('..')
 
-from pr_review_agent import PRReviewAgent
+from pr_review_agent import STATE_MAP, PRReviewAgent, federated_response
+from models.feedback import dumps
+from utils.cache import SearchCache
 from utils.logger import setup_logger
+from utils.concurrency import limiter_snapshots
+from utils.federation import run_federated
+from utils.ledger import ledger_tracker
+from utils.metrics import registry
+from utils.review_history import ReviewHistory
+from utils.scheduler import ReviewScheduler
+from utils.usage import usage_tracker
 
 load_dotenv()
 
@@ -18,6 +30,13 @@ CORS(app)
 
 logger = setup_logger()
 
+# Dashboards poll /api/search every few seconds; see SearchCache
+search_cache = SearchCache.from_env()
+# One connection shared by every review the API runs
+review_history = ReviewHistory.from_env()
+# Reviews wait their turn here, so during a backlog small PRs are not stuck behind giant ones
+review_scheduler = ReviewScheduler.from_env()
+
 SUPPORTED_SERVERS = {
     'github': {
         'name': 'GitHub',
@@ -38,7 +57,10 @@ SUPPORTED_SERVERS = {
     'azure': {
         'name': 'Azure DevOps',
         'env_token': 'AZURE_DEVOPS_TOKEN',
-        'env_url': 'AZURE_DEVOPS_ORG_URL'
+        'env_url': 'AZURE_DEVOPS_ORG_URL',
+        # Adapter option names, when they are not <server>_token and <server>_url
+        'token_option': 'azure_devops_token',
+        'url_option': 'azure_devops_org_url'
     }
 }
 
@@ -79,56 +101,103 @@ def search_prs():
         state = request.args.get('state', 'open')
         limit = int(request.args.get('limit', 10))
         
+        if state not in ('open', 'closed', 'all'):
+            return jsonify({'error': f'Unsupported state: {state}'}), 400
+        if server == 'all':
+            return _search_all(query, username, repo_url, state, limit)
         if server not in SUPPORTED_SERVERS:
             return jsonify({'error': f'Unsupported server: {server}'}), 400
         
-        agent_config = _get_agent_config(server)
-        agent = PRReviewAgent(git_server=server, **agent_config)
-        
-        state_map = {
-            'github': {
-                'open': 'open',
-                'closed': 'closed',
-                'all': 'all'
-            },
-            'gitlab': {
-                'open': 'opened',
-                'closed': 'closed',
-                'all': 'all'
-            },
-            'bitbucket': {
-                'open': 'OPEN',
-                'closed': 'MERGED',
-                'all': 'ALL'
-            },
-            'azure': {
-                'open': 'active',
-                'closed': 'completed',
-                'all': 'all'
-            }
-        }
-        
-        server_state = state_map[server][state]
-        
-        prs = agent.search_prs(
-            query=query,
-            state=server_state,
-            limit=limit,
-            username=username,
-            repo_url=repo_url
-        )
+        try:
+            prs, cache_status = _search_server(server, query, username, repo_url, state, limit,
+                                               float(os.environ.get('SEARCH_TIMEOUT', 10)))
+        except FutureTimeout:
+            return jsonify({'error': f'{server} did not answer in time'}), 504
         
-        return jsonify({
+        response = jsonify({
             'server': server,
             'query': query,
             'state': state,
             'results': prs
         })
+        response.headers['X-Cache'] = cache_status
+        return response
         
     except Exception as e:
         logger.error(f"Error searching PRs: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _search_server(server: str, query: Optional[str], username: Optional[str], repo_url: Optional[str],
+                   state: str, limit: int, timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """One server's search results, through the search cache, and the cache status.
+    
+    Waits at most ``timeout`` seconds for another request's identical search.
+    """
+    def load():
+        agent = PRReviewAgent(git_server=server, **_get_agent_config(server))
+        return agent.search_prs(
+            query=query,
+            state=STATE_MAP[server][state],
+            limit=limit,
+            username=username,
+            repo_url=repo_url
+        )
+    
+    if search_cache is None:
+        return load(), 'disabled'
+    return search_cache.get(SearchCache.key(server, query, username, repo_url, state, limit), load, timeout)
+
+def _search_all(query: Optional[str], username: Optional[str], repo_url: Optional[str], state: str, limit: int):
+    """Every configured server searched concurrently; slow or failing servers are reported, not fatal"""
+    if repo_url:
+        return jsonify({'error': 'A repo filter needs a single server'}), 400
+    servers = [server for server, info in SUPPORTED_SERVERS.items() if os.environ.get(info['env_token'])]
+    if not servers:
+        return jsonify({'error': 'No git server is configured'}), 400
+    
+    timeout = float(request.args.get('timeout', os.environ.get('SEARCH_TIMEOUT', 10)))
+    cache_status = {}
+    
+    def search(server: str):
+        prs, cache_status[server] = _search_server(server, query, username, None, state, limit, timeout)
+        return prs
+    
+    # A timed-out search keeps running and lands in the cache, so the next call usually has it
+    outcomes = run_federated({server: (lambda server=server: search(server)) for server in servers}, timeout)
+    federated = federated_response(outcomes, limit)
+    for server, status in federated['servers'].items():
+        status['cache'] = cache_status.get(server)
+    
+    return jsonify({
+        'server': 'all',
+        'query': query,
+        'state': state,
+        **federated
+    })
+
+@app.route('/api/webhook', methods=['POST'])
+def webhook():
+    """Pull request events from GitHub, GitLab, Bitbucket or Azure DevOps; drops cached searches they affect"""
+    secret = os.environ.get('WEBHOOK_SECRET')
+    if not secret:
+        # Anyone could otherwise empty the cache and send every dashboard to the git hosts
+        return jsonify({'error': 'Webhooks are disabled: WEBHOOK_SECRET is not set'}), 403
+    if not _verify_webhook(secret):
+        return jsonify({'error': 'Invalid webhook signature'}), 401
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Webhook body must be a JSON object'}), 400
+    
+    event = _pr_event(request.headers, payload)
+    if event is None:
+        return jsonify({'ignored': True})
+    
+    server, repo_url = event
+    invalidated = search_cache.invalidate(server, repo_url) if search_cache is not None else 0
+    logger.info(f"Webhook for {server} {repo_url}: {invalidated} cached searches invalidated")
+    return jsonify({'server': server, 'repo': repo_url, 'invalidated': invalidated})
+
 @app.route('/api/review', methods=['POST'])
 def review_pr():
     try:
@@ -138,6 +207,7 @@ def review_pr():
         repo_url = data.get('repo_url')
         pr_id = data.get('pr_id')
         post_comments = data.get('post_comments', False)
+        request_budget = data.get('request_budget')
         
         if not repo_url or not pr_id:
             return jsonify({'error': 'repo_url and pr_id are required'}), 400
@@ -145,22 +215,215 @@ def review_pr():
         if server not in SUPPORTED_SERVERS:
             return jsonify({'error': f'Unsupported server: {server}'}), 400
         
+        try:
+            request_budget = int(request_budget) if request_budget is not None else None
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        priority, error = _review_priority(data, os.environ.get('REVIEW_API_PRIORITY', 'normal'))
+        if error:
+            return error
+        
         agent_config = _get_agent_config(server)
         agent = PRReviewAgent(git_server=server, **agent_config)
         
-        result = agent.review_pr(repo_url, pr_id, post_comments)
+        with _review_slot(agent, repo_url, pr_id, priority):
+            result = agent.review_pr(repo_url, pr_id, post_comments, request_budget=request_budget)
         
-        return jsonify({
+        # Findings are encoded straight from their columns, which matters for large PRs
+        payload = dumps({
             'server': server,
             'repo_url': repo_url,
             'pr_id': pr_id,
-            'result': result
+            'result': {**result, 'feedback': result['feedback'].to_dicts()}
         })
+        return Response(payload, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error reviewing PR: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/review/stream', methods=['POST'])
+def review_pr_stream():
+    """Stream review events as newline-delimited JSON"""
+    data = request.get_json()
+    
+    server = data.get('server', 'github')
+    repo_url = data.get('repo_url')
+    pr_id = data.get('pr_id')
+    
+    if not repo_url or not pr_id:
+        return jsonify({'error': 'repo_url and pr_id are required'}), 400
+    
+    if server not in SUPPORTED_SERVERS:
+        return jsonify({'error': f'Unsupported server: {server}'}), 400
+    
+    # Someone is watching the findings arrive
+    priority, error = _review_priority(data, os.environ.get('REVIEW_STREAM_PRIORITY', 'interactive'))
+    if error:
+        return error
+    
+    agent_config = _get_agent_config(server)
+    agent = PRReviewAgent(git_server=server, **agent_config)
+    
+    def generate():
+        try:
+            # The slot is given back when the client disconnects and the generator is closed
+            with _review_slot(agent, repo_url, pr_id, priority):
+                for event in agent.iter_review(repo_url, pr_id):
+                    if 'finding' in event:
+                        event = {**event, 'finding': event['finding'].to_dict()}
+                    yield dumps(event) + b'\n'
+        except Exception as e:
+            logger.error(f"Error reviewing PR: {e}")
+            yield dumps({'event': 'error', 'error': str(e)}) + b'\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/usage', methods=['GET'])
+def llm_usage():
+    """LLM token, cost and latency rollups per repository and per day"""
+    snapshot = usage_tracker.snapshot()
+    
+    repo_url = request.args.get('repo')
+    if repo_url:
+        snapshot['by_repo'] = {repo_url: snapshot['by_repo'].get(repo_url)}
+    
+    return jsonify(snapshot)
+
+@app.route('/api/ledger', methods=['GET'])
+def request_ledger():
+    """Git host requests per repository: totals, status codes, endpoints and last seen rate limits"""
+    snapshot = ledger_tracker.snapshot()
+    
+    repo_url = request.args.get('repo')
+    if repo_url:
+        snapshot = {repo_url: snapshot.get(repo_url)}
+    
+    return jsonify(snapshot)
+
+@app.route('/api/history/reviews', methods=['GET'])
+def history_reviews():
+    """Most recent reviews with score, finding counts and stage timings; filter by repo, author and pr"""
+    if review_history is None:
+        return jsonify({'error': 'Review history is disabled'}), 404
+    pr_id = request.args.get('pr')
+    try:
+        return jsonify(review_history.reviews(
+            repo_url=request.args.get('repo'),
+            author=request.args.get('author'),
+            pr_id=int(pr_id) if pr_id else None,
+            limit=int(request.args.get('limit', 50))
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/history/trend', methods=['GET'])
+def history_trend():
+    """Daily review count, score and findings from the rollups; filter by repo and author"""
+    if review_history is None:
+        return jsonify({'error': 'Review history is disabled'}), 404
+    try:
+        return jsonify(review_history.trend(
+            repo_url=request.args.get('repo'),
+            author=request.args.get('author'),
+            days=int(request.args.get('days', 30))
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/history/top', methods=['GET'])
+def history_top():
+    """Rules, authors or repositories (by=) with the most findings over the last days"""
+    if review_history is None:
+        return jsonify({'error': 'Review history is disabled'}), 404
+    try:
+        return jsonify(review_history.top(
+            by=request.args.get('by', 'rule'),
+            repo_url=request.args.get('repo'),
+            author=request.args.get('author'),
+            rule=request.args.get('rule'),
+            days=int(request.args.get('days', 30)),
+            limit=int(request.args.get('limit', 10))
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_status():
+    """Busy workers, the next queued reviews in start order, and queue wait per SLA class"""
+    if review_scheduler is None:
+        return jsonify({'error': 'Review scheduling is disabled'}), 404
+    try:
+        queued = int(request.args.get('limit', 20))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(review_scheduler.snapshot(queued=queued))
+
+@app.route('/api/llm/concurrency', methods=['GET'])
+def llm_concurrency():
+    """Current adaptive concurrency limit, in-flight requests and queue depth per LLM backend"""
+    return jsonify(limiter_snapshots())
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Stage latencies, diff sizes, finding counts, cache hits and upstream status codes for Prometheus"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _review_priority(data: Dict[str, Any], default: str) -> Tuple[str, Optional[Tuple[Response, int]]]:
+    """SLA class of an API review and an error response, if any.
+    
+    Callers may ask for a class below the endpoint's ``default``; a class
+    with a shorter target wait needs the REVIEW_PRIORITY_TOKEN in an
+    X-Priority-Token header, so the classes keep meaning something.
+    """
+    priority = data.get('priority') or default
+    if review_scheduler is None:
+        return priority, None
+    classes = review_scheduler.classes
+    if priority not in classes:
+        return priority, (jsonify({'error': f'Unknown priority: {priority}'}), 400)
+    if default in classes and classes[priority]['target'] < classes[default]['target']:
+        token = os.environ.get('REVIEW_PRIORITY_TOKEN')
+        if not token or not hmac.compare_digest(request.headers.get('X-Priority-Token', ''), token):
+            return priority, (jsonify({'error': f'Priority {priority} requires a priority token'}), 403)
+    return priority, None
+
+def _review_slot(agent: PRReviewAgent, repo_url: str, pr_id: int, priority: str):
+    """Wait for the review's turn on the scheduler, priced by the PR's diff stats; no wait when disabled"""
+    if review_scheduler is None:
+        return nullcontext()
+    return review_scheduler.slot(repo_url, pr_id, agent.estimate_cost(repo_url, pr_id), priority)
+
+def _verify_webhook(secret: str) -> bool:
+    """GitHub/Bitbucket HMAC signature, GitLab secret token, or an X-Webhook-Token header (Azure custom header)"""
+    signature = request.headers.get('X-Hub-Signature-256')
+    if signature:
+        expected = 'sha256=' + hmac.new(secret.encode(), request.get_data(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature, expected)
+    token = request.headers.get('X-Gitlab-Token') or request.headers.get('X-Webhook-Token')
+    return token is not None and hmac.compare_digest(token, secret)
+
+def _pr_event(headers, payload: Dict[str, Any]) -> Optional[Tuple[str, Optional[str]]]:
+    """(server, repository URL) of a pull request event, or None for other events"""
+    try:
+        if headers.get('X-GitHub-Event') == 'pull_request':
+            return 'github', payload['repository']['html_url']
+        if headers.get('X-Gitlab-Event') == 'Merge Request Hook':
+            return 'gitlab', payload['project']['web_url']
+        if headers.get('X-Event-Key', '').startswith('pullrequest:'):
+            return 'bitbucket', payload['repository']['links']['html']['href']
+        if payload.get('eventType', '').startswith('git.pullrequest.'):
+            return 'azure', payload['resource']['repository']['remoteUrl']
+    except (KeyError, TypeError):
+        # A PR event without a recognizable repository: drop every cached search of that server
+        for header, server in (('X-GitHub-Event', 'github'), ('X-Gitlab-Event', 'gitlab'),
+                               ('X-Event-Key', 'bitbucket')):
+            if header in headers:
+                return server, None
+        return 'azure', None
+    return None
+
 def _get_agent_config(server: str) -> Dict[str, Any]:
 
     server_info = SUPPORTED_SERVERS[server]
@@ -169,17 +432,20 @@ def _get_agent_config(server: str) -> Dict[str, Any]:
     # Add token
     token = os.environ.get(server_info['env_token'])
     if token:
-        config[f'{server}_token'] = token
+        config[server_info.get('token_option', f'{server}_token')] = token
     
     if 'env_url' in server_info:
         url = os.environ.get(server_info['env_url'])
         if url:
-            config[f'{server}_url'] = url
+            config[server_info.get('url_option', f'{server}_url')] = url
     
     gemini_key = os.environ.get('GEMINI_API_KEY')
     if gemini_key:
         config['gemini_api_key'] = gemini_key
     
+    if review_history is not None:
+        config['history'] = review_history
+    
     return config
 
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+"""End-to-end review benchmark on recorded traffic.
+
+    # Record real reviews once (needs tokens); writes every adapter and LLM exchange to a cassette
+    python -m benchmarks.e2e record --server github --repo https://github.com/owner/repo --pr 12 --pr 15 \\
+        --cassette benchmarks/cassettes/github-repo.json
+
+    # Replay them offline, as many times and as concurrently as wanted
+    python -m benchmarks.e2e run benchmarks/cassettes/github-repo.json --reviews 200 --concurrency 8 \\
+        --latency-ms 40 --jitter-ms 20 --error-rate 0.02
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Every review must go through HTTP: no cached findings, stored state or local mirror
+os.environ.update(FINDINGS_CACHE_DISABLED='true', REVIEW_STATE_DISABLED='true', GIT_MIRROR_ENABLED='false',
+                  REVIEW_HISTORY_DISABLED='true')
+
+from pr_review_agent import PRReviewAgent
+from utils.cassette import Cassette, RecordingTransport, ReplayTransport
+from utils.config import load_config
+from utils.http import set_transport
+
+# Settings that change which requests are made; recorded so replays send the same ones
+REPLAY_ENV = ('LLM_BACKENDS', 'GEMINI_MODEL', 'GEMINI_API_BASE', 'GEMINI_STREAM', 'LLM_ROUTING_THRESHOLD',
+              'LLM_ROUTING_TOP_K', 'LLM_TOKEN_BUDGET', 'NOISE_FILTER_DISABLED', 'NOISE_FILTER_PATTERNS')
+
+SERVER_SETTINGS = {
+    'github': {'github_token': 'GITHUB_TOKEN'},
+    'gitlab': {'gitlab_token': 'GITLAB_TOKEN', 'gitlab_url': 'GITLAB_URL'},
+    'bitbucket': {'bitbucket_token': 'BITBUCKET_TOKEN', 'bitbucket_url': 'BITBUCKET_URL'},
+    'azure': {'azure_devops_token': 'AZURE_DEVOPS_TOKEN', 'azure_devops_org_url': 'AZURE_DEVOPS_ORG_URL'},
+}
+
+PLATFORM_HOSTS = {
+    'github': ('github.com',),
+    'gitlab': ('gitlab',),
+    'bitbucket': ('bitbucket.org',),
+    'azure': ('dev.azure.com', 'visualstudio.com'),
+    'gemini': ('generativelanguage.googleapis.com',),
+}
+
+
+def platform_of(host: str) -> str:
+    for platform, patterns in PLATFORM_HOSTS.items():
+        if any(pattern in host for pattern in patterns):
+            return platform
+    return host
+
+
+def _agent_kwargs(server: str, urls: Dict[str, str], replay: bool, llm: bool = True) -> Dict[str, Any]:
+    kwargs = {}
+    for key, env in SERVER_SETTINGS[server].items():
+        if key.endswith('_url'):
+            if urls.get(key):
+                kwargs[key] = urls[key]
+        else:
+            # Credentials are never recorded; any value works against a cassette
+            kwargs[key] = 'replay' if replay else os.environ.get(env)
+    if llm:
+        kwargs['gemini_api_key'] = 'replay' if replay else os.environ.get('GEMINI_API_KEY')
+    return kwargs
+
+
+def record(args) -> int:
+    load_config()
+    urls = {key: os.environ[env] for key, env in SERVER_SETTINGS[args.server].items()
+            if key.endswith('_url') and os.environ.get(env)}
+    transport = RecordingTransport()
+    set_transport(transport)
+
+    agent = PRReviewAgent(git_server=args.server, **_agent_kwargs(args.server, urls, replay=False))
+    reviews = []
+    for pr_id in args.pr:
+        started = time.perf_counter()
+        result = agent.review_pr(args.repo, pr_id, args.post_comments, incremental=False)
+        print(f"Recorded PR #{pr_id}: {len(result['feedback'])} findings in {time.perf_counter() - started:.1f}s")
+        reviews.append({'repo_url': args.repo, 'pr_id': pr_id})
+    set_transport(None)
+
+    cassette = transport.cassette
+    cassette.meta = {
+        'server': args.server,
+        'urls': urls,
+        'reviews': reviews,
+        'post_comments': args.post_comments,
+        'llm': bool(agent.analyzer.gemini_analyzer and agent.analyzer.gemini_analyzer.enabled),
+        'env': {key: os.environ[key] for key in REPLAY_ENV if key in os.environ},
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.cassette)), exist_ok=True)
+    cassette.save(args.cassette)
+    print(f"Saved {len(cassette.interactions)} exchanges to {args.cassette}")
+    return 0
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def run(args) -> int:
+    cassettes = [Cassette.load(path) for path in args.cassettes]
+    for key in REPLAY_ENV:
+        os.environ.pop(key, None)
+    os.environ.update(cassettes[-1].meta.get('env', {}))
+    if len({json.dumps(c.meta.get('env', {}), sort_keys=True) for c in cassettes}) > 1:
+        print("Warning: cassettes were recorded with different LLM settings; the last one's are used",
+              file=sys.stderr)
+
+    transport = ReplayTransport(cassettes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                latency_scale=args.latency_scale, error_rate=args.error_rate,
+                                error_status=args.error_status, seed=args.seed)
+    set_transport(transport)
+
+    jobs = [(cassette.meta, review) for cassette in cassettes for review in cassette.meta.get('reviews', [])]
+    if not jobs:
+        print("No reviews recorded in the given cassettes", file=sys.stderr)
+        return 2
+
+    def review(index: int) -> Dict[str, Any]:
+        meta, target = jobs[index % len(jobs)]
+        kwargs = _agent_kwargs(meta['server'], meta.get('urls', {}), replay=True, llm=meta.get('llm', True))
+        agent = PRReviewAgent(git_server=meta['server'], **kwargs)
+        started = time.perf_counter()
+        try:
+            result = agent.review_pr(target['repo_url'], target['pr_id'], meta.get('post_comments', False),
+                                     incremental=False)
+            return {'ok': True, 'latency': time.perf_counter() - started, 'findings': len(result['feedback'])}
+        except Exception as e:
+            return {'ok': False, 'latency': time.perf_counter() - started, 'error': type(e).__name__}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(review, range(args.reviews)))
+    elapsed = time.perf_counter() - started
+    set_transport(None)
+
+    latencies = [outcome['latency'] * 1000 for outcome in outcomes if outcome['ok']]
+    calls = Counter()
+    for host, count in transport.calls.items():
+        calls[platform_of(host)] += count
+    summary = {
+        'reviews': len(outcomes),
+        'failed': sum(1 for outcome in outcomes if not outcome['ok']),
+        'errors': dict(Counter(outcome['error'] for outcome in outcomes if not outcome['ok'])),
+        'elapsed_s': round(elapsed, 3),
+        'reviews_per_s': round(len(outcomes) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 0.50), 1),
+            'p90': round(_percentile(latencies, 0.90), 1),
+            'p99': round(_percentile(latencies, 0.99), 1),
+            'mean': round(statistics.mean(latencies), 1) if latencies else 0.0,
+        },
+        'upstream_calls': dict(calls),
+        'upstream_calls_per_review': {name: round(count / len(outcomes), 2) for name, count in calls.items()},
+        'injected_errors': transport.injected_errors,
+        'cassette_misses': transport.misses,
+    }
+
+    print(f"Reviews: {summary['reviews']} ({summary['failed']} failed) in {summary['elapsed_s']}s "
+          f"-> {summary['reviews_per_s']} reviews/s at concurrency {args.concurrency}")
+    print(f"Latency: p50 {summary['latency_ms']['p50']} ms, p90 {summary['latency_ms']['p90']} ms, "
+          f"p99 {summary['latency_ms']['p99']} ms")
+    for name, count in sorted(calls.items()):
+        print(f"Upstream {name}: {count} calls ({summary['upstream_calls_per_review'][name]} per review)")
+    if transport.injected_errors or transport.misses:
+        print(f"Injected errors: {transport.injected_errors}, cassette misses: {transport.misses}")
+    if summary['errors']:
+        print(f"Failures: {summary['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='End-to-end review benchmark on recorded traffic')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Review PRs against the live services and record them')
+    record_parser.add_argument('--server', choices=list(SERVER_SETTINGS), default='github', help='Git server')
+    record_parser.add_argument('--repo', required=True, help='Repository URL')
+    record_parser.add_argument('--pr', type=int, action='append', required=True, help='Pull request ID (repeatable)')
+    record_parser.add_argument('--cassette', required=True, help='Cassette file to write')
+    record_parser.add_argument('--post-comments', action='store_true',
+                               help='Also record posting comments (they are really posted)')
+
+    run_parser = subparsers.add_parser('run', help='Replay cassettes and measure reviews')
+    run_parser.add_argument('cassettes', nargs='+', help='Cassette files')
+    run_parser.add_argument('--reviews', type=int, default=50, help='Total reviews, cycling over the recorded PRs')
+    run_parser.add_argument('--concurrency', type=int, default=4, help='Reviews in flight')
+    run_parser.add_argument('--latency-ms', type=float, default=0.0, help='Added latency per upstream call')
+    run_parser.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random latency, up to this much')
+    run_parser.add_argument('--latency-scale', type=float,
+                            help='Replay recorded latencies multiplied by this instead (1.0 = as recorded)')
+    run_parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of upstream calls that fail')
+    run_parser.add_argument('--error-status', type=int, default=503,
+                            help='HTTP status of injected failures; 0 for connection errors')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--json', help='Also write the summary to this file')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    return record(args) if args.command == 'record' else run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
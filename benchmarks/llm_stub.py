@@ -0,0 +1,232 @@
+"""Local stand-in for the LLM backends, replaying recorded answers.
+
+    # Serve recorded answers, 300 ms to the first byte, streamed 40 characters every 50 ms
+    python -m benchmarks.llm_stub --port 8089 --answers answers.json --latency-ms 300 --chunk-ms 50
+
+    # Point the agent at it
+    GEMINI_API_BASE=http://127.0.0.1:8089/v1beta
+    LLM_BACKENDS=gemini:gemini-2.0-flash,openai:http://127.0.0.1:8089/v1#stub
+
+Serves Gemini generateContent and streamGenerateContent (SSE) and OpenAI-compatible
+/chat/completions, streamed or not. Answers are served in order, wrapping around.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from utils.tokens import estimate_tokens
+
+
+class _Server(ThreadingHTTPServer):
+    # Requests still sleeping (e.g. a hedged primary) must not hold up stop()
+    daemon_threads = True
+    block_on_close = False
+
+
+class LLMStub:
+    """Threaded HTTP server answering LLM requests with canned text.
+
+    ``answers`` are JSON texts (findings arrays), served in turn. The first
+    ``fail_first`` requests get ``fail_status`` instead, with ``retry_after``
+    as Retry-After when set. ``latency_ms`` delays the first byte and
+    ``chunk_ms`` each streamed piece of ``chunk_chars`` characters. Received
+    requests are kept in ``requests`` as (path, body).
+    """
+
+    def __init__(self, answers: Optional[List[str]] = None, latency_ms: float = 0.0, chunk_ms: float = 0.0,
+                 chunk_chars: int = 40, fail_first: int = 0, fail_status: int = 503,
+                 retry_after: Optional[str] = None, host: str = '127.0.0.1', port: int = 0):
+        self.answers = answers or ['[]']
+        self.latency_ms = latency_ms
+        self.chunk_ms = chunk_ms
+        self.chunk_chars = max(1, chunk_chars)
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests: List[tuple] = []
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def gemini_base(self) -> str:
+        """Value for GEMINI_API_BASE"""
+        return f"{self.url}/v1beta"
+
+    @property
+    def openai_base(self) -> str:
+        """Base URL of an ``openai:`` backend"""
+        return f"{self.url}/v1"
+
+    def start(self) -> 'LLMStub':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='llm-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'LLMStub':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next(self, path: str, body: Dict[str, Any]) -> Optional[str]:
+        """The answer for this request, or None if it is to fail"""
+        with self._lock:
+            self.requests.append((path, body))
+            count = len(self.requests)
+        if count <= self.fail_first:
+            return None
+        return self.answers[(count - self.fail_first - 1) % len(self.answers)]
+
+    def _pieces(self, text: str) -> Iterator[str]:
+        for start in range(0, len(text), self.chunk_chars):
+            if start and self.chunk_ms:
+                time.sleep(self.chunk_ms / 1000)
+            yield text[start:start + self.chunk_chars]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Chunked streams, like the real backends, so clients see each event as it is sent
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._json(400, {'error': 'invalid JSON'})
+                path = self.path.split('?', 1)[0]
+                if path.endswith(':generateContent') or path.endswith(':streamGenerateContent'):
+                    prompt = ''.join(part.get('text', '') for content in body.get('contents', [])
+                                     for part in content.get('parts', []))
+                    kind = 'gemini'
+                elif path.endswith('/chat/completions'):
+                    prompt = ''.join(message.get('content') or '' for message in body.get('messages', []))
+                    kind = 'openai'
+                else:
+                    return self._json(404, {'error': f'no such endpoint {path}'})
+
+                answer = stub._next(path, body)
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+                if answer is None:
+                    headers = {'Retry-After': stub.retry_after} if stub.retry_after else {}
+                    return self._json(stub.fail_status, {'error': 'stub failure'}, headers)
+
+                usage = (estimate_tokens(prompt), estimate_tokens(answer))
+                streamed = path.endswith(':streamGenerateContent') or body.get('stream')
+                if kind == 'gemini':
+                    if streamed:
+                        return self._sse(self._gemini_events(answer, usage))
+                    return self._json(200, self._gemini(answer, usage, 'STOP'))
+                if streamed:
+                    return self._sse(self._openai_events(answer, usage))
+                return self._json(200, {
+                    'choices': [{'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': usage[0], 'completion_tokens': usage[1]}
+                })
+
+            def _gemini(self, text: str, usage: tuple, finish_reason: Optional[str]) -> Dict[str, Any]:
+                candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}}
+                data = {'candidates': [candidate]}
+                if finish_reason:
+                    candidate['finishReason'] = finish_reason
+                    data['usageMetadata'] = {'promptTokenCount': usage[0], 'candidatesTokenCount': usage[1]}
+                return data
+
+            def _gemini_events(self, answer: str, usage: tuple) -> Iterator[Dict[str, Any]]:
+                # The last piece carries the finish reason, so each is sent once the next one exists
+                previous = None
+                for piece in stub._pieces(answer):
+                    if previous is not None:
+                        yield self._gemini(previous, usage, None)
+                    previous = piece
+                yield self._gemini(previous or '', usage, 'STOP')
+
+            def _openai_events(self, answer: str, usage: tuple) -> Iterator[Dict[str, Any]]:
+                for piece in stub._pieces(answer):
+                    yield {'choices': [{'delta': {'content': piece}, 'finish_reason': None}]}
+                yield {'choices': [{'delta': {}, 'finish_reason': 'stop'}],
+                       'usage': {'prompt_tokens': usage[0], 'completion_tokens': usage[1]}}
+
+            def _json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None):
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _sse(self, events: Iterator[Dict[str, Any]]):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for event in events:
+                    self._chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b'')
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def load_answers(path: str) -> List[str]:
+    """Answers from a JSON file: a list of answer texts or of findings arrays"""
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a JSON list of answers")
+    return [item if isinstance(item, str) else json.dumps(item) for item in data]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Local LLM stub server replaying recorded answers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--answers', help='JSON file with the answers to replay (default: no findings)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay before the first byte')
+    parser.add_argument('--chunk-ms', type=float, default=0.0, help='Delay between streamed pieces')
+    parser.add_argument('--chunk-chars', type=int, default=40, help='Characters per streamed piece')
+    parser.add_argument('--fail-first', type=int, default=0, help='Fail this many requests first')
+    parser.add_argument('--fail-status', type=int, default=503, help='HTTP status of those failures')
+    parser.add_argument('--retry-after', help='Retry-After header sent with failures')
+    args = parser.parse_args(argv)
+
+    stub = LLMStub(load_answers(args.answers) if args.answers else None, latency_ms=args.latency_ms,
+                   chunk_ms=args.chunk_ms, chunk_chars=args.chunk_chars, fail_first=args.fail_first,
+                   fail_status=args.fail_status, retry_after=args.retry_after, host=args.host, port=args.port)
+    print(f"LLM stub on {stub.url} (GEMINI_API_BASE={stub.gemini_base}, openai:{stub.openai_base}#stub)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""Microbenchmarks for the analysis hot paths.
+
+    python -m benchmarks.run                      # medium profile, compared with baselines.json
+    python -m benchmarks.run --profile large --filter static
+    python -m benchmarks.run --save-baseline      # record the current numbers
+    python -m benchmarks.run --check              # exit 1 on a regression (CI)
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import logging
+import platform
+import statistics
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault('FINDINGS_CACHE_DISABLED', 'true')
+
+from analyzers.code_analyzer import CodeAnalyzer
+from analyzers.gemini_analyzer import GeminiAnalyzer
+from analyzers.json_stream import JSONArrayStream
+from analyzers.noise_filter import NoiseFilter
+from analyzers.static_analyzer import StaticAnalyzer
+from benchmarks.synthetic import generate_diff, generate_feedback, generate_response
+from models import FeedbackBatch
+from pr_review_agent import PRReviewAgent
+from utils.diff_parser import parse_hunks
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+PROFILES = {
+    'small': {'files': 10, 'hunks_per_file': 3, 'hunk_lines': 20, 'findings': 500, 'responses': 20},
+    'medium': {'files': 100, 'hunks_per_file': 4, 'hunk_lines': 30, 'findings': 10000, 'responses': 200},
+    'large': {'files': 1000, 'hunks_per_file': 5, 'hunk_lines': 40, 'findings': 200000, 'responses': 1000},
+}
+
+# A case returns the callable to time, the amount of work it does and the unit of that amount
+Case = Callable[[Dict[str, Any]], Tuple[Callable[[], Any], int, str]]
+
+
+def _static_analyze(data):
+    analyzer = StaticAnalyzer()
+    return lambda: analyzer.analyze(data['diff']), len(data['diff']), 'B'
+
+
+def _noise_filter(data):
+    noise_filter = NoiseFilter()
+    return lambda: noise_filter.filter(data['diff']), len(data['diff']), 'B'
+
+
+def _parse_hunks(data):
+    return lambda: parse_hunks(data['diff']), len(data['diff']), 'B'
+
+
+def _unseen(data):
+    analyzer = CodeAnalyzer(use_ai=False)
+    return lambda: list(analyzer._unseen(data['feedback'], set())), len(data['feedback']), 'findings'
+
+
+def _score(data):
+    agent = PRReviewAgent.__new__(PRReviewAgent)
+    return lambda: agent._calculate_score(data['batch']), len(data['batch']), 'findings'
+
+
+def _prompt_build(data):
+    gemini = data['gemini']
+    return lambda: [gemini._hunk_prompt(hunk) for hunk in data['hunks']], len(data['hunks']), 'hunks'
+
+
+def _cache_key(data):
+    gemini = data['gemini']
+    return lambda: [gemini._cache_key(hunk) for hunk in data['hunks']], len(data['hunks']), 'hunks'
+
+
+def _response_parse(data):
+    gemini = data['gemini']
+    return (lambda: [gemini._parse_response(text, 'STOP') for text in data['responses']],
+            len(data['responses']), 'responses')
+
+
+def _stream_parse(data):
+    chunks = [[text[i:i + 64] for i in range(0, len(text), 64)] for text in data['responses']]
+
+    def run():
+        for response in chunks:
+            parser = JSONArrayStream()
+            for chunk in response:
+                parser.feed(chunk)
+    return run, len(chunks), 'responses'
+
+
+def _batch_build(data):
+    return lambda: FeedbackBatch(data['feedback']), len(data['feedback']), 'findings'
+
+
+def _serialize_json(data):
+    return data['batch'].to_json, len(data['batch']), 'findings'
+
+
+def _serialize_ndjson(data):
+    return data['batch'].to_ndjson, len(data['batch']), 'findings'
+
+
+CASES: Dict[str, Case] = {
+    'static_analyze': _static_analyze,
+    'noise_filter': _noise_filter,
+    'parse_hunks': _parse_hunks,
+    'unseen': _unseen,
+    'score': _score,
+    'prompt_build': _prompt_build,
+    'cache_key': _cache_key,
+    'response_parse': _response_parse,
+    'stream_parse': _stream_parse,
+    'batch_build': _batch_build,
+    'serialize_json': _serialize_json,
+    'serialize_ndjson': _serialize_ndjson,
+}
+
+
+def build_data(profile: Dict[str, Any], hit_density: float, seed: int) -> Dict[str, Any]:
+    diff = generate_diff(profile['files'], profile['hunks_per_file'], profile['hunk_lines'],
+                         hit_density=hit_density, seed=seed)
+    feedback = generate_feedback(profile['findings'], seed=seed)
+    return {
+        'diff': diff,
+        'hunks': parse_hunks(diff),
+        'feedback': feedback,
+        'batch': FeedbackBatch(feedback),
+        'responses': [generate_response(12, seed=seed + i) for i in range(profile['responses'])],
+        'gemini': GeminiAnalyzer('benchmark-key'),
+    }
+
+
+def _time(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def _reference_work():
+    table: Dict[int, int] = {}
+    for i in range(20000):
+        table[i % 512] = table.get(i % 512, 0) + len(str(i))
+    return table
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Wall times over ``repeat`` runs, then peak and retained memory of one traced run.
+
+    Each run is paired with a run of a fixed pure-Python workload right
+    before it, and ``relative`` is the median of the per-run ratios. Shared
+    runners change speed from minute to minute; pairing factors the machine
+    out of baseline comparisons.
+    """
+    fn()
+    _reference_work()
+    times = []
+    ratios = []
+    for _ in range(repeat):
+        reference = _time(_reference_work)
+        elapsed = _time(fn)
+        times.append(elapsed)
+        ratios.append(elapsed / reference)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        'median_ms': statistics.median(times) * 1000,
+        'min_ms': min(times) * 1000,
+        'relative': statistics.median(ratios),
+        'peak_kb': (peak - before) / 1024,
+        'retained_kb': (current - before) / 1024,
+    }
+
+
+def run(names: List[str], data: Dict[str, Any], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name in names:
+        fn, amount, unit = CASES[name](data)
+        stats = measure(fn, repeat)
+        per_second = amount / (stats['median_ms'] / 1000) if stats['median_ms'] else float('inf')
+        results[name] = {**stats, 'throughput': per_second, 'unit': f"{unit}/s"}
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            time_tolerance: float, memory_tolerance: float) -> Dict[str, List[str]]:
+    """Regressions per case: relative time or peak memory above baseline by more than the tolerance.
+
+    Time is in units of the calibration workload, so baselines carry over between machines.
+    """
+    regressions = {}
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        problems = []
+        if stats['relative'] > base['relative'] * (1 + time_tolerance):
+            problems.append(f"time {stats['relative'] / base['relative']:.2f}x")
+        # Small absolute slack so tiny cases do not flap on allocator noise
+        if stats['peak_kb'] > base['peak_kb'] * (1 + memory_tolerance) + 64:
+            problems.append(f"peak memory {stats['peak_kb'] / max(base['peak_kb'], 1):.2f}x")
+        if problems:
+            regressions[name] = problems
+    return regressions
+
+
+def _format_throughput(value: float, unit: str) -> str:
+    if unit == 'B/s':
+        return f"{value / 1024 / 1024:,.1f} MB/s"
+    return f"{value:,.0f} {unit}"
+
+
+def report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+           regressions: Dict[str, List[str]]):
+    print(f"{'case':<18} {'median ms':>10} {'best ms':>9} {'throughput':>20} {'peak KB':>11} {'retained KB':>12} "
+          f"{'vs baseline':>12}")
+    print('-' * 98)
+    for name, stats in results.items():
+        base = baseline.get(name)
+        delta = f"{stats['relative'] / base['relative']:.2f}x" if base and base['relative'] else '-'
+        flag = '  REGRESSION: ' + ', '.join(regressions[name]) if name in regressions else ''
+        print(f"{name:<18} {stats['median_ms']:>10.2f} {stats['min_ms']:>9.2f} {_format_throughput(stats['throughput'], stats['unit']):>20} "
+              f"{stats['peak_kb']:>11,.0f} {stats['retained_kb']:>12,.0f} {delta:>12}{flag}")
+
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the analysis hot paths')
+    parser.add_argument('--profile', choices=list(PROFILES), default='medium', help='Synthetic workload size')
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=9, help='Timed runs per case')
+    parser.add_argument('--hit-density', type=float, default=0.05,
+                        help='Fraction of added lines that trigger a static rule')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINES, help='Baselines file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit 1 if any case regressed')
+    # Paired ratios still vary by up to ~1.5x between runs on shared runners; 2x is a real regression
+    parser.add_argument('--time-tolerance', type=float, default=1.0,
+                        help='Allowed slowdown relative to the calibration workload, as a fraction')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help='Allowed growth of peak memory')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    # Analyzer warnings would interleave with the table
+    logging.getLogger('PRReviewAgent').setLevel(logging.ERROR)
+
+    names = [name for name in CASES if args.filter in name]
+    if not names:
+        parser.error(f"no case matches '{args.filter}'")
+
+    data = build_data(PROFILES[args.profile], args.hit_density, args.seed)
+    print(f"Profile {args.profile}: {len(data['diff']):,} byte diff, {len(data['hunks'])} hunks, "
+          f"{len(data['feedback']):,} findings, {len(data['responses'])} responses")
+
+    results = run(names, data, args.repeat)
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(args.profile, {}).get('cases', {})
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    report(results, baseline, regressions)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'profile': args.profile, 'cases': results, 'regressions': regressions}, f, indent=2)
+
+    if args.save_baseline:
+        # Only machine-independent numbers: time relative to the calibration workload, and memory
+        cases = {**baseline, **{name: {key: round(stats[key], 3) for key in ('relative', 'peak_kb')}
+                                for name, stats in results.items()}}
+        baselines[args.profile] = {
+            'python': platform.python_version(),
+            'machine': f"{platform.system()} {platform.machine()}",
+            'cases': cases,
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline for '{args.profile}' to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} cases regressed beyond tolerance", file=sys.stderr)
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
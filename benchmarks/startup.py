@@ -0,0 +1,144 @@
+"""Import-time budget for the CLI.
+
+    python -m benchmarks.startup            # table of import time per scenario
+    python -m benchmarks.startup --check    # exit 1 over budget or if a forbidden module is loaded (CI)
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``.
+Modules the bare interpreter loads anyway (site, .pth hooks) are not counted.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+# Milliseconds of imports beyond the bare interpreter; the CLI runs thousands of times a day in CI hooks
+SCENARIOS = {
+    'help': {
+        'argv': [MAIN, '--help'],
+        'budget_ms': 40,
+        'forbidden': ['requests', 'urllib3', 'flask', 'sqlite3', 'analyzers', 'adapters', 'pr_review_agent'],
+    },
+    'local': {
+        'argv': [MAIN, 'review', '--local', '--path', '{repo}'],
+        'budget_ms': 90,
+        'forbidden': ['requests', 'urllib3', 'flask', 'sqlite3', 'adapters', 'pr_review_agent'],
+    },
+    'agent': {
+        'argv': ['-c', 'import pr_review_agent'],
+        'budget_ms': 120,
+        # The git server adapter and its HTTP stack load when the agent is created
+        'forbidden': ['requests', 'urllib3', 'flask', 'adapters.github_adapter', 'analyzers.gemini_analyzer'],
+    },
+}
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, int], Set[str]]:
+    """Cumulative microseconds of each top-level import, and every module loaded"""
+    top_level, modules = {}, set()
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(4))
+        if not match.group(3):
+            top_level[match.group(4)] = int(match.group(2))
+    return top_level, modules
+
+
+def _run(argv: List[str], cwd: str) -> str:
+    env = {**os.environ, 'PYTHONPATH': ROOT + os.pathsep + os.environ.get('PYTHONPATH', '')}
+    result = subprocess.run([sys.executable, '-X', 'importtime', *argv], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return result.stderr
+
+
+def _sample_repo(path: str):
+    """A tiny repository with an uncommitted change, for the --local scenario"""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=path, check=True, capture_output=True)
+    git('init', '-q')
+    with open(os.path.join(path, 'app.py'), 'w') as f:
+        f.write("x = 1\n")
+    git('add', 'app.py')
+    git('-c', 'user.name=bench', '-c', 'user.email=bench@example.com', 'commit', '-q', '-m', 'init')
+    with open(os.path.join(path, 'app.py'), 'a') as f:
+        f.write("print(x)\n")
+
+
+def measure(name: str, repeat: int, workdir: str, repo: str) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    baseline, _ = parse_importtime(_run(['-c', 'pass'], workdir))
+    argv = [arg.format(repo=repo) for arg in scenario['argv']]
+
+    totals, loaded, heaviest = [], set(), {}
+    for _ in range(repeat):
+        top_level, modules = parse_importtime(_run(argv, workdir))
+        own = {module: us for module, us in top_level.items() if module not in baseline}
+        totals.append(sum(own.values()) / 1000)
+        loaded |= modules
+        for module, us in own.items():
+            heaviest[module] = min(heaviest.get(module, us), us)
+
+    forbidden = sorted(module for module in scenario['forbidden'] if module in loaded)
+    best = min(totals)
+    return {
+        'import_ms': round(best, 1),
+        'median_ms': round(statistics.median(totals), 1),
+        'budget_ms': scenario['budget_ms'],
+        'over_budget': best > scenario['budget_ms'],
+        'forbidden_loaded': forbidden,
+        'heaviest': sorted(((module, round(us / 1000, 1)) for module, us in heaviest.items()),
+                           key=lambda item: -item[1])[:5],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Measure CLI import time against a budget')
+    parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario; the best one is compared')
+    parser.add_argument('--check', action='store_true', help='Exit 1 on a budget or forbidden-module violation')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        repo = os.path.join(workdir, 'repo')
+        os.makedirs(repo)
+        _sample_repo(repo)
+        for name in args.scenarios or list(SCENARIOS):
+            results[name] = measure(name, args.repeat, workdir, repo)
+
+    failed = False
+    print(f"{'scenario':<10} {'best ms':>8} {'median ms':>10} {'budget ms':>10}  heaviest imports")
+    print('-' * 90)
+    for name, stats in results.items():
+        heaviest = ', '.join(f"{module} {ms}" for module, ms in stats['heaviest'][:3])
+        flag = ''
+        if stats['over_budget']:
+            flag += '  OVER BUDGET'
+        if stats['forbidden_loaded']:
+            flag += f"  FORBIDDEN: {', '.join(stats['forbidden_loaded'])}"
+        failed = failed or bool(flag)
+        print(f"{name:<10} {stats['import_ms']:>8.1f} {stats['median_ms']:>10.1f} {stats['budget_ms']:>10}  {heaviest}{flag}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
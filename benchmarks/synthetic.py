@@ -0,0 +1,107 @@
+import json
+import random
+from typing import Dict, List, Optional
+from models import Feedback
+
+# Ordinary added lines per language, and lines that trip a StaticAnalyzer rule
+LANGUAGES = {
+    'py': {
+        'lines': ["result = compute(value, {n})", "for item in items[{n}:]:", "    total += item.size",
+                  "if not config.get('key_{n}'):", "    return None", "logger.info('step %s', {n})",
+                  "def handler_{n}(request):", "values = [v * 2 for v in data]"],
+        'hits': ["print(value_{n})", "# TODO: handle case {n}", "except: pass", "password = 'hunter{n}'"]
+    },
+    'js': {
+        'lines': ["const value{n} = compute(input);", "if (!options.enabled) {{", "  return null;", "}}",
+                  "items.forEach(item => total += item.size);", "export function handler{n}(req) {{"],
+        'hits': ["// FIXME: race in step {n}", "const token = 'abc{n}';"]
+    },
+    'go': {
+        'lines': ["value := compute(input, {n})", "if err != nil {{", "\treturn nil, err", "}}",
+                  "for _, item := range items {{", "func handler{n}(w http.ResponseWriter) {{"],
+        'hits': ["// TODO: retry {n}", "secret = \"s{n}\""]
+    },
+    'md': {
+        'lines': ["Step {n} describes the setup.", "- item {n}", "", "## Section {n}"],
+        'hits': ["TODO: document option {n}"]
+    }
+}
+
+DEFAULT_MIX = {'py': 0.6, 'js': 0.2, 'go': 0.1, 'md': 0.1}
+
+
+def generate_diff(files: int = 20, hunks_per_file: int = 3, hunk_lines: int = 30,
+                  languages: Optional[Dict[str, float]] = None, hit_density: float = 0.05, seed: int = 0) -> str:
+    """A deterministic unified diff.
+
+    ``languages`` weights file extensions (keys of LANGUAGES); ``hit_density``
+    is the fraction of added lines that trigger a static analysis rule.
+    """
+    rng = random.Random(seed)
+    mix = languages or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    out: List[str] = []
+
+    for f in range(files):
+        ext = rng.choices(names, weights)[0]
+        spec = LANGUAGES[ext]
+        path = f"src/pkg{f % 17}/module_{f}.{ext}"
+        out += [f"diff --git a/{path} b/{path}", "index 1111111..2222222 100644", f"--- a/{path}", f"+++ b/{path}"]
+
+        old_line = new_line = 1
+        for _ in range(hunks_per_file):
+            gap = rng.randint(5, 40)
+            old_line += gap
+            new_line += gap
+            body = []
+            for _ in range(hunk_lines):
+                roll = rng.random()
+                n = rng.randint(0, 9999)
+                if roll < 0.2:
+                    body.append(' ' + rng.choice(spec['lines']).format(n=n))
+                elif roll < 0.35:
+                    body.append('-' + rng.choice(spec['lines']).format(n=n))
+                else:
+                    pool = spec['hits'] if rng.random() < hit_density else spec['lines']
+                    body.append('+' + rng.choice(pool).format(n=n))
+            old_count = sum(1 for line in body if line[0] in ' -')
+            new_count = sum(1 for line in body if line[0] in ' +')
+            out.append(f"@@ -{old_line},{old_count} +{new_line},{new_count} @@")
+            out += body
+            old_line += old_count
+            new_line += new_count
+
+    return '\n'.join(out) + '\n'
+
+
+def generate_response(findings: int = 10, seed: int = 0) -> str:
+    """An LLM answer: a JSON array of findings wrapped in a markdown fence"""
+    rng = random.Random(seed)
+    items = [{
+        "type": rng.choice(["error", "warning", "info", "suggestion"]),
+        "message": f"Finding {i}: " + "the value may be None here and is dereferenced later " * rng.randint(1, 3),
+        "line": rng.randint(1, 60),
+        "code_snippet": rng.choice([None, f"value_{i} = compute(input)"]),
+        "suggestion": rng.choice([None, "Check for None before use"])
+    } for i in range(findings)]
+    return "```json\n" + json.dumps(items, indent=2) + "\n```"
+
+
+def generate_feedback(count: int = 1000, duplicate_ratio: float = 0.2, paths: int = 50,
+                      seed: int = 0) -> List[Feedback]:
+    """Findings as analyzers produce them, ``duplicate_ratio`` of them repeats"""
+    rng = random.Random(seed)
+    feedback: List[Feedback] = []
+    for i in range(count):
+        if feedback and rng.random() < duplicate_ratio:
+            feedback.append(rng.choice(feedback))
+            continue
+        feedback.append(Feedback(
+            type=rng.choice(["error", "warning", "info", "suggestion"]),
+            message=f"Finding {rng.randint(0, count)}: consider handling the error returned here",
+            line=rng.randint(1, 2000),
+            code_snippet=rng.choice([None, f"value_{i} = compute(input)"]),
+            suggestion=rng.choice([None, "Handle the error"]),
+            path=rng.choice([None, f"src/module_{rng.randrange(paths)}.py"])
+        ))
+    return feedback
@@ -1,9 +1,7 @@
+import sys
 import argparse
-from typing import List
+from typing import Any, Dict, List
 
-from addict import Dict
-from traitlets import Any
-from pr_review_agent import PRReviewAgent
 from utils.config import load_config
 from utils.logger import setup_logger
 
@@ -26,6 +24,143 @@ def display_prs(prs: List[Dict[str, Any]]):
         
         print(f"{pr['id']:<8} {repo_name:<30} {title:<50} {pr['state']:<10} {pr['url']}")
 
+SEVERITY_ORDER = ['suggestion', 'info', 'warning', 'error']
+
+# Adapters are looked up when the agent is created, so --help does not scan installed plugins
+SERVER_HELP = ('Git server: github, gitlab, bitbucket, azure or an installed adapter plugin; '
+               'Bitbucket and Azure DevOps credentials come from the environment')
+
+def review_local(args) -> int:
+    """Static review of a local working tree or commit range; needs no adapter, tokens or network"""
+    from analyzers.code_analyzer import CodeAnalyzer
+    from models import Feedback, FeedbackBatch
+    from utils.diff_parser import new_file_positions
+    from utils.git import GitError, local_diff
+    
+    try:
+        diff = local_diff(args.local or None, cwd=args.path)
+    except GitError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    
+    analyzer = CodeAnalyzer(verbose=args.verbose, use_ai=False)
+    feedback = analyzer.analyze_diff(diff)
+    positions = new_file_positions(analyzer.analyzed_diff)
+    
+    # Static findings carry diff positions; report them as file locations
+    located = FeedbackBatch()
+    for item in feedback:
+        path, line = positions.get(item.line, (item.path, item.line))
+        located.append(Feedback(item.type, item.message, line, item.code_snippet, item.suggestion, path, item.rule))
+    
+    if args.format == 'json':
+        sys.stdout.buffer.write(located.to_json() + b'\n')
+    elif args.format == 'ndjson':
+        sys.stdout.buffer.write(located.to_ndjson())
+    else:
+        print(f"Reviewed: {args.local or 'working tree'} ({len(diff)} bytes of diff)")
+        print(f"Feedback Items: {len(located)}")
+        for item in located:
+            location = f"{item.path}:{item.line}" if item.path else f"line {item.line}"
+            print(f"{location}: [{item.type.upper()}] {item.message}")
+    
+    if args.fail_on:
+        threshold = SEVERITY_ORDER.index(args.fail_on)
+        counts = located.type_counts()
+        failing = sum(count for feedback_type, count in counts.items()
+                      if feedback_type in SEVERITY_ORDER and SEVERITY_ORDER.index(feedback_type) >= threshold)
+        if failing:
+            print(f"{failing} findings at or above '{args.fail_on}'", file=sys.stderr)
+            return 1
+    return 0
+
+def read_repos(args) -> List[str]:
+    """Repository URLs from --repo and --repos-file (one per line, # starts a comment)"""
+    repos = list(args.repo or [])
+    if args.repos_file:
+        with open(args.repos_file) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    repos.append(line)
+    return repos
+
+def search_all(args) -> int:
+    """Search every git server with credentials configured, concurrently, newest updates first"""
+    import os
+    from pr_review_agent import PRReviewAgent
+    
+    servers = {}
+    if args.github_token:
+        servers['github'] = {'github_token': args.github_token}
+    if args.gitlab_token:
+        servers['gitlab'] = {'gitlab_token': args.gitlab_token, 'gitlab_url': args.gitlab_url}
+    if os.environ.get('BITBUCKET_TOKEN'):
+        servers['bitbucket'] = {}
+    if os.environ.get('AZURE_DEVOPS_TOKEN'):
+        servers['azure'] = {}
+    if not servers:
+        print("Error: no git server is configured", file=sys.stderr)
+        return 2
+    
+    federated = PRReviewAgent.search_all(servers, query=args.query, state=args.state, limit=args.limit,
+                                         username=args.user, timeout=args.timeout)
+    display_prs(federated['results'])
+    for server, status in federated['servers'].items():
+        if status['error']:
+            print(f"{server}: {status['error']} ({status['ms']:.0f} ms)", file=sys.stderr)
+        elif args.verbose:
+            print(f"{server}: {status['count']} results in {status['ms']:.0f} ms", file=sys.stderr)
+    return 0
+
+def watch(args, parser) -> int:
+    """Poll repositories and review each PR whose head commit moved since the last poll"""
+    import os
+    import threading
+    from pr_review_agent import PRReviewAgent
+    from utils.scheduler import ReviewScheduler, parse_sla_targets
+    from watcher import Watcher, WatchState
+    
+    repos = read_repos(args)
+    if not repos:
+        parser.error("watch needs at least one --repo or a --repos-file")
+    
+    options = dict(
+        git_server=args.server,
+        github_token=args.github_token,
+        gitlab_token=args.gitlab_token,
+        gitlab_url=args.gitlab_url,
+        gemini_api_key=args.gemini_key,
+        verbose=args.verbose
+    )
+    try:
+        agent = PRReviewAgent(**options)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    def review(repo_url: str, pr_id: int):
+        # One agent per review: the agent keeps per-review state (ledger, interdiff) on itself
+        result = PRReviewAgent(**options).review_pr(repo_url, pr_id, args.post_comments,
+                                                     request_budget=args.request_budget)
+        print(f"{repo_url} #{pr_id}: score {result['score']:.1f}/100, {len(result['feedback'])} feedback items, "
+              f"{result['ledger']['requests']} API requests")
+    
+    scheduler = ReviewScheduler(workers=args.workers, policy=args.policy, large_cost=args.large_cost,
+                                classes=parse_sla_targets(os.environ.get('REVIEW_SLA_TARGETS')))
+    watcher = Watcher(agent.adapter, review, repos, WatchState(os.path.expanduser(args.state_file)),
+                      interval=args.interval, min_interval=args.min_interval, max_interval=args.max_interval,
+                      review_existing=args.review_existing, cost=agent.estimate_cost, scheduler=scheduler)
+    stop = threading.Event()
+    try:
+        watcher.run(once=args.once, stop=stop)
+    except NotImplementedError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        # Let running reviews finish; the state is saved on the way out
+        stop.set()
+    return 0
+
 def main():
     # Set up logging
     logger = setup_logger()
@@ -38,61 +173,135 @@ def main():
     
     # Review command
     review_parser = subparsers.add_parser('review', help='Review a specific PR')
-    review_parser.add_argument('--server', choices=['github', 'gitlab'], default='github', help='Git server')
-    review_parser.add_argument('--repo', required=True, help='Repository URL')
-    review_parser.add_argument('--pr', type=int, required=True, help='Pull request ID')
+    review_parser.add_argument('--server', default='github', help=SERVER_HELP)
+    review_parser.add_argument('--repo', help='Repository URL')
+    review_parser.add_argument('--pr', type=int, help='Pull request ID')
+    review_parser.add_argument('--local', nargs='?', const='', metavar='BASE..HEAD',
+                               help='Review a local commit range, or the working tree against HEAD, offline')
+    review_parser.add_argument('--path', default='.', help='Local repository path for --local')
+    review_parser.add_argument('--fail-on', choices=SEVERITY_ORDER,
+                               help='Exit non-zero if a finding has at least this severity')
+    review_parser.add_argument('--format', choices=['text', 'json', 'ndjson'], default='text',
+                               help='Output format of --local findings')
     review_parser.add_argument('--post-comments', action='store_true', help='Post comments to the PR')
-    review_parser.add_argument('--github-token', help='GitHub access token', default=config.get('GITHUB_TOKEN'))
-    review_parser.add_argument('--gitlab-token', help='GitLab access token', default=config.get('GITLAB_TOKEN'))
+    review_parser.add_argument('--request-budget', type=int,
+                               help='Max git host API requests for this review; beyond it comments are condensed')
+    review_parser.add_argument('--github-token', help='GitHub access token, or several comma separated', default=config.get('GITHUB_TOKEN'))
+    review_parser.add_argument('--gitlab-token', help='GitLab access token, or several comma separated', default=config.get('GITLAB_TOKEN'))
     review_parser.add_argument('--gitlab-url', help='GitLab instance URL', default=config.get('GITLAB_URL', 'https://gitlab.com'))
     review_parser.add_argument('--gemini-key', help='Gemini API key', default=config.get('GEMINI_API_KEY'))
     review_parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
     
     # Search command
     search_parser = subparsers.add_parser('search', help='Search for PRs')
-    search_parser.add_argument('--server', choices=['github', 'gitlab'], default='github', help='Git server')
+    search_parser.add_argument('--server', default='github', help=SERVER_HELP + '; "all" searches every configured server')
     search_parser.add_argument('--query', help='Search query')
     search_parser.add_argument('--user', help='Username to filter PRs by author')
     search_parser.add_argument('--repo', help='Repository URL to filter PRs by repository')
     search_parser.add_argument('--state', choices=['open', 'closed', 'all'], default='open', help='PR state')
     search_parser.add_argument('--limit', type=int, default=10, help='Number of results to return')
-    search_parser.add_argument('--github-token', help='GitHub access token', default=config.get('GITHUB_TOKEN'))
-    search_parser.add_argument('--gitlab-token', help='GitLab access token', default=config.get('GITLAB_TOKEN'))
+    search_parser.add_argument('--timeout', type=float, default=10,
+                               help='With --server all, seconds to wait for slow servers before showing the rest')
+    search_parser.add_argument('--github-token', help='GitHub access token, or several comma separated', default=config.get('GITHUB_TOKEN'))
+    search_parser.add_argument('--gitlab-token', help='GitLab access token, or several comma separated', default=config.get('GITLAB_TOKEN'))
     search_parser.add_argument('--gitlab-url', help='GitLab instance URL', default=config.get('GITLAB_URL', 'https://gitlab.com'))
     search_parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
     
+    # Watch command
+    watch_parser = subparsers.add_parser('watch', help='Poll repositories and review PRs when new commits are pushed')
+    watch_parser.add_argument('--server', default='github', help=SERVER_HELP)
+    watch_parser.add_argument('--repo', action='append', help='Repository URL to watch (repeatable)')
+    watch_parser.add_argument('--repos-file', help='File with one repository URL per line')
+    watch_parser.add_argument('--state-file', help='Where poll cursors and reviewed heads are kept',
+                              default=config['WATCH_STATE_PATH'])
+    watch_parser.add_argument('--interval', type=float, default=60, help='Initial seconds between polls of a repository')
+    watch_parser.add_argument('--min-interval', type=float, default=15, help='Shortest poll interval while active')
+    watch_parser.add_argument('--max-interval', type=float, default=900, help='Longest poll interval while quiet')
+    watch_parser.add_argument('--workers', type=int, default=2, help='Reviews run in parallel')
+    watch_parser.add_argument('--policy', choices=['sjf', 'fair', 'fifo'], default=config['REVIEW_SCHEDULER_POLICY'],
+                              help='Order of queued reviews: shortest first with aging, fair share per repository, '
+                                   'or arrival order')
+    watch_parser.add_argument('--large-cost', type=float, default=config['REVIEW_LARGE_COST'],
+                              help='Changed lines (plus 50 per file) from which a PR counts as large; large reviews '
+                                   'leave at least one worker to the others')
+    watch_parser.add_argument('--once', action='store_true', help='Poll every repository once, review, and exit')
+    watch_parser.add_argument('--review-existing', action='store_true',
+                              help='Also review PRs already open on the first poll instead of only new pushes')
+    watch_parser.add_argument('--post-comments', action='store_true', help='Post comments to the PRs')
+    watch_parser.add_argument('--request-budget', type=int, help='Max git host API requests per review')
+    watch_parser.add_argument('--github-token', help='GitHub access token, or several comma separated', default=config.get('GITHUB_TOKEN'))
+    watch_parser.add_argument('--gitlab-token', help='GitLab access token, or several comma separated', default=config.get('GITLAB_TOKEN'))
+    watch_parser.add_argument('--gitlab-url', help='GitLab instance URL', default=config.get('GITLAB_URL', 'https://gitlab.com'))
+    watch_parser.add_argument('--gemini-key', help='Gemini API key', default=config.get('GEMINI_API_KEY'))
+    watch_parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
+    
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return
     
+    if args.command == 'watch':
+        return watch(args, parser)
+    if args.command == 'search' and args.server == 'all':
+        if args.repo:
+            parser.error("--repo needs a single --server")
+        return search_all(args)
+    if args.command == 'review' and args.local is not None:
+        return review_local(args)
+    if args.command == 'review' and (not args.repo or args.pr is None):
+        parser.error("--repo and --pr are required unless --local is given")
+    
+    from pr_review_agent import PRReviewAgent
+    
     # Create agent
-    agent = PRReviewAgent(
-        git_server=args.server,
-        github_token=args.github_token,
-        gitlab_token=args.gitlab_token,
-        gitlab_url=args.gitlab_url,
-        gemini_api_key=args.gemini_key if hasattr(args, 'gemini_key') else None,
-        verbose=args.verbose
-    )
+    try:
+        agent = PRReviewAgent(
+            git_server=args.server,
+            github_token=args.github_token,
+            gitlab_token=args.gitlab_token,
+            gitlab_url=args.gitlab_url,
+            gemini_api_key=args.gemini_key if hasattr(args, 'gemini_key') else None,
+            verbose=args.verbose
+        )
+    except ValueError as e:
+        parser.error(str(e))
     
     if args.command == 'review':
         # Review PR
         try:
-            result = agent.review_pr(args.repo, args.pr, args.post_comments)
+            result = agent.review_pr(args.repo, args.pr, args.post_comments, request_budget=args.request_budget)
             
             # Print results
             print(f"PR Title: {result['pr_details'].get('title')}")
             print(f"Quality Score: {result['score']:.1f}/100")
             print(f"Feedback Items: {len(result['feedback'])}")
             
+            noise = result['analysis'].get('noise_filter')
+            if noise and noise['files_skipped']:
+                print(f"Skipped Files: {noise['files_skipped']} "
+                      f"({noise['bytes_saved']} bytes, ~{noise['tokens_saved']} tokens saved)")
+            
+            usage = result['analysis'].get('llm_usage')
+            if usage and usage['calls']:
+                print(f"LLM Usage: {usage['calls']} calls, {usage['prompt_tokens']} prompt / "
+                      f"{usage['output_tokens']} output tokens, ${usage['cost_usd']:.4f}, "
+                      f"{usage['latency_ms_total']:.0f} ms")
+            
+            ledger = result['ledger']
+            budget = f" of {ledger['budget']}" if ledger['budget'] is not None else ""
+            print(f"API Requests: {ledger['requests']}{budget}"
+                  + (f" (degraded: {', '.join(ledger['degraded'])})" if ledger['degraded'] else ""))
+            if args.verbose:
+                for endpoint, count in sorted(ledger['by_endpoint'].items()):
+                    print(f"   {count:>4}  {endpoint}")
+            
             for i, item in enumerate(result['feedback'], 1):
-                print(f"\n{i}. [{item['type'].upper()}] {item['message']}")
-                if item.get('line'):
-                    print(f"   Line: {item['line']}")
-                if item.get('code_snippet'):
-                    print(f"   Code: {item['code_snippet']}")
+                print(f"\n{i}. [{item.type.upper()}] {item.message}")
+                if item.line:
+                    print(f"   Line: {item.line}")
+                if item.code_snippet:
+                    print(f"   Code: {item.code_snippet}")
                     
         except Exception as e:
             logger.error(f"Error reviewing PR: {e}")
@@ -117,4 +326,4 @@ def main():
                 traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,3 +1,3 @@
-from .feedback import Feedback
+from .feedback import Feedback, FeedbackBatch
 
-__all__ = ['Feedback']
\ No newline at end of file
+__all__ = ['Feedback', 'FeedbackBatch']
\ No newline at end of file
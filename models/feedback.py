@@ -1,21 +1,192 @@
-from dataclasses import dataclass
-from typing import Optional
+import sys
+import json
+from array import array
+from collections import Counter
+from json.encoder import encode_basestring
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FIELDS = ('type', 'message', 'line', 'code_snippet', 'suggestion', 'path', 'rule')
+
+# Stored in the line column for findings without a line
+NO_LINE = -(1 << 63)
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return _encoder.encode(value).encode('utf-8')
+
 
-@dataclass
 class Feedback:
-    """Data class for feedback items"""
-    type: str  # error, warning, info, suggestion
-    message: str
-    line: Optional[int] = None
-    code_snippet: Optional[str] = None
-    suggestion: Optional[str] = None
-    
-    def to_dict(self):
+    """A single review finding.
+
+    ``line`` is a 1-based position in the diff for static findings (which have
+    no ``path``) and a new-file line number for AI findings. ``rule`` names
+    the check that produced a static finding.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, type: str, message: str, line: Optional[int] = None, code_snippet: Optional[str] = None,
+                 suggestion: Optional[str] = None, path: Optional[str] = None, rule: Optional[str] = None):
+        # A handful of distinct types and paths repeat across thousands of findings
+        self.type = sys.intern(type)  # error, warning, info, suggestion
+        self.message = message
+        self.line = line
+        self.code_snippet = code_snippet
+        self.suggestion = suggestion
+        self.path = sys.intern(path) if path else None
+        self.rule = sys.intern(rule) if rule else None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Feedback':
+        """Build from a dict, accepting the legacy ``code`` key of static findings"""
+        line = data.get('line')
+        return cls(
+            type=data.get('type') or 'info',
+            message=data.get('message', ''),
+            line=line if isinstance(line, int) and not isinstance(line, bool) else None,
+            code_snippet=data.get('code_snippet', data.get('code')),
+            suggestion=data.get('suggestion'),
+            path=data.get('path'),
+            rule=data.get('rule')
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary"""
         return {
             'type': self.type,
             'message': self.message,
             'line': self.line,
             'code_snippet': self.code_snippet,
-            'suggestion': self.suggestion
-        }
\ No newline at end of file
+            'suggestion': self.suggestion,
+            'path': self.path,
+            'rule': self.rule
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Feedback):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Feedback({', '.join(f'{name}={getattr(self, name)!r}' for name in FIELDS)})"
+
+
+class FeedbackBatch:
+    """Findings stored column by column, for large result sets.
+
+    Types, paths and rules are dictionary-encoded and lines packed in an ``array``,
+    so a finding costs a few bytes plus its strings. Iterating yields
+    ``Feedback`` objects; ``to_json``/``to_ndjson`` encode straight from the
+    columns, escaping each distinct type, path and rule only once.
+    """
+
+    __slots__ = ('_types', '_paths', '_rules', 'type_codes', 'path_codes', 'rule_codes', 'lines', 'messages',
+                 'code_snippets', 'suggestions', '_type_index', '_path_index', '_rule_index')
+
+    def __init__(self, items: Iterable[Feedback] = ()):
+        self._types: List[str] = []
+        self._paths: List[Optional[str]] = [None]
+        self._type_index: Dict[str, int] = {}
+        self._path_index: Dict[Optional[str], int] = {None: 0}
+        self._rules: List[Optional[str]] = [None]
+        self._rule_index: Dict[Optional[str], int] = {None: 0}
+        self.type_codes = array('B')
+        self.path_codes = array('I')
+        self.rule_codes = array('I')
+        self.lines = array('q')
+        self.messages: List[str] = []
+        self.code_snippets: List[Optional[str]] = []
+        self.suggestions: List[Optional[str]] = []
+        self.extend(items)
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict[str, Any]]) -> 'FeedbackBatch':
+        return cls(Feedback.from_dict(item) for item in items)
+
+    def append(self, item: Feedback):
+        code = self._type_index.get(item.type)
+        if code is None:
+            code = self._type_index[item.type] = len(self._types)
+            self._types.append(item.type)
+        path = self._path_index.get(item.path)
+        if path is None:
+            path = self._path_index[item.path] = len(self._paths)
+            self._paths.append(item.path)
+        rule = self._rule_index.get(item.rule)
+        if rule is None:
+            rule = self._rule_index[item.rule] = len(self._rules)
+            self._rules.append(item.rule)
+
+        self.type_codes.append(code)
+        self.path_codes.append(path)
+        self.rule_codes.append(rule)
+        self.lines.append(NO_LINE if item.line is None else item.line)
+        self.messages.append(item.message)
+        self.code_snippets.append(item.code_snippet)
+        self.suggestions.append(item.suggestion)
+
+    def extend(self, items: Iterable[Feedback]):
+        for item in items:
+            self.append(item)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __getitem__(self, index: int) -> Feedback:
+        line = self.lines[index]
+        return Feedback(self._types[self.type_codes[index]], self.messages[index],
+                        None if line == NO_LINE else line, self.code_snippets[index],
+                        self.suggestions[index], self._paths[self.path_codes[index]],
+                        self._rules[self.rule_codes[index]])
+
+    def __iter__(self) -> Iterator[Feedback]:
+        return (self[i] for i in range(len(self)))
+
+    def type_counts(self) -> Dict[str, int]:
+        """Number of findings per type, counted on the encoded column"""
+        return {self._types[code]: count for code, count in Counter(self.type_codes).items()}
+
+    def rule_counts(self) -> Dict[Optional[str], int]:
+        """Number of findings per rule (None for findings without one), counted on the encoded column"""
+        return {self._rules[code]: count for code, count in Counter(self.rule_codes).items()}
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        types, paths, rules = self._types, self._paths, self._rules
+        return [
+            {'type': types[type_code], 'message': message, 'line': None if line == NO_LINE else line,
+             'code_snippet': snippet, 'suggestion': suggestion, 'path': paths[path_code], 'rule': rules[rule_code]}
+            for type_code, message, line, snippet, suggestion, path_code, rule_code in zip(
+                self.type_codes, self.messages, self.lines, self.code_snippets, self.suggestions, self.path_codes,
+                self.rule_codes)
+        ]
+
+    def to_json(self) -> bytes:
+        """The findings as a JSON array"""
+        return f"[{','.join(self._encoded())}]".encode('utf-8')
+
+    def to_ndjson(self) -> bytes:
+        """The findings as newline-delimited JSON, one object per line"""
+        return ''.join(f"{row}\n" for row in self._encoded()).encode('utf-8')
+
+    def _encoded(self) -> Iterator[str]:
+        types = [encode_basestring(name) for name in self._types]
+        paths = ['null' if path is None else encode_basestring(path) for path in self._paths]
+        rules = ['null' if rule is None else encode_basestring(rule) for rule in self._rules]
+        for type_code, message, line, snippet, suggestion, path_code, rule_code in zip(
+                self.type_codes, self.messages, self.lines, self.code_snippets, self.suggestions, self.path_codes,
+                self.rule_codes):
+            yield (f'{{"type":{types[type_code]},"message":{encode_basestring(message)},'
+                   f'"line":{"null" if line == NO_LINE else line},'
+                   f'"code_snippet":{"null" if snippet is None else encode_basestring(snippet)},'
+                   f'"suggestion":{"null" if suggestion is None else encode_basestring(suggestion)},'
+                   f'"path":{paths[path_code]},"rule":{rules[rule_code]}}}')
@@ -1,88 +1,277 @@
 # pr_review_agent.py
 import os
-from typing import List, Dict, Any
-from adapters import GitHubAdapter, GitLabAdapter, BitbucketAdapter, AzureDevOpsAdapter
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Union
+from adapters import create_adapter
 from analyzers import CodeAnalyzer
+from models import Feedback, FeedbackBatch
+from utils.diff_parser import split_files
+from utils.federation import merge_by_updated, run_federated
+from utils.git import GitError
+from utils.git_mirror import GitMirror, shared_mirror
+from utils.ledger import RequestLedger, ledger_tracker, recording
+from utils.mapped_diff import MappedDiff, spool_diff
+from utils.metrics import DIFF_BYTES, FINDINGS_PER_REVIEW, span
+from utils.review_history import ReviewHistory
+from utils.review_state import ReviewStateStore, shared_state_store
+from utils.scheduler import estimate_cost
+from utils.symbol_index import SymbolIndex
+from utils.usage import usage_tracker
 from utils.logger import get_logger
 
+# PR states as each git server names them, by the state the CLI and API accept
+STATE_MAP = {
+    'github': {'open': 'open', 'closed': 'closed', 'all': 'all'},
+    'gitlab': {'open': 'opened', 'closed': 'closed', 'all': 'all'},
+    'bitbucket': {'open': 'OPEN', 'closed': 'MERGED', 'all': 'ALL'},
+    'azure': {'open': 'active', 'closed': 'completed', 'all': 'all'}
+}
+
+# Seconds PR details fetched by estimate_cost may stand in for the review's own fetch
+PRICED_DETAILS_TTL = 600
+
+def federated_response(outcomes: Dict[str, Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """Merged results, per-server status and timing from run_federated output of PR searches"""
+    # Copies: the lists may be shared with a cache
+    tagged = [[{**pr, 'server': server} for pr in outcome['value'] or []] for server, outcome in outcomes.items()]
+    return {
+        'results': merge_by_updated(tagged, limit),
+        'servers': {server: {'count': len(outcome['value'] or []), 'ms': outcome['ms'], 'error': outcome['error']}
+                    for server, outcome in outcomes.items()},
+        'partial': any(outcome['error'] for outcome in outcomes.values())
+    }
+
 class PRReviewAgent:
     """Main PR Review Agent class"""
     
     def __init__(self, git_server: str = 'github', **kwargs):
         self.git_server = git_server.lower()
-        self.adapter = self._create_adapter(git_server, kwargs)
+        self.adapter = create_adapter(self.git_server, kwargs)
         self.analyzer = CodeAnalyzer(
             gemini_api_key=kwargs.get('gemini_api_key'),
             verbose=kwargs.get('verbose', False)
         )
         self.logger = get_logger()
         self.verbose = kwargs.get('verbose', False)
+        # Opened on first review and shared by every agent, so search-only agents never touch it
+        self._state_store = kwargs.get('state_store')
+        # Scores, findings and timings of every review, for trends across reviews
+        self.history = kwargs.get('history') or ReviewHistory.from_env()
+        # Optional local source for diffs, shared process-wide; the API is then only used for metadata and comments
+        self._mirror = kwargs.get('mirror')
+        self._symbol_index = kwargs.get('symbol_index')
+        self._symbol_index_loaded = False
+        # Default cap on git host requests per review (None: unlimited)
+        budget = kwargs.get('request_budget')
+        if budget is None:
+            budget = os.environ.get('REVIEW_REQUEST_BUDGET') or None
+        self.request_budget = int(budget) if budget is not None else None
+        # Git host requests of the most recent review
+        self.ledger: Optional[RequestLedger] = None
+        # PR details fetched while pricing, used once by the review that follows: key -> (fetched at, details)
+        self._priced: Dict[tuple, tuple] = {}
+        self._priced_lock = threading.Lock()
+    
+    @property
+    def state_store(self) -> Optional[ReviewStateStore]:
+        """Per-PR review state: the one passed in, else the process-wide store"""
+        if self._state_store is None:
+            self._state_store = shared_state_store()
+        return self._state_store
     
-    def _create_adapter(self, git_server: str, kwargs: dict):
-        if git_server == 'github':
-            return GitHubAdapter(kwargs.get('github_token'))
-        elif git_server == 'gitlab':
-            return GitLabAdapter(
-                kwargs.get('gitlab_token'),
-                kwargs.get('gitlab_url', 'https://gitlab.com')
-            )
-        elif git_server == 'bitbucket':
-            return BitbucketAdapter(
-                kwargs.get('bitbucket_token'),
-                kwargs.get('bitbucket_url', 'https://api.bitbucket.org/2.0')
-            )
-        elif git_server == 'azure':
-            return AzureDevOpsAdapter(
-                kwargs.get('azure_devops_token'),
-                kwargs.get('azure_devops_org_url')
-            )
-        else:
-            raise ValueError(f"Unsupported git server: {git_server}")
+    @property
+    def mirror(self) -> Optional[GitMirror]:
+        """Bare mirrors for local diffs: the one passed in, else the process-wide mirror"""
+        if self._mirror is None:
+            self._mirror = shared_mirror()
+        return self._mirror
+    
+    @property
+    def symbol_index(self) -> Optional[SymbolIndex]:
+        """Repository context for LLM prompts; needs the mirror to read trees locally"""
+        if not self._symbol_index_loaded:
+            self._symbol_index = (self._symbol_index or SymbolIndex.from_env()) if self.mirror else None
+            self._symbol_index_loaded = True
+        return self._symbol_index
     
     def search_prs(self, query: str = None, state: str = "open", limit: int = 10, 
                   username: str = None, repo_url: str = None) -> List[Dict[str, Any]]:
         """Search for pull requests"""
-        if repo_url:
-            return self.adapter.get_repo_prs(repo_url, state, limit)
-        elif username:
-            return self.adapter.get_user_prs(username, state, limit)
-        elif query:
-            return self.adapter.search_prs(query, state, limit)
-        else:
-            # Default: get authenticated user's PRs
-            return self.adapter.get_user_prs(None, state, limit)
-    
-    # Existing methods for review_pr, _calculate_score, etc.
+        with span('search', platform=self.git_server):
+            if repo_url:
+                with span('adapter.get_repo_prs'):
+                    return self.adapter.get_repo_prs(repo_url, state, limit)
+            elif username:
+                with span('adapter.get_user_prs'):
+                    return self.adapter.get_user_prs(username, state, limit)
+            elif query:
+                with span('adapter.search_prs'):
+                    return self.adapter.search_prs(query, state, limit)
+            else:
+                # Default: get authenticated user's PRs
+                with span('adapter.get_user_prs'):
+                    return self.adapter.get_user_prs(None, state, limit)
     
-    def review_pr(self, repo_url: str, pr_id: int, post_comments: bool = False) -> Dict[str, Any]:
-        """Review a pull request and optionally post comments"""
-        self.logger.info(f"Reviewing PR #{pr_id} in {repo_url}")
+    @classmethod
+    def search_all(cls, servers: Dict[str, Dict[str, Any]], query: str = None, state: str = 'open', limit: int = 10,
+                   username: str = None, timeout: float = 10) -> Dict[str, Any]:
+        """Search every server in ``servers`` (name -> agent keyword arguments) concurrently.
         
-        # Get PR details and diff
-        pr_details = self.adapter.get_pr_details(repo_url, pr_id)
-        diff = self.adapter.get_diff(repo_url, pr_id)
+        ``state`` is open, closed or all and is translated per server. Results
+        are merged newest ``updated_at`` first; a server that fails or misses
+        the ``timeout`` is reported under ``servers`` and the rest is returned.
+        """
+        def search(server: str, options: Dict[str, Any]):
+            server_state = STATE_MAP.get(server, {}).get(state, state)
+            return cls(git_server=server, **options).search_prs(query=query, state=server_state, limit=limit,
+                                                                username=username)
         
-        if self.verbose:
-            self.logger.debug(f"Retrieved diff with {len(diff)} characters")
+        with span('search.federated', servers=','.join(servers)):
+            outcomes = run_federated({server: (lambda server=server, options=options: search(server, options))
+                                      for server, options in servers.items()}, timeout)
+        return federated_response(outcomes, limit)
+    
+    def estimate_cost(self, repo_url: str, pr_id: int) -> float:
+        """Scheduling cost of reviewing a PR from its diff stats, or a middling default if they cannot be fetched.
         
-        # Analyze the code changes
-        feedback = self.analyzer.analyze_diff(diff)
+        The PR details fetched here are kept for the review of the PR, so
+        where they carry the diff stats (GitHub, GitLab) pricing costs no
+        extra request.
+        """
+        try:
+            with span('adapter.get_pr_details'):
+                details = self.adapter.get_pr_details(repo_url, pr_id)
+            now = time.monotonic()
+            with self._priced_lock:
+                self._priced = {key: priced for key, priced in self._priced.items()
+                                if now - priced[0] < PRICED_DETAILS_TTL}
+                self._priced[(repo_url, str(pr_id))] = (now, details)
+            size = self.adapter.pr_size_from_details(details)
+            if size is None:
+                with span('adapter.get_pr_size'):
+                    size = self.adapter.get_pr_size(repo_url, pr_id)
+        except Exception as e:
+            self.logger.warning(f"Could not size {repo_url} #{pr_id}, scheduling it at the default cost: {e}")
+            size = None
+        return estimate_cost(size)
+    
+    # Existing methods for review_pr, _calculate_score, etc.
+    
+    def review_pr(self, repo_url: str, pr_id: int, post_comments: bool = False,
+                  incremental: bool = True, request_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Review a pull request and optionally post comments.
+        
+        With ``incremental``, files untouched since the last reviewed head keep
+        their AI findings and only the rest of the diff goes to the LLM.
         
-        # Calculate a score based on feedback
-        score = self._calculate_score(feedback)
+        ``request_budget`` caps git host requests (default: the agent's). PR
+        details and the diff are always fetched; past that the review degrades,
+        e.g. posting one summary comment instead of inline comments.
+        """
+        self.logger.info(f"Reviewing PR #{pr_id} in {repo_url}")
+        self.ledger = RequestLedger(repo_url, request_budget if request_budget is not None else self.request_budget)
         
-        # Post comments if requested
-        if post_comments:
-            self._post_feedback_comments(repo_url, pr_id, feedback)
+        with span('review', platform=self.git_server, repo=repo_url, pr=pr_id) as review:
+            # Get PR details and diff
+            pr_details = self._get_pr_details(repo_url, pr_id)
+            base_sha, head_sha = self.adapter.get_pr_shas(pr_details)
+            diff = self._get_diff(repo_url, pr_id, pr_details, base_sha, head_sha)
+            
+            if self.verbose:
+                self.logger.debug(f"Retrieved diff with {len(diff)} characters")
+            
+            state = self._load_state(repo_url, pr_id)
+            try:
+                self._prepare_context(repo_url, head_sha)
+                reuse = self._reusable_findings(repo_url, state, head_sha) if incremental else None
+                
+                # Analyze the code changes
+                with span('analyze'):
+                    feedback = self.analyzer.analyze_diff(diff, reuse)
+            finally:
+                self._release_diff(diff)
+            
+            # Calculate a score based on feedback
+            score = self._calculate_score(feedback)
+            self._observe_findings(feedback)
+            review.set(findings=len(feedback), score=score)
+            
+            llm_usage = self.analyzer.report.get('llm_usage')
+            if llm_usage:
+                usage_tracker.record_review(repo_url, llm_usage['calls_detail'])
+            
+            # Post comments if requested
+            comments = dict(state['comments']) if state else {}
+            if post_comments:
+                with span('post_comments'):
+                    self._post_feedback_comments(repo_url, pr_id, feedback, comments)
+            
+            self._save_state(repo_url, pr_id, base_sha, head_sha, comments)
         
+        ledger_tracker.record_review(repo_url, self.ledger)
+        timings = self._record_history(repo_url, pr_id, pr_details, head_sha, score, feedback, review)
         return {
             "pr_details": pr_details,
             "feedback": feedback,
-            "score": score
+            "score": score,
+            "analysis": self.analyzer.report,
+            "ledger": self.ledger.to_dict(),
+            "timings": timings
         }
     
     
-    def _calculate_score(self, feedback: List[Dict[str, Any]]) -> float:
+    def iter_review(self, repo_url: str, pr_id: int) -> Iterator[Dict[str, Any]]:
+        """Review a pull request, yielding events as soon as each finding is available"""
+        self.logger.info(f"Streaming review of PR #{pr_id} in {repo_url}")
+        self.ledger = RequestLedger(repo_url, self.request_budget)
+        
+        with span('review', platform=self.git_server, repo=repo_url, pr=pr_id, stream=True) as review:
+            pr_details = self._get_pr_details(repo_url, pr_id)
+            yield {"event": "pr", "title": pr_details.get('title')}
+            
+            base_sha, head_sha = self.adapter.get_pr_shas(pr_details)
+            diff = self._get_diff(repo_url, pr_id, pr_details, base_sha, head_sha)
+            
+            state = self._load_state(repo_url, pr_id)
+            feedback = FeedbackBatch()
+            try:
+                self._prepare_context(repo_url, head_sha)
+                reuse = self._reusable_findings(repo_url, state, head_sha)
+                
+                with span('analyze'):
+                    for item in self.analyzer.iter_diff(diff, reuse):
+                        feedback.append(item)
+                        yield {"event": "finding", "finding": item}
+            finally:
+                self._release_diff(diff)
+            
+            score = self._calculate_score(feedback)
+            self._observe_findings(feedback)
+            review.set(findings=len(feedback), score=score)
+            
+            llm_usage = self.analyzer.report.get('llm_usage')
+            if llm_usage:
+                usage_tracker.record_review(repo_url, llm_usage['calls_detail'])
+            
+            self._save_state(repo_url, pr_id, base_sha, head_sha, dict(state['comments']) if state else {})
+        
+        ledger_tracker.record_review(repo_url, self.ledger)
+        timings = self._record_history(repo_url, pr_id, pr_details, head_sha, score, feedback, review)
+        yield {
+            "event": "summary",
+            "score": score,
+            "feedback_count": len(feedback),
+            "analysis": self.analyzer.report,
+            "ledger": self.ledger.summary(),
+            "timings": timings
+        }
+    
+    def _calculate_score(self, feedback: FeedbackBatch) -> float:
         """Calculate a quality score based on feedback"""
         if not feedback:
             return 100.0  # Perfect score if no issues found
@@ -97,28 +286,215 @@ class PRReviewAgent:
         
         # Start with a perfect score and deduct for issues
         score = 100.0
-        for item in feedback:
-            score -= weights.get(item.get('type', 'info'), 0.5)
+        for feedback_type, count in feedback.type_counts().items():
+            score -= weights.get(feedback_type, 0.5) * count
         
         return max(0.0, min(100.0, score))  # Ensure score is between 0-100
     
-    def _post_feedback_comments(self, repo_url: str, pr_id: int, feedback: List[Dict[str, Any]]):
-        """Post feedback as comments on the PR"""
-        self.logger.info(f"Posting {len(feedback)} comments to PR #{pr_id}")
+    def _record_history(self, repo_url: str, pr_id: int, pr_details: Dict[str, Any], head_sha: Optional[str],
+                        score: float, feedback: FeedbackBatch, review) -> Dict[str, float]:
+        """Milliseconds per stage of the finished review span, after adding the review to the history store"""
+        timings = {stage: round(seconds * 1000, 1) for stage, seconds in review.timings.items()}
+        if self.history:
+            try:
+                self.history.record(repo_url, pr_id, score, feedback, platform=self.git_server,
+                                    author=self.adapter.get_pr_author(pr_details), head_sha=head_sha, timings=timings)
+            except sqlite3.Error as e:
+                self.logger.warning(f"Could not record review history: {e}")
+        return timings
+    
+    def _observe_findings(self, feedback: FeedbackBatch):
+        counts = feedback.type_counts()
+        for feedback_type in ('error', 'warning', 'info', 'suggestion'):
+            FINDINGS_PER_REVIEW.observe(counts.get(feedback_type, 0), type=feedback_type)
+        FINDINGS_PER_REVIEW.observe(len(feedback), type='total')
+    
+    @contextmanager
+    def _adapter_call(self, name: str):
+        """Time an adapter call and charge its requests to the current review's ledger"""
+        with span(f'adapter.{name}'), recording(self.ledger):
+            yield
+    
+    def _get_pr_details(self, repo_url: str, pr_id: int) -> Dict[str, Any]:
+        """PR details, reusing those estimate_cost fetched for this review when they are recent enough"""
+        with self._priced_lock:
+            fetched_at, details = self._priced.pop((repo_url, str(pr_id)), (None, None))
+        if details is not None and time.monotonic() - fetched_at < PRICED_DETAILS_TTL:
+            return details
+        with self._adapter_call('get_pr_details'):
+            return self.adapter.get_pr_details(repo_url, pr_id)
+    
+    def _get_diff(self, repo_url: str, pr_id: int, pr_details: Dict[str, Any],
+                  base_sha: Optional[str], head_sha: Optional[str]) -> Union[str, MappedDiff]:
+        """PR diff from the local mirror when enabled, otherwise from the platform API.
         
-        for item in feedback:
-            message = f"**{item['type'].upper()}**: {item['message']}"
-            if item.get('code_snippet'):
-                message += f"\n\n```\n{item['code_snippet']}\n```"
+        Diffs above DIFF_SPILL_THRESHOLD_MB come back as a MappedDiff the caller must close.
+        """
+        with span('get_diff') as stage:
+            if self.mirror and base_sha and head_sha:
+                try:
+                    refs = self.adapter.get_pr_refs(pr_id, pr_details)
+                    # Built from the adapter's own host: the token must never go where repo_url points
+                    remote_url = self.adapter.git_remote_url(repo_url)
+                    if refs and remote_url:
+                        with span('mirror.fetch'):
+                            self.mirror.fetch(repo_url, remote_url, refs, self.adapter.git_auth_header())
+                        if self.mirror.has_commit(repo_url, base_sha) and self.mirror.has_commit(repo_url, head_sha):
+                            diff = self.mirror.diff(repo_url, base_sha, head_sha)
+                            return self._observe_diff(stage, diff, 'mirror')
+                        self.logger.warning(f"Mirror of {repo_url} lacks {base_sha[:12]} or {head_sha[:12]}")
+                except (GitError, KeyError) as e:
+                    self.logger.warning(f"Mirror diff failed, falling back to the API: {e}")
+            with self._adapter_call('iter_diff_chunks'):
+                diff = spool_diff(self.adapter.iter_diff_chunks(repo_url, pr_id))
+            return self._observe_diff(stage, diff, 'api')
+    
+    def _observe_diff(self, stage, diff: Union[str, MappedDiff], source: str) -> Union[str, MappedDiff]:
+        DIFF_BYTES.observe(len(diff), source=source)
+        stage.set(source=source, bytes=len(diff), spilled=isinstance(diff, MappedDiff))
+        return diff
+    
+    def _prepare_context(self, repo_url: str, head_sha: Optional[str]):
+        """Index the head commit and let the LLM see definitions and callers around each hunk"""
+        gemini = self.analyzer.gemini_analyzer
+        if not gemini:
+            return
+        gemini.set_context_provider(None)
+        if not self.symbol_index or not head_sha or not gemini.enabled:
+            return
+        
+        try:
+            with span('symbol_index'):
+                stats = self.symbol_index.update(repo_url, self.mirror.path_for(repo_url), head_sha)
+        except (GitError, sqlite3.Error) as e:
+            self.logger.warning(f"Symbol index not updated, reviewing without repository context: {e}")
+            return
+        if self.verbose:
+            self.logger.info(f"Symbol index at {head_sha[:12]}: {stats['parsed']} files parsed "
+                             f"in {stats['seconds']}s")
+        
+        commit = stats['commit']
+        gemini.set_context_provider(lambda hunk: self.symbol_index.context_for(repo_url, commit, hunk))
+    
+    def _release_diff(self, diff: Union[str, MappedDiff]):
+        if isinstance(diff, MappedDiff):
+            diff.close()
+    
+    def _get_interdiff(self, repo_url: str, old_head: str, new_head: str) -> str:
+        if self.mirror and self.mirror.has_commit(repo_url, old_head) and self.mirror.has_commit(repo_url, new_head):
+            with span('mirror.interdiff'):
+                return self.mirror.interdiff(repo_url, old_head, new_head)
+        with self._adapter_call('get_compare_diff'):
+            return self.adapter.get_compare_diff(repo_url, old_head, new_head)
+    
+    def _load_state(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Any]]:
+        if not self.state_store:
+            return None
+        return self.state_store.get(repo_url, pr_id)
+    
+    def _save_state(self, repo_url: str, pr_id: int, base_sha: Optional[str], head_sha: Optional[str],
+                    comments: Dict[str, Any]):
+        if not self.state_store:
+            return
+        # Every reviewed file, clean ones too, so an unchanged file is not sent again after the next push
+        findings = {path: [] for path in self.analyzer.ai_reviewed}
+        for item in self.analyzer.ai_feedback:
+            if item.path in findings:
+                findings[item.path].append(item.to_dict())
+        self.state_store.save(repo_url, pr_id, base_sha, head_sha, findings, comments)
+    
+    def _reusable_findings(self, repo_url: str, state: Optional[Dict[str, Any]],
+                           head_sha: Optional[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """AI findings of files the interdiff since the last reviewed head leaves untouched"""
+        if not state or not state.get('head_sha') or not head_sha:
+            return None
+        
+        previous = state['head_sha']
+        if previous == head_sha:
+            return state['findings']
+        
+        local = self.mirror and self.mirror.has_commit(repo_url, previous) and self.mirror.has_commit(repo_url, head_sha)
+        if not local and self.ledger and not self.ledger.allows(1):
+            self.ledger.degrade('interdiff')
+            self.logger.info("Request budget spent, running a full review instead of fetching the interdiff")
+            return None
+        
+        from requests import RequestException
+        try:
+            interdiff = self._get_interdiff(repo_url, previous, head_sha)
+        except (NotImplementedError, RequestException, GitError) as e:
+            # e.g. the old head was garbage-collected after a force-push
+            self.logger.info(f"No interdiff since {previous[:12]}, running a full review: {e}")
+            return None
+        
+        touched = {file_diff.path for file_diff in split_files(interdiff)}
+        self.logger.info(f"Interdiff {previous[:12]}..{head_sha[:12]} touches {len(touched)} files")
+        return {path: items for path, items in state['findings'].items() if path not in touched}
+    
+    def _comment_key(self, item: Feedback) -> str:
+        # Positions shift between pushes, so identify a finding by its content where possible
+        snippet = item.code_snippet or item.line
+        identity = [item.path, item.type, item.message, snippet]
+        return hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+    
+    def _post_feedback_comments(self, repo_url: str, pr_id: int, feedback: FeedbackBatch,
+                                posted: Optional[Dict[str, Any]] = None):
+        """Post feedback as comments on the PR, skipping ones already in ``posted``.
+        
+        ``posted`` maps finding keys to comment IDs and is updated in place.
+        """
+        posted = posted if posted is not None else {}
+        pending = [item for item in feedback if self._comment_key(item) not in posted]
+        if pending and self.ledger and not self.ledger.allows(len(pending)):
+            self._post_summary_comment(repo_url, pr_id, pending, posted)
+            return
+        
+        self.logger.info(f"Posting {len(pending)} comments to PR #{pr_id} "
+                         f"({len(feedback) - len(pending)} already posted)")
+        
+        for item in pending:
+            message = f"**{item.type.upper()}**: {item.message}"
+            if item.code_snippet:
+                message += f"\n\n```\n{item.code_snippet}\n```"
             
             try:
-                self.adapter.post_comment(
-                    repo_url, 
-                    pr_id, 
-                    message,
-                    item.get('path'),
-                    item.get('line')
-                )
-                self.logger.debug(f"Posted comment: {item['type']} - {item['message'][:50]}...")
+                with self._adapter_call('post_comment'):
+                    response = self.adapter.post_comment(
+                        repo_url, 
+                        pr_id, 
+                        message,
+                        item.path,
+                        item.line
+                    )
+                posted[self._comment_key(item)] = response.get('id') if isinstance(response, dict) else None
+                self.logger.debug(f"Posted comment: {item.type} - {item.message[:50]}...")
             except Exception as e:
-                self.logger.error(f"Failed to post comment: {e}")
\ No newline at end of file
+                self.logger.error(f"Failed to post comment: {e}")
+    
+    def _post_summary_comment(self, repo_url: str, pr_id: int, pending: List[Feedback],
+                              posted: Dict[str, Any], max_items: int = 100):
+        """One PR-level comment listing the findings, for when inline comments would exceed the request budget"""
+        if not self.ledger.allows(1):
+            self.ledger.degrade('comments_skipped')
+            self.logger.warning(f"Request budget spent, not posting {len(pending)} comments to PR #{pr_id}")
+            return
+        
+        self.ledger.degrade('summary_comment')
+        self.logger.info(f"Posting 1 summary comment for {len(pending)} findings to PR #{pr_id} "
+                         f"({self.ledger.remaining} requests left in the budget)")
+        lines = [f"**PR Review**: {len(pending)} findings (inline comments skipped to stay within the API request budget)", ""]
+        for item in pending[:max_items]:
+            location = f"`{item.path}:{item.line}` " if item.path and item.line else ""
+            lines.append(f"- **{item.type.upper()}** {location}{item.message}")
+        if len(pending) > max_items:
+            lines.append(f"- ... and {len(pending) - max_items} more")
+        
+        try:
+            with self._adapter_call('post_comment'):
+                response = self.adapter.post_comment(repo_url, pr_id, "\n".join(lines))
+        except Exception as e:
+            self.logger.error(f"Failed to post summary comment: {e}")
+            return
+        comment_id = response.get('id') if isinstance(response, dict) else None
+        for item in pending:
+            posted[self._comment_key(item)] = comment_id
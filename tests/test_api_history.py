@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+os.environ.setdefault('REVIEW_HISTORY_DISABLED', 'true')
+
+flask = pytest.importorskip('flask')
+import app as api  # noqa: E402
+from utils.review_history import ReviewHistory  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    history = ReviewHistory(':memory:')
+    history.record('https://github.com/o/r', 7, 90.0, [], author='ann')
+    monkeypatch.setattr(api, 'review_history', history)
+    return api.app.test_client()
+
+
+@pytest.mark.parametrize('url', [
+    '/api/history/reviews?limit=ten',
+    '/api/history/reviews?pr=seven',
+    '/api/history/trend?days=month',
+    '/api/history/top?days=x',
+])
+def test_malformed_numbers_are_a_bad_request(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_history_queries_with_valid_parameters(client):
+    assert [review['pr_id'] for review in client.get('/api/history/reviews?pr=7&limit=5').get_json()] == ['7']
+    assert client.get('/api/history/trend?days=7').get_json()[0]['reviews'] == 1
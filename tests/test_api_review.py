@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+os.environ.setdefault('REVIEW_HISTORY_DISABLED', 'true')
+
+flask = pytest.importorskip('flask')
+import app as api  # noqa: E402
+from utils.scheduler import ReviewScheduler  # noqa: E402
+
+BODY = {'repo_url': 'https://github.com/o/r', 'pr_id': 7, 'server': 'github'}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    scheduler = ReviewScheduler(workers=1)
+    monkeypatch.setattr(api, 'review_scheduler', scheduler)
+    monkeypatch.delenv('REVIEW_PRIORITY_TOKEN', raising=False)
+    yield api.app.test_client()
+    scheduler.shutdown(wait=False)
+
+
+def test_malformed_scheduler_limit_is_a_bad_request(client):
+    response = client.get('/api/scheduler?limit=x')
+
+    assert response.status_code == 400
+    assert client.get('/api/scheduler?limit=5').status_code == 200
+
+
+def priority(body, headers=None, default='normal'):
+    with api.app.test_request_context(json=body, headers=headers or {}):
+        chosen, error = api._review_priority(body, default)
+        return chosen, error and error[1]
+
+
+def test_api_reviews_default_to_normal_and_may_lower_their_class(client):
+    assert priority(BODY) == ('normal', None)
+    assert priority(dict(BODY, priority='batch')) == ('batch', None)
+    assert priority(dict(BODY, priority='urgent')) == ('urgent', 400)
+
+
+def test_raising_the_class_takes_the_priority_token(client, monkeypatch):
+    body = dict(BODY, priority='interactive')
+    assert priority(body) == ('interactive', 403)
+
+    monkeypatch.setenv('REVIEW_PRIORITY_TOKEN', 's3cret')
+    assert priority(body, {'X-Priority-Token': 'guess'}) == ('interactive', 403)
+    assert priority(body, {'X-Priority-Token': 's3cret'}) == ('interactive', None)
+    # The stream endpoint is interactive already
+    assert priority(body, default='interactive') == ('interactive', None)
+
+
+def test_review_endpoint_refuses_an_unauthorised_class(client):
+    response = client.post('/api/review', json=dict(BODY, priority='interactive'))
+
+    assert response.status_code == 403
+    assert 'error' in response.get_json()
+
+
+def test_a_non_numeric_request_budget_is_a_bad_request(client):
+    for budget in ('lots', [5]):
+        response = client.post('/api/review', json=dict(BODY, request_budget=budget))
+
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+def test_metrics_endpoint_serves_the_registry(client):
+    response = client.get('/api/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert '# TYPE pr_review_stage_duration_seconds histogram' in response.get_data(as_text=True)
@@ -0,0 +1,49 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+os.environ.setdefault('REVIEW_HISTORY_DISABLED', 'true')
+
+flask = pytest.importorskip('flask')
+import app as api  # noqa: E402
+
+PAYLOAD = {'action': 'synchronize', 'repository': {'html_url': 'https://github.com/o/r'}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('WEBHOOK_SECRET', 's3cret')
+    return api.app.test_client()
+
+
+def signed(body: bytes, secret: str = 's3cret') -> dict:
+    return {'X-GitHub-Event': 'pull_request', 'Content-Type': 'application/json',
+            'X-Hub-Signature-256': 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()}
+
+
+def test_webhook_refused_without_a_configured_secret(monkeypatch):
+    monkeypatch.delenv('WEBHOOK_SECRET', raising=False)
+    body = json.dumps(PAYLOAD).encode()
+    assert api.app.test_client().post('/api/webhook', data=body, headers=signed(body)).status_code == 403
+
+
+def test_webhook_rejects_a_bad_signature(client):
+    body = json.dumps(PAYLOAD).encode()
+    assert client.post('/api/webhook', data=body, headers=signed(body, 'wrong')).status_code == 401
+
+
+def test_webhook_rejects_a_non_object_body(client):
+    body = b'[1, 2]'
+    assert client.post('/api/webhook', data=body, headers=signed(body)).status_code == 400
+
+
+def test_signed_webhook_invalidates(client):
+    body = json.dumps(PAYLOAD).encode()
+    response = client.post('/api/webhook', data=body, headers=signed(body))
+    assert response.status_code == 200
+    assert response.get_json()['repo'] == 'https://github.com/o/r'
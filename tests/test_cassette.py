@@ -0,0 +1,97 @@
+import json
+import os
+import time
+
+import pytest
+import requests
+
+from benchmarks.llm_stub import LLMStub
+from utils.cassette import CASSETTE_VERSION, Cassette, CassetteMiss, RecordingTransport, ReplayTransport
+
+CASSETTE = os.path.join(os.path.dirname(__file__), 'cassettes', 'github_pr.json')
+PROMPT = {'contents': [{'parts': [{'text': 'same prompt'}]}]}
+
+
+def session_with(transport):
+    session = requests.Session()
+    session.mount('http://', transport)
+    session.mount('https://', transport)
+    return session
+
+
+def test_recorded_exchanges_replay_in_order_without_secrets(tmp_path):
+    with LLMStub(answers=['[]', '[{"line": 1}]']) as stub:
+        recorder = RecordingTransport()
+        url = f"{stub.gemini_base}/models/m:generateContent?key=s3cret"
+        for _ in range(2):
+            session_with(recorder).post(url, json=PROMPT).raise_for_status()
+    path = str(tmp_path / 'llm.json')
+    recorder.cassette.save(path)
+
+    with open(path) as f:
+        assert 's3cret' not in f.read()
+    replay = ReplayTransport([Cassette.load(path)])
+    session = session_with(replay)
+    texts = [session.post(url, json=PROMPT).json()['candidates'][0]['content']['parts'][0]['text']
+             for _ in range(3)]
+
+    # Identical requests get their recordings in order, wrapping around
+    assert texts == ['[]', '[{"line": 1}]', '[]']
+    assert dict(replay.calls) == {'127.0.0.1': 3}
+    with pytest.raises(CassetteMiss):
+        session.post(url, json={'contents': [{'parts': [{'text': 'another prompt'}]}]})
+    assert replay.misses == 1
+
+
+def test_replay_injects_latency_and_errors():
+    cassette = Cassette.load(CASSETTE)
+    url = 'https://api.github.com/repos/octo/shop/pulls/7'
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+
+    slow = ReplayTransport([cassette], latency_ms=50)
+    started = time.perf_counter()
+    assert session_with(slow).get(url, headers=headers).json()['number'] == 7
+    assert time.perf_counter() - started >= 0.05
+
+    failing = ReplayTransport([cassette], error_rate=1.0, error_status=503)
+    assert session_with(failing).get(url, headers=headers).status_code == 503
+    dropped = ReplayTransport([cassette], error_rate=1.0, error_status=0)
+    with pytest.raises(requests.ConnectionError):
+        session_with(dropped).get(url, headers=headers)
+    assert (failing.injected_errors, dropped.injected_errors) == (1, 1)
+
+
+def test_cassettes_of_another_version_are_refused(tmp_path):
+    path = tmp_path / 'old.json'
+    path.write_text(json.dumps({'version': CASSETTE_VERSION + 1, 'interactions': []}))
+    with pytest.raises(ValueError, match='re-record'):
+        Cassette.load(str(path))
+
+
+def test_e2e_run_reports_throughput_latency_and_calls_per_platform(monkeypatch, tmp_path):
+    # The runner sets these for its own process, on import and per run; restored after the test
+    names = ('FINDINGS_CACHE_DISABLED', 'REVIEW_STATE_DISABLED', 'GIT_MIRROR_ENABLED', 'REVIEW_HISTORY_DISABLED',
+             'GEMINI_API_KEY', 'LLM_BACKENDS', 'GEMINI_MODEL', 'GEMINI_API_BASE', 'GEMINI_STREAM',
+             'LLM_ROUTING_THRESHOLD', 'LLM_ROUTING_TOP_K', 'LLM_TOKEN_BUDGET', 'NOISE_FILTER_DISABLED',
+             'NOISE_FILTER_PATTERNS')
+    for name in names:
+        monkeypatch.setenv(name, os.environ.get(name, ''))
+    from benchmarks import e2e
+    assert set(e2e.REPLAY_ENV) <= set(names)
+
+    # Git host only: the recorded review's LLM calls are covered by test_review_replay
+    cassette = Cassette.load(CASSETTE)
+    cassette.meta['llm'] = False
+    path = str(tmp_path / 'github.json')
+    cassette.save(path)
+    out = tmp_path / 'summary.json'
+
+    assert e2e.main(['run', path, '--reviews', '6', '--concurrency', '3', '--latency-ms', '5',
+                     '--json', str(out)]) == 0
+
+    summary = json.loads(out.read_text())
+    assert (summary['reviews'], summary['failed'], summary['cassette_misses']) == (6, 0, 0)
+    assert summary['upstream_calls'] == {'github': 12}
+    assert summary['upstream_calls_per_review'] == {'github': 2.0}
+    assert summary['reviews_per_s'] > 0
+    assert 5 <= summary['latency_ms']['p50'] <= summary['latency_ms']['p99']
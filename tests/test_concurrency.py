@@ -0,0 +1,48 @@
+import random
+
+from utils.concurrency import AdaptiveLimiter
+
+
+def run(limiter, requests):
+    """Release one request at a time as (latency, size)"""
+    for latency, size in requests:
+        limiter.acquire()
+        limiter.release(latency, size=size)
+
+
+def mixed(count, slowdown=1.0, seed=7):
+    """Short and long prompts; a fixed overhead plus time per thousand characters"""
+    sizes = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        size = 40.0 if sizes.random() < 0.1 else 2.0
+        requests.append(((0.3 + 0.25 * size) * slowdown, size))
+    return requests
+
+
+def test_a_mix_of_short_and_long_requests_is_not_overload():
+    limiter = AdaptiveLimiter('mixed', initial=4, max_limit=32)
+
+    run(limiter, mixed(2000))
+
+    assert limiter.limit > 16
+
+
+def test_latency_inflating_across_the_mix_shrinks_the_limit():
+    limiter = AdaptiveLimiter('overloaded', initial=4, max_limit=32)
+    run(limiter, mixed(400))
+    grown = limiter.limit
+
+    run(limiter, mixed(30, slowdown=3, seed=8))
+
+    assert limiter.limit < grown * 0.8
+
+
+def test_throttling_halves_the_limit():
+    limiter = AdaptiveLimiter('throttled', initial=8)
+    limiter.acquire()
+
+    limiter.release(0.1, 'throttled')
+
+    assert limiter.limit == 4
+    assert limiter.snapshot()['throttled'] == 1
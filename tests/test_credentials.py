@@ -0,0 +1,127 @@
+import time
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from utils.credentials import CredentialPool, get_credential_pool, parse_tokens
+from utils.http import AuthSession, set_transport
+from utils.ledger import RequestLedger, recording
+from utils.metrics import UPSTREAM_REQUESTS
+
+
+class TokenTransport(BaseAdapter):
+    """Answers by token: 401 for revoked ones, 429 with Retry-After for throttled ones, else 200"""
+
+    def __init__(self, revoked=(), throttled=()):
+        super().__init__()
+        self.revoked = set(revoked)
+        self.throttled = set(throttled)
+        self.seen = []
+
+    def send(self, request, **kwargs):
+        token = request.headers['Authorization']
+        self.seen.append(token)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.headers['X-RateLimit-Remaining'] = '100'
+        response.headers['X-RateLimit-Limit'] = '100'
+        if token in self.revoked:
+            response.status_code = 401
+        elif token in self.throttled:
+            response.status_code = 429
+            response.headers['Retry-After'] = '120'
+        else:
+            response.status_code = 200
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def transport():
+    installed = []
+
+    def install(**kwargs):
+        transport = TokenTransport(**kwargs)
+        set_transport(transport)
+        installed.append(transport)
+        return transport
+    yield install
+    set_transport(None)
+
+
+def test_parse_tokens():
+    assert parse_tokens('a, b\nc,a') == ['a', 'b', 'c']
+    assert parse_tokens(None) == []
+
+
+def test_registry_shares_one_pool_per_host_and_token_set():
+    first = get_credential_pool('https://h.example', ['t1', 't2'])
+    assert get_credential_pool('https://h.example', ['t2', 't1']) is first
+    assert get_credential_pool('https://other.example', ['t1', 't2']) is not first
+    assert get_credential_pool('https://h.example', ['t1']) is not first
+
+
+def test_requests_spread_across_tokens(transport):
+    seen = transport().seen
+    session = AuthSession(CredentialPool(['a', 'b', 'c']))
+    for _ in range(9):
+        session.get('https://h.example/x')
+    assert sorted(seen.count(token) for token in 'abc') == [3, 3, 3]
+
+
+def test_revoked_token_is_benched_and_retry_is_visible_to_hooks(transport):
+    seen = transport(revoked={'bad'}).seen
+    pool = CredentialPool(['bad', 'good'])
+    session = AuthSession(pool)
+    ledger = RequestLedger()
+    before = UPSTREAM_REQUESTS.value(host='retry.example', status=401)
+
+    with recording(ledger):
+        responses = [session.get('https://retry.example/x') for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    # The revoked token was tried exactly once, then benched for every later request
+    assert seen.count('bad') == 1
+    assert ledger.summary()['requests'] == 4
+    assert UPSTREAM_REQUESTS.value(host='retry.example', status=401) == before + 1
+    benched = {entry['name']: entry for entry in pool.snapshot()}
+    assert benched['token-1']['bench_reason'] == 'rejected'
+
+
+def test_throttled_token_sits_out_until_retry_after(transport):
+    transport(throttled={'slow'})
+    pool = CredentialPool(['slow', 'fast'])
+    session = AuthSession(pool)
+    for _ in range(3):
+        assert session.get('https://h.example/x').status_code == 200
+    slow = pool.credentials[0]
+    assert slow.bench_reason == 'throttled'
+    assert slow.benched_until == pytest.approx(time.time() + 120, abs=5)
+
+
+def test_no_retry_when_every_token_is_refused(transport):
+    seen = transport(revoked={'only'}).seen
+    response = AuthSession(CredentialPool(['only'])).get('https://h.example/x')
+    assert response.status_code == 401
+    assert seen == ['only']
+
+
+def test_adapter_requests_get_a_default_timeout(transport):
+    from utils.http import DEFAULT_TIMEOUT
+
+    captured = {}
+    installed = transport()
+    original = installed.send
+
+    def send(request, **kwargs):
+        captured.update(kwargs)
+        return original(request, **kwargs)
+    installed.send = send
+
+    AuthSession(CredentialPool(['a'])).get('https://h.example/x')
+    assert captured['timeout'] == DEFAULT_TIMEOUT
@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from utils.federation import merge_by_updated, run_federated, timestamp
+
+
+def test_timestamp_parses_host_formats():
+    assert timestamp('2024-01-01T00:00:00Z') == timestamp('2024-01-01T01:00:00+01:00')
+    assert timestamp('2024-01-01T00:00:00.5000000Z') - timestamp('2024-01-01T00:00:00Z') == 0.5
+    assert timestamp(None) == 0.0
+    assert timestamp('yesterday') == 0.0
+
+
+def test_merge_is_newest_first_across_lists():
+    merged = merge_by_updated([
+        [{'id': 1, 'updated_at': '2024-01-03T00:00:00Z'}, {'id': 2, 'updated_at': '2024-01-01T00:00:00Z'}],
+        [{'id': 3, 'updated_at': '2024-01-02T00:00:00Z'}],
+    ], limit=2)
+    assert [pr['id'] for pr in merged] == [1, 3]
+
+
+def test_failures_and_timeouts_are_reported_per_name():
+    release = threading.Event()
+
+    def boom():
+        raise RuntimeError('down')
+
+    results = run_federated({'ok': lambda: [1], 'bad': boom, 'slow': lambda: release.wait(5)}, timeout=0.2)
+    release.set()
+    assert results['ok']['value'] == [1] and results['ok']['error'] is None
+    assert results['bad']['error'] == 'down'
+    assert 'timed out' in results['slow']['error']
+
+
+def test_a_hung_call_holds_one_thread_until_it_returns():
+    release = threading.Event()
+    calls = []
+
+    def hang():
+        calls.append(1)
+        release.wait(5)
+        return 'late'
+
+    first = run_federated({'hung-host': hang}, timeout=0.05)
+    assert 'timed out' in first['hung-host']['error']
+    threads = threading.active_count()
+
+    # While the first call lingers, the name is reported busy and not called again
+    for _ in range(20):
+        again = run_federated({'hung-host': hang}, timeout=0.05)
+        assert again['hung-host']['error'] == 'previous call has not returned yet'
+    assert len(calls) == 1
+    assert threading.active_count() <= threads
+
+    release.set()
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        if run_federated({'hung-host': lambda: 'back'}, timeout=1)['hung-host']['value'] == 'back':
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError('the name was never released')
+
+
+def test_waiting_on_a_shared_cache_load_is_bounded():
+    from concurrent.futures import TimeoutError as FutureTimeout
+    from utils.cache import SearchCache
+
+    cache = SearchCache()
+    started, release = threading.Event(), threading.Event()
+    key = SearchCache.key('github', 'q', None, None, 'open', 10)
+
+    def load():
+        started.set()
+        release.wait(5)
+        return ['pr']
+
+    owner = threading.Thread(target=cache.get, args=(key, load))
+    owner.start()
+    assert started.wait(5)
+    began = time.perf_counter()
+    try:
+        cache.get(key, load, timeout=0.05)
+        raise AssertionError('expected a timeout')
+    except FutureTimeout:
+        assert time.perf_counter() - began < 1
+    release.set()
+    owner.join()
+    assert cache.get(key, load) == (['pr'], 'fresh')
+
+
+def test_search_all_passes_azure_settings_to_its_adapter(monkeypatch):
+    pytest.importorskip('flask')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+    monkeypatch.setenv('REVIEW_HISTORY_DISABLED', 'true')
+    import app as api
+    from adapters.azure_devops_adapter import AzureDevOpsAdapter
+    from adapters.github_adapter import GitHubAdapter
+
+    for name in ('GITLAB_TOKEN', 'BITBUCKET_TOKEN'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('GITHUB_TOKEN', 'gh-token')
+    monkeypatch.setenv('AZURE_DEVOPS_TOKEN', 'ado-token')
+    monkeypatch.setenv('AZURE_DEVOPS_ORG_URL', 'https://dev.azure.com/contoso')
+    monkeypatch.setattr(api, 'search_cache', None)
+    options = []
+    from_options = AzureDevOpsAdapter.from_options.__func__
+    monkeypatch.setattr(AzureDevOpsAdapter, 'from_options',
+                        classmethod(lambda cls, given: options.append(given) or from_options(cls, given)))
+    monkeypatch.setattr(GitHubAdapter, 'get_user_prs', lambda self, username, state, limit: [
+        {'id': 1, 'updated_at': '2024-01-01T00:00:00Z'}])
+    monkeypatch.setattr(AzureDevOpsAdapter, 'get_user_prs', lambda self, username, state, limit: [
+        {'id': 2, 'updated_at': '2024-01-02T00:00:00Z', 'org': self.org_url}])
+
+    body = api.app.test_client().get('/api/search?server=all').get_json()
+
+    assert body['servers']['azure']['error'] is None
+    assert [(pr['server'], pr['id']) for pr in body['results']] == [('azure', 2), ('github', 1)]
+    assert options[0]['azure_devops_token'] == 'ado-token'
+    assert options[0]['azure_devops_org_url'] == 'https://dev.azure.com/contoso'
@@ -0,0 +1,53 @@
+import json
+
+from analyzers.code_analyzer import CodeAnalyzer
+from models import Feedback, FeedbackBatch
+
+ITEMS = [
+    Feedback('warning', 'Consider logging', 3, 'print(x)', None, None, 'print_statement'),
+    Feedback('error', 'Quote " and \\ and ünïcode', None, None, 'Use "repr"', 'shop/cart.py'),
+    Feedback('warning', 'Unused total', 12, 'total = 0', 'Remove it', 'shop/cart.py'),
+]
+
+
+def test_legacy_static_dicts_and_malformed_lines_are_read():
+    item = Feedback.from_dict({'type': 'warning', 'message': 'TODO found', 'line': 4, 'code': '# TODO'})
+    assert item.code_snippet == '# TODO'
+    assert Feedback.from_dict({'message': 'x', 'line': True}).line is None
+    assert Feedback.from_dict({'message': 'x', 'line': '7'}).to_dict()['type'] == 'info'
+    # Types and paths are interned, so thousands of findings share one string each
+    assert Feedback('warn' + 'ing', 'a').type is ITEMS[0].type
+
+
+def test_batch_round_trips_and_encodes_like_json():
+    batch = FeedbackBatch(ITEMS)
+
+    assert list(batch) == ITEMS
+    assert batch.to_dicts() == [item.to_dict() for item in ITEMS]
+    assert json.loads(batch.to_json()) == batch.to_dicts()
+    assert [json.loads(row) for row in batch.to_ndjson().splitlines()] == batch.to_dicts()
+    assert batch.type_counts() == {'warning': 2, 'error': 1}
+    assert batch.rule_counts() == {'print_statement': 1, None: 2}
+    assert FeedbackBatch.from_dicts(batch.to_dicts()).to_json() == batch.to_json()
+    assert FeedbackBatch().to_json() == b'[]' and FeedbackBatch().to_ndjson() == b''
+
+
+def test_unseen_drops_findings_with_the_same_line_and_message_start():
+    analyzer = CodeAnalyzer(use_ai=False)
+    long_message = 'x' * 100
+    items = [
+        Feedback('warning', 'Consider logging', 3),
+        # Same fingerprint from another analyzer: dropped whatever its type or path
+        Feedback('info', 'Consider logging', 3, path='shop/cart.py'),
+        Feedback('warning', 'Consider logging', 4),
+        Feedback('warning', long_message + ' first', 5),
+        # Only the first 100 characters of the message count
+        Feedback('warning', long_message + ' second', 5),
+    ]
+    seen = set()
+
+    kept = list(analyzer._unseen(items, seen))
+
+    assert [(item.line, item.message[-6:]) for item in kept] == [(3, 'ogging'), (4, 'ogging'), (5, ' first')]
+    # The set carries across calls, so AI findings are checked against the static ones
+    assert list(analyzer._unseen([Feedback('error', 'Consider logging', 4)], seen)) == []
@@ -0,0 +1,109 @@
+import json
+
+from analyzers.gemini_analyzer import GeminiAnalyzer
+from analyzers.llm_providers import HedgedProvider, LLMProvider, LLMResult
+from utils.cache import FindingsCache
+from utils.diff_parser import Hunk
+
+
+class NoProvider:
+    identity = 'stub'
+    providers = []
+
+    def generate(self, *args, **kwargs):
+        raise AssertionError('cached hunks must not reach the LLM')
+
+
+def test_contains_is_a_side_effect_free_peek():
+    cache = FindingsCache(':memory:')
+    cache.set('k', [{'line': 1}])
+    cache.memory.clear()
+    accessed = cache._conn.execute("SELECT accessed_at FROM findings").fetchone()[0]
+
+    assert cache.contains('k')
+    assert not cache.contains('missing')
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert cache._conn.execute("SELECT accessed_at FROM findings").fetchone()[0] == accessed
+
+
+def test_pricing_then_reviewing_a_cached_hunk_counts_one_lookup():
+    cache = FindingsCache(':memory:')
+    analyzer = GeminiAnalyzer(api_key='unused', cache=cache, provider=NoProvider())
+    hunk = Hunk(path='a.py', header='@@ -1 +1 @@', start=0, new_start=1, lines=['+x = 1'])
+    cache.set(analyzer._cache_key(hunk), [{'line': 1, 'type': 'info', 'message': 'cached'}])
+
+    assert analyzer.is_cached(hunk)
+    findings = list(analyzer.iter_findings([hunk]))
+
+    assert [item.message for item in findings] == ['cached']
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+class ScriptedProvider:
+    """Answers every prompt with the findings it was given and records what it was sent"""
+    identity = 'stub'
+    name = 'stub'
+    providers = []
+
+    def __init__(self, findings):
+        self.findings = findings
+        self.prompts = []
+
+    def generate(self, prompt, config, parse=None, on_attempt=None):
+        self.prompts.append(prompt)
+        on_attempt({'provider': 'stub', 'model': 'stub', 'status': 'ok'})
+        result = LLMResult(text=json.dumps(self.findings), provider='stub', model='stub', finish_reason='STOP')
+        result.parsed = parse(result)
+        return result
+
+
+def test_a_files_hunks_share_one_request_and_findings_map_back_by_hunk_id():
+    first = Hunk(path='a.py', header='@@ -1 +1 @@', start=0, new_start=1, lines=['+x = 1'])
+    second = Hunk(path='a.py', header='@@ -20 +20 @@', start=2, new_start=20, lines=['+y = 2'])
+    other = Hunk(path='b.py', header='@@ -5 +5 @@', start=0, new_start=5, lines=['+z = 3'])
+    provider = ScriptedProvider([
+        {'hunk': 2, 'type': 'warning', 'message': 'second', 'line': 20},
+        {'hunk': 1, 'type': 'info', 'message': 'first', 'line': 1},
+    ])
+    cache = FindingsCache(':memory:')
+    analyzer = GeminiAnalyzer(api_key='unused', cache=cache, provider=provider)
+
+    findings = analyzer.analyze_hunks([first, second, other])
+
+    assert sorted('Hunk 2:' in prompt for prompt in provider.prompts) == [False, True]
+    # Diff order, each finding on the hunk it named
+    assert [(item.path, item.message, item.line) for item in findings[:2]] == [
+        ('a.py', 'first', 1), ('a.py', 'second', 20)]
+    assert sorted((call['path'], call['hunks']) for call in analyzer.reset_usage()) == [('a.py', 2), ('b.py', 1)]
+    # Cached per hunk, so a later review with only one of them still hits
+    assert [item['message'] for item in cache.get(analyzer._cache_key(second))] == ['second']
+
+
+def test_batches_split_at_the_hunk_limit():
+    analyzer = GeminiAnalyzer(api_key='unused', cache=FindingsCache(':memory:'), provider=ScriptedProvider([]))
+    analyzer.batch_hunks = 2
+    hunks = [Hunk(path='a.py', header=f'@@ -{i} +{i} @@', start=i, new_start=i, lines=[f'+v{i} = {i}'])
+             for i in range(1, 6)]
+
+    assert [len(batch) for batch in analyzer._batches(hunks)] == [2, 2, 1]
+
+
+def test_each_answer_is_parsed_once(monkeypatch):
+    class Backend(LLMProvider):
+        name = 'scripted'
+
+        def generate(self, prompt, generation_config):
+            return LLMResult(text='[{"hunk": 1, "type": "info", "message": "ok", "line": 1}]',
+                             provider=self.name, model=self.model, finish_reason='STOP')
+
+    analyzer = GeminiAnalyzer(api_key='unused', cache=FindingsCache(':memory:'),
+                              provider=HedgedProvider([Backend('parse-once')]))
+    parses = []
+    parse = analyzer._parse_response
+    monkeypatch.setattr(analyzer, '_parse_response', lambda *args: parses.append(args) or parse(*args))
+
+    findings = analyzer.analyze_hunks([Hunk(path='a.py', header='@@ -1 +1 @@', start=0, new_start=1,
+                                            lines=['+x = 1'])])
+
+    assert [item.message for item in findings if item.message == 'ok'] == ['ok']
+    assert len(parses) == 1
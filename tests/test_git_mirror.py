@@ -0,0 +1,54 @@
+import os
+import subprocess
+
+from adapters.bitbucket_adapter import BitbucketAdapter
+from adapters.github_adapter import GitHubAdapter
+from adapters.gitlab_adapter import GitLabAdapter
+from utils.git_mirror import GitMirror
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def test_remote_url_ignores_the_callers_host():
+    assert GitHubAdapter('tok').git_remote_url('https://attacker.example/owner/repo') == \
+        'https://github.com/owner/repo.git'
+    assert GitLabAdapter('tok', 'https://gitlab.internal').git_remote_url('https://attacker.example/g/p.git') == \
+        'https://gitlab.internal/g/p.git'
+    assert BitbucketAdapter('tok').git_remote_url('https://attacker.example/w/r') == 'https://bitbucket.org/w/r.git'
+    assert BitbucketAdapter('tok', 'https://bb.internal/rest').git_remote_url('https://bb.internal/w/r') is None
+
+
+def test_fetch_uses_the_given_remote_and_stores_none(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    git('init', '-q', '-b', 'main', cwd=source)
+    (source / 'a.py').write_text('x = 1\n')
+    git('add', 'a.py', cwd=source)
+    git('-c', 'user.name=t', '-c', 'user.email=t@example.com', 'commit', '-q', '-m', 'init', cwd=source)
+    head = git('rev-parse', 'HEAD', cwd=source)
+
+    mirror = GitMirror(str(tmp_path / 'mirrors'))
+    path = mirror.fetch('https://attacker.example/owner/repo', str(source), ['refs/heads/main'])
+
+    assert mirror.has_commit('https://attacker.example/owner/repo', head)
+    # No remote is recorded, so nothing in the mirror's config can point a later fetch elsewhere
+    assert git('remote', cwd=path) == ''
+    assert os.path.isdir(path)
+
+
+def test_agents_share_one_mirror_built_on_first_review(monkeypatch, tmp_path):
+    from pr_review_agent import PRReviewAgent
+
+    monkeypatch.setenv('GIT_MIRROR_ENABLED', 'true')
+    monkeypatch.setenv('GIT_MIRROR_DIR', str(tmp_path / 'mirrors'))
+    monkeypatch.setenv('SYMBOL_INDEX_DISABLED', 'true')
+    agents = [PRReviewAgent(git_server='github', github_token='t') for _ in range(3)]
+    # Search-only agents never build it
+    assert not (tmp_path / 'mirrors').exists()
+
+    assert agents[0].mirror is agents[1].mirror is agents[2].mirror
+    # So the per-repository fetch lock is the same lock for every agent
+    path = agents[0].mirror.path_for('https://github.com/octo/shop')
+    assert agents[0].mirror._locks[path] is agents[2].mirror._locks[path]
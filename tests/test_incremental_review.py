@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from analyzers.llm_providers import LLMResult
+from pr_review_agent import PRReviewAgent
+from utils.review_state import ReviewStateStore
+
+REPO = 'https://github.com/octo/shop'
+
+
+def file_diff(path, added):
+    lines = ''.join(f'+{line}\n' for line in added)
+    return f'diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -0,0 +1,{len(added)} @@\n{lines}'
+
+
+class FakeHost:
+    """Serves one PR whose head moves with ``push``; the interdiff is whatever the last push changed"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.head = 'h1'
+        self.interdiff = ''
+
+    def push(self, head, **files):
+        self.head = head
+        self.files.update(files)
+        self.interdiff = ''.join(file_diff(path, added) for path, added in files.items())
+
+    def get_pr_details(self, repo_url, pr_id):
+        return {'title': 'Cart fixes', 'head': self.head}
+
+    def get_pr_shas(self, pr_details):
+        return 'base', pr_details['head']
+
+    def iter_diff_chunks(self, repo_url, pr_id):
+        yield ''.join(file_diff(path, added) for path, added in self.files.items()).encode('utf-8')
+
+    def get_compare_diff(self, repo_url, base_sha, head_sha):
+        return self.interdiff
+
+
+class Provider:
+    """Finds one issue in shop/cart.py and nothing elsewhere; records the files it was sent"""
+    providers = []
+
+    def __init__(self):
+        self.sent = []
+
+    def generate(self, prompt, config, parse=None, on_attempt=None):
+        path = prompt.split('+++ b/', 1)[1].split('\n', 1)[0]
+        self.sent.append(path)
+        findings = []
+        if path == 'shop/cart.py':
+            findings.append({'hunk': 1, 'type': 'warning', 'message': 'Unused total', 'line': 1})
+        result = LLMResult(text=json.dumps(findings), provider='stub', model='stub', finish_reason='STOP')
+        result.parsed = parse(result)
+        return result
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    for name in ('FINDINGS_CACHE_DISABLED', 'REVIEW_HISTORY_DISABLED'):
+        monkeypatch.setenv(name, 'true')
+    monkeypatch.setenv('GIT_MIRROR_ENABLED', 'false')
+    agent = PRReviewAgent(git_server='github', github_token='t', gemini_api_key='k',
+                          state_store=ReviewStateStore(':memory:'))
+    agent.adapter = FakeHost({'shop/cart.py': ['total = 0'], 'shop/tax.py': ['RATE = 0.2']})
+    agent.analyzer.gemini_analyzer.provider = Provider()
+    return agent
+
+
+def test_a_clean_unchanged_file_is_not_sent_again_after_a_force_push(agent):
+    provider = agent.analyzer.gemini_analyzer.provider
+    agent.review_pr(REPO, 7)
+    assert sorted(provider.sent) == ['shop/cart.py', 'shop/tax.py']
+
+    # Force-push that rewrites cart.py only; tax.py had no findings and is unchanged
+    agent.adapter.push('h2', **{'shop/cart.py': ['total = 1']})
+    provider.sent.clear()
+    result = agent.review_pr(REPO, 7)
+
+    assert provider.sent == ['shop/cart.py']
+    assert result['analysis']['incremental']['files_reused'] == 1
+    assert sorted(agent.state_store.get(REPO, 7)['findings']) == ['shop/cart.py', 'shop/tax.py']
+
+
+def test_agents_open_the_state_store_once_and_only_when_reviewing(monkeypatch, tmp_path):
+    monkeypatch.setenv('REVIEW_STATE_PATH', str(tmp_path / 'reviews.db'))
+    opened = []
+    original = ReviewStateStore.__init__
+    monkeypatch.setattr(ReviewStateStore, '__init__', lambda self, path: opened.append(path) or original(self, path))
+
+    searchers = [PRReviewAgent(git_server='github', github_token='t') for _ in range(3)]
+    assert opened == [] and searchers
+
+    first = PRReviewAgent(git_server='github', github_token='t')
+    second = PRReviewAgent(git_server='github', github_token='t')
+    assert first.state_store is second.state_store
+    assert opened == [str(tmp_path / 'reviews.db')]
@@ -0,0 +1,56 @@
+import json
+
+from analyzers.json_stream import JSONArrayStream, extract_array
+
+FINDINGS = [
+    {'hunk': 1, 'type': 'warning', 'message': 'Brackets ] and } in "quotes"', 'line': 3},
+    {'hunk': 2, 'type': 'error', 'message': 'Escaped \\" quote and a backslash \\\\', 'line': None},
+    {'hunk': 2, 'type': 'info', 'message': 'Nested', 'suggestion': {'code': ['a[0]', '{b}']}},
+]
+ANSWER = 'Here you go:\n```json\n' + json.dumps(FINDINGS) + '\n```\nTrailing [prose] {too}'
+
+
+def feed_in_chunks(text, size):
+    parser = JSONArrayStream()
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return items, parser
+
+
+def test_every_chunking_yields_the_same_objects():
+    for size in range(1, 40):
+        items, parser = feed_in_chunks(ANSWER, size)
+        assert items == FINDINGS, size
+        assert parser.done and parser.errors == 0
+
+
+def test_every_split_point_of_an_escape_is_handled():
+    text = json.dumps([{'message': 'a\\"b\\\\"c'}])
+    for split in range(len(text) + 1):
+        parser = JSONArrayStream()
+        items = parser.feed(text[:split]) + parser.feed(text[split:])
+        assert items == [{'message': 'a\\"b\\\\"c'}], split
+
+
+def test_objects_arrive_as_soon_as_they_close():
+    parser = JSONArrayStream()
+    assert parser.feed('[{"line": 1}, {"li') == [{'line': 1}]
+    assert parser.feed('ne": 2}') == [{'line': 2}]
+    assert not parser.done
+    assert parser.feed(']') == [] and parser.done
+    # Nothing after the array is parsed
+    assert parser.feed('[{"line": 3}]') == []
+
+
+def test_malformed_objects_are_counted_not_fatal():
+    items, parser = feed_in_chunks('[{"line": 1,}, {"line": 2}]', 4)
+    assert items == [{'line': 2}] and parser.errors == 1
+
+
+def test_extract_array_skips_bracketed_prose_and_reports_truncation():
+    items, parser = extract_array('See [1] for details: [{"line": 1}, {"line": 2')
+    assert items == [{'line': 1}]
+    assert not parser.done
+
+    assert extract_array('no findings here')[0] == []
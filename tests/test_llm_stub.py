@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import pytest
+
+from analyzers.gemini_analyzer import GeminiAnalyzer
+from analyzers.llm_providers import GeminiProvider, HedgedProvider, LLMProvider, LLMResult, OpenAICompatibleProvider
+from benchmarks.llm_stub import LLMStub
+from utils.cache import FindingsCache
+from utils.diff_parser import Hunk
+
+FINDINGS = [
+    {'hunk': 1, 'type': 'warning', 'message': 'x is never used', 'line': 3, 'code_snippet': 'x = 1',
+     'suggestion': None},
+    {'hunk': 1, 'type': 'error', 'message': 'y is undefined', 'line': 4, 'code_snippet': 'print(y)',
+     'suggestion': 'define y'},
+]
+HUNK = Hunk(path='app.py', header='@@ -1,2 +3,2 @@', start=0, new_start=3, lines=['+x = 1', '+print(y)'])
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(**kwargs):
+        stub = LLMStub(**kwargs).start()
+        started.append(stub)
+        return stub
+
+    yield start
+    for stub in started:
+        stub.stop()
+
+
+def test_streamed_findings_are_yielded_before_the_answer_completes(stubs):
+    stub = stubs(answers=[json.dumps(FINDINGS)], chunk_ms=40, chunk_chars=30)
+    provider = HedgedProvider([GeminiProvider('key', model='stream-test', api_base=stub.gemini_base)])
+    analyzer = GeminiAnalyzer(api_key='key', cache=FindingsCache(':memory:'), stream=True, provider=provider)
+
+    started = time.perf_counter()
+    arrivals = []
+    for finding in analyzer.iter_findings([HUNK]):
+        arrivals.append((time.perf_counter() - started, finding))
+    total = time.perf_counter() - started
+
+    assert [(item.type, item.line, item.path) for _, item in arrivals] == [('warning', 3, 'app.py'),
+                                                                          ('error', 4, 'app.py')]
+    assert arrivals[0][0] < total - 0.1
+    call, = analyzer.reset_usage()
+    assert call['stream'] and call['status'] == 'ok' and call['first_finding_ms'] < call['latency_ms']
+    assert stub.requests[0][0].endswith(':streamGenerateContent')
+
+
+def test_errors_fall_back_to_the_next_backend(stubs):
+    broken = stubs(fail_first=100, fail_status=500)
+    local = stubs(answers=[json.dumps(FINDINGS)])
+    provider = HedgedProvider([GeminiProvider('key', model='fallback-test', api_base=broken.gemini_base),
+                               OpenAICompatibleProvider(local.openai_base, 'fallback-local')])
+    attempts = []
+
+    result = provider.generate('review this', {'maxOutputTokens': 64}, on_attempt=attempts.append)
+
+    assert (result.provider, json.loads(result.text)) == ('openai', FINDINGS)
+    assert [(attempt['provider'], attempt['status']) for attempt in attempts] == [('gemini', 'error'),
+                                                                                 ('openai', 'ok')]
+    assert provider.stats['fallbacks'] == 1
+
+
+def test_a_slow_primary_is_hedged_and_the_first_answer_wins(stubs):
+    slow = stubs(answers=['[]'], latency_ms=1500)
+    fast = stubs(answers=[json.dumps(FINDINGS)])
+    primary = GeminiProvider('key', model='hedge-test', api_base=slow.gemini_base)
+    provider = HedgedProvider([primary, OpenAICompatibleProvider(fast.openai_base, 'hedge-local')], min_samples=1)
+    # The primary usually answers in 50 ms, so 1.5 s is far past its percentile
+    provider._latencies[primary.identity].append(50.0)
+
+    started = time.perf_counter()
+    result = provider.generate('review this', {'maxOutputTokens': 64})
+
+    assert time.perf_counter() - started < 1.0
+    assert (result.provider, result.hedged) == ('openai', True)
+    assert provider.stats['hedge_wins'] == 1
+
+
+def test_throttling_without_retry_after_backs_off_with_jitter(stubs, monkeypatch):
+    throttling = stubs(answers=['[]'], fail_first=2, fail_status=429)
+    provider = GeminiProvider('key', model='backoff-test', api_base=throttling.gemini_base)
+    waits = []
+    monkeypatch.setattr(provider, '_throttle_backoff', lambda attempt: waits.append(attempt) or 0.01)
+
+    assert provider.generate('review this', {}).text == '[]'
+    assert (len(throttling.requests), waits) == (3, [0, 1])
+
+    # The server's Retry-After is honoured through the limiter instead
+    told = stubs(answers=['[]'], fail_first=1, fail_status=503, retry_after='0')
+    provider = GeminiProvider('key', model='retry-after-test', api_base=told.gemini_base)
+    monkeypatch.setattr(provider, '_throttle_backoff', lambda attempt: waits.append(attempt) or 0.01)
+    provider.generate('review this', {})
+    assert (len(told.requests), waits) == (2, [0, 1])
+
+
+def test_throttle_backoff_doubles_up_to_the_cap(monkeypatch):
+    provider = GeminiProvider('key', model='backoff-bounds')
+    monkeypatch.setattr('analyzers.llm_providers.random.uniform', lambda low, high: high)
+
+    assert [provider._throttle_backoff(attempt) for attempt in range(6)] == [0.5, 1.0, 2.0, 4.0, 8.0, 8.0]
+
+
+def test_providers_built_per_review_share_the_attempt_threads():
+    threads = set()
+
+    class Backend(LLMProvider):
+        name = 'scripted'
+
+        def generate(self, prompt, generation_config):
+            threads.add(threading.current_thread())
+            return LLMResult(text='[]', provider=self.name, model=self.model)
+
+    # Kept alive, as agents of concurrent API requests are
+    providers = [HedgedProvider([Backend('per-review')]) for _ in range(100)]
+    for provider in providers:
+        assert provider.generate('review this', {}).text == '[]'
+
+    assert len(threads) < 10
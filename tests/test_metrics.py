@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from utils import metrics
+from utils.metrics import MetricsRegistry, TraceFileExporter, span
+
+
+def test_counters_and_histograms_render_as_prometheus_text():
+    registry = MetricsRegistry()
+    lookups = registry.counter('cache_lookups_total', 'Lookups', ('cache', 'result'))
+    sizes = registry.histogram('diff_bytes', 'Diff sizes', ('source',), (10, 100))
+    lookups.inc(cache='findings', result='hit')
+    lookups.inc(2, cache='findings', result='miss')
+    lookups.inc(cache='path "a"\nb', result='hit')
+    for value in (5, 10, 50, 500):
+        sizes.observe(value, source='api')
+    sizes.observe(0.5, source='cli')
+
+    assert registry.render().splitlines() == [
+        '# HELP cache_lookups_total Lookups',
+        '# TYPE cache_lookups_total counter',
+        'cache_lookups_total{cache="findings",result="hit"} 1',
+        'cache_lookups_total{cache="findings",result="miss"} 2',
+        'cache_lookups_total{cache="path \\"a\\"\\nb",result="hit"} 1',
+        '# HELP diff_bytes Diff sizes',
+        '# TYPE diff_bytes histogram',
+        # Buckets are cumulative and a value on a bound falls in that bucket
+        'diff_bytes_bucket{source="api",le="10"} 2',
+        'diff_bytes_bucket{source="api",le="100"} 3',
+        'diff_bytes_bucket{source="api",le="+Inf"} 4',
+        'diff_bytes_sum{source="api"} 565',
+        'diff_bytes_count{source="api"} 4',
+        'diff_bytes_bucket{source="cli",le="10"} 1',
+        'diff_bytes_bucket{source="cli",le="100"} 1',
+        'diff_bytes_bucket{source="cli",le="+Inf"} 1',
+        'diff_bytes_sum{source="cli"} 0.5',
+        'diff_bytes_count{source="cli"} 1',
+    ]
+    # Registering a name again returns the existing metric
+    assert registry.counter('cache_lookups_total', 'Lookups', ('cache', 'result')) is lookups
+    registry.reset()
+    assert lookups.value(cache='findings', result='hit') == 0 and sizes.count(source='api') == 0
+
+
+def test_spans_time_stages_count_errors_and_export_one_trace(tmp_path, monkeypatch):
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(metrics, 'trace_exporter', TraceFileExporter(str(path), 'test-service'))
+    observed = metrics.STAGE_SECONDS.count(stage='test_child')
+    errors = metrics.STAGE_ERRORS.value(stage='test_child')
+
+    with span('test_root', pr=7) as root:
+        with span('test_child'):
+            assert metrics.current_span().parent_id == root.span_id
+        with pytest.raises(ValueError):
+            with span('test_child'):
+                raise ValueError('boom')
+        # Nothing is written while the root is still open
+        assert not path.exists()
+
+    assert metrics.current_span() is None
+    assert metrics.STAGE_SECONDS.count(stage='test_child') == observed + 2
+    assert metrics.STAGE_ERRORS.value(stage='test_child') == errors + 1
+    assert set(root.timings) == {'test_root', 'test_child'}
+
+    [line] = path.read_text().splitlines()
+    resource = json.loads(line)['resourceSpans'][0]
+    assert resource['resource']['attributes'][0]['value'] == {'stringValue': 'test-service'}
+    spans = resource['scopeSpans'][0]['spans']
+    assert [item['name'] for item in spans] == ['test_child', 'test_child', 'test_root']
+    assert {item['traceId'] for item in spans} == {root.trace_id}
+    assert spans[1]['status'] == {'code': 2, 'message': 'ValueError: boom'}
+    assert spans[2]['attributes'] == [{'key': 'pr', 'value': {'intValue': '7'}}]
+    assert 'parentSpanId' not in spans[2]
@@ -0,0 +1,106 @@
+import tracemalloc
+
+from analyzers.code_analyzer import CodeAnalyzer
+from analyzers.noise_filter import NoiseFilter
+from utils.mapped_diff import iter_sections, spool_diff
+
+
+def file_diff(path, added):
+    lines = ''.join(f'+{line}\n' for line in added)
+    return (f'diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n'
+            f'@@ -0,0 +1,{len(added)} @@\n{lines}')
+
+
+SMALL = file_diff('app.py', ['x = 2'])
+BIG = file_diff('big.py', [f'value_{i} = {i}' for i in range(40)])
+
+
+def test_noisy_files_are_classified_and_reported():
+    diff = (file_diff('yarn.lock', ['left-pad@1.0.0:'])
+            + file_diff('web/app.min.js', ['var a=1;' * 200])
+            + file_diff('assets/blob.txt', ['ZGF0YT' + 'x' * 1200])
+            + SMALL)
+
+    kept, report = NoiseFilter().filter(diff)
+
+    assert [(item['path'], item['reason']) for item in report['skipped']] == [
+        ('yarn.lock', 'path pattern'),
+        ('web/app.min.js', 'path pattern'),
+        ('assets/blob.txt', 'minified (long lines)'),
+    ]
+    assert kept.strip() == SMALL.strip()
+    assert (report['files_total'], report['files_skipped']) == (4, 3)
+    assert report['bytes_saved'] == sum(item['bytes'] for item in report['skipped']) > 0
+
+
+def test_gitattributes_last_matching_rule_wins():
+    attributes = '\n'.join([
+        'gen/** linguist-generated',
+        'gen/keep.py -linguist-generated',
+        '# a comment',
+        'yarn.lock linguist-generated=false',
+        'third/* linguist-vendored',
+    ])
+    noise = NoiseFilter(gitattributes=attributes)
+    diff = (file_diff('gen/api.py', ['x = 1']) + file_diff('gen/keep.py', ['y = 1'])
+            + file_diff('yarn.lock', ['left-pad@1.0.0:']) + file_diff('third/lib.py', ['z = 1']))
+
+    kept, report = noise.filter(diff)
+
+    assert [(item['path'], item['reason']) for item in report['skipped']] == [
+        ('gen/api.py', 'generated'),
+        ('third/lib.py', 'vendored'),
+    ]
+    # Unset by .gitattributes, so not even the default lockfile pattern applies
+    assert 'gen/keep.py' in kept and 'yarn.lock' in kept
+
+
+def test_summarize_keeps_only_the_headers_of_skipped_files():
+    diff = file_diff('package-lock.json', ['"lockfileVersion": 3']) + SMALL
+
+    kept, report = NoiseFilter(mode='summarize').filter(diff)
+
+    assert 'diff --git a/package-lock.json b/package-lock.json' in kept
+    assert 'lockfileVersion' not in kept
+    assert '+x = 2' in kept
+    assert report['mode'] == 'summarize' and report['files_skipped'] == 1
+
+
+def test_spilled_diffs_are_filtered_like_in_memory_ones():
+    diff = file_diff('yarn.lock', ['left-pad@1.0.0:']) + BIG + file_diff('web/app.min.js', ['var a=1;' * 200]) + SMALL
+
+    for mode in ('drop', 'summarize'):
+        noise = NoiseFilter(mode=mode)
+        kept, report = noise.filter(diff)
+        with spool_diff([diff.encode('utf-8')], threshold=1) as spilled:
+            sections, spilled_report = noise.filter(spilled)
+            text = '\n'.join(text for _, text in iter_sections(sections))
+        assert text == kept
+        assert [item['path'] for item in spilled_report['skipped']] == [item['path'] for item in report['skipped']]
+        assert spilled_report['files_total'] == report['files_total'] == 4
+
+
+def test_a_spilled_diff_is_analyzed_one_section_at_a_time(monkeypatch):
+    monkeypatch.delenv('NOISE_FILTER_DISABLED', raising=False)
+    files = [file_diff(f'pkg/module_{i}.py', [f'value_{j} = compute({j}, {i})' for j in range(800)])
+             for i in range(100)]
+    # A single file larger than any chunk, with a finding at its very end
+    files.append(file_diff('pkg/huge.py', [f'row_{j} = [{j}, {j + 1}]' for j in range(40000)] + ['print(total)']))
+    diff = ''.join(files).encode('utf-8')
+
+    with spool_diff([diff], threshold=1) as spilled:
+        analyzer = CodeAnalyzer(use_ai=False)
+        tracemalloc.start()
+        try:
+            feedback = list(analyzer.iter_diff(spilled))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert analyzer.report['noise_filter']['files_skipped'] == 0
+        assert [item.code_snippet for item in feedback] == ['print(total)']
+        # 1-based position of the last line before the final newline
+        assert feedback[0].line == spilled.line_count - 1
+    # Decoding the diff whole would take more than its size
+    assert len(diff) > 3 * 1024 * 1024
+    assert peak < len(diff) / 4
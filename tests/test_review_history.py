@@ -0,0 +1,51 @@
+import time
+
+from models import Feedback, FeedbackBatch
+from utils.review_history import ReviewHistory
+
+DAY = 86400
+
+
+def findings(count=2):
+    return [Feedback(type='error', message=f'problem {i}', line=i, path='a.py', rule='py.eval') for i in range(count)]
+
+
+def test_prune_drops_raw_rows_past_retention_but_keeps_rollups():
+    history = ReviewHistory(':memory:', retention_days=30)
+    now = time.time()
+    history.record('repo', 2, 90.0, findings(), author='ann', reviewed_at=now - DAY)
+    history.record('repo', 1, 80.0, findings(), author='ann', reviewed_at=now - 40 * DAY)
+
+    assert history.prune(now) == 1
+    assert [review['pr_id'] for review in history.reviews()] == ['2']
+    assert history._conn.execute("SELECT COUNT(*) FROM findings").fetchone()[0] == 2
+    # Rollups still cover the pruned review
+    assert sum(day['reviews'] for day in history.trend(days=60)) == 2
+    assert history.top(days=60) == [{'rule': 'py.eval', 'findings': 4, 'errors': 4}]
+
+
+def test_record_prunes_at_most_once_per_interval():
+    history = ReviewHistory(':memory:', retention_days=30)
+    old = time.time() - 40 * DAY
+    history.record('repo', 1, 80.0, findings(), reviewed_at=old)
+    assert history.reviews() == []
+
+    # Within the interval no sweep runs, so the late-arriving old review stays until the next one
+    history.record('repo', 2, 80.0, findings(), reviewed_at=old)
+    assert len(history.reviews()) == 1
+    assert history.prune() == 1
+
+
+def test_without_retention_nothing_is_pruned():
+    history = ReviewHistory(':memory:', retention_days=None)
+    history.record('repo', 1, 80.0, findings(), reviewed_at=time.time() - 400 * DAY)
+
+    assert history.prune() == 0
+    assert len(history.reviews()) == 1
+
+
+def test_feedback_batch_holds_more_than_65535_distinct_rules():
+    batch = FeedbackBatch(Feedback(type='info', message='m', rule=f'rule.{i}') for i in range(70000))
+
+    assert len(batch.rule_counts()) == 70000
+    assert batch[69999].rule == 'rule.69999'
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+from requests.adapters import HTTPAdapter
+
+from benchmarks.llm_stub import LLMStub
+from pr_review_agent import PRReviewAgent
+from utils.cassette import Cassette, ReplayTransport
+from utils.http import get_session, set_transport
+
+CASSETTE = os.path.join(os.path.dirname(__file__), 'cassettes', 'github_pr.json')
+
+# Requested one file at a time, in diff order: shop/cart.py (two hunks), then shop/tax.py
+ANSWERS = [
+    [{'hunk': 2, 'type': 'warning', 'message': 'Debug print left in clear()', 'line': 44},
+     {'hunk': 1, 'type': 'error', 'message': 'total() divides by zero on an empty cart', 'line': 15}],
+    [{'hunk': 1, 'type': 'error', 'message': 'eval() of user input', 'line': 2}],
+]
+
+
+@pytest.fixture
+def replay(monkeypatch):
+    """GitHub served from the cassette and the LLM from a stub on loopback; nothing leaves the machine"""
+    for name in ('FINDINGS_CACHE_DISABLED', 'REVIEW_STATE_DISABLED', 'REVIEW_HISTORY_DISABLED'):
+        monkeypatch.setenv(name, 'true')
+    monkeypatch.setenv('GIT_MIRROR_ENABLED', 'false')
+    monkeypatch.setenv('LLM_MAX_CONCURRENCY', '1')
+    monkeypatch.delenv('LLM_BACKENDS', raising=False)
+
+    stub = LLMStub(answers=[json.dumps(answer) for answer in ANSWERS]).start()
+    monkeypatch.setenv('GEMINI_API_BASE', stub.gemini_base)
+    transport = ReplayTransport([Cassette.load(CASSETTE)])
+    set_transport(transport)
+    # The longest matching prefix wins, so only the stub bypasses the cassette
+    get_session().mount(stub.url, HTTPAdapter())
+    yield transport, stub
+    get_session().adapters.pop(stub.url, None)
+    set_transport(None)
+    stub.stop()
+
+
+def test_review_pr_replays_a_recorded_review_offline(replay):
+    transport, stub = replay
+    agent = PRReviewAgent(git_server='github', github_token='replay', gemini_api_key='replay')
+
+    result = agent.review_pr('https://github.com/octo/shop', 7, incremental=False)
+
+    assert (transport.misses, dict(transport.calls)) == (0, {'api.github.com': 2})
+    assert result['ledger']['requests'] == 2
+    ai = {(item.path, item.line, item.message) for item in result['feedback']
+          if item.message in {finding['message'] for answer in ANSWERS for finding in answer}}
+    assert ai == {
+        ('shop/cart.py', 15, 'total() divides by zero on an empty cart'),
+        ('shop/cart.py', 44, 'Debug print left in clear()'),
+        ('shop/tax.py', 2, 'eval() of user input'),
+    }
+    # One request per file, each carrying that file's hunks
+    prompts = [body['contents'][0]['parts'][0]['text'] for _, body in stub.requests]
+    assert len(prompts) == 2
+    assert 'shop/cart.py' in prompts[0] and 'Hunk 2:' in prompts[0]
+    assert 'shop/tax.py' in prompts[1] and 'Hunk 2:' not in prompts[1]
+    assert result['score'] < 100
+
+
+def test_pricing_a_review_reuses_its_pr_details(replay):
+    transport, _ = replay
+    agent = PRReviewAgent(git_server='github', github_token='replay', gemini_api_key='replay')
+
+    # 6 + 1 changed lines and 2 files, from the details the review then uses
+    assert agent.estimate_cost('https://github.com/octo/shop', 7) == 107.0
+    agent.review_pr('https://github.com/octo/shop', 7, incremental=False)
+
+    assert (transport.misses, dict(transport.calls)) == (0, {'api.github.com': 2})
+
+
+def test_a_zero_request_budget_is_kept(monkeypatch):
+    monkeypatch.setenv('REVIEW_REQUEST_BUDGET', '30')
+
+    assert PRReviewAgent(git_server='github', github_token='t', gemini_api_key='k', request_budget=0).request_budget == 0
+    assert PRReviewAgent(git_server='github', github_token='t', gemini_api_key='k').request_budget == 30
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from utils.scheduler import DEFAULT_COST, ReviewScheduler, estimate_cost, parse_sla_targets
+
+
+def run_in_order(scheduler, jobs):
+    """Hold the only worker, queue ``jobs`` as (repo, pr, cost, sla) and return the PRs in start order"""
+    gate = threading.Event()
+    started = []
+    blocker = scheduler.submit('gate', 0, gate.wait, cost=1)
+    futures = [scheduler.submit(repo, pr, lambda pr=pr: started.append(pr), cost=cost, sla=sla)
+               for repo, pr, cost, sla in jobs]
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(timeout=5)
+    return started
+
+
+@pytest.fixture
+def schedulers():
+    created = []
+
+    def make(**kwargs):
+        scheduler = ReviewScheduler(**kwargs)
+        created.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in created:
+        scheduler.shutdown(wait=False)
+
+
+def test_estimate_cost_from_lines_files_or_default():
+    assert estimate_cost({'additions': 10, 'deletions': 5, 'files': 2}) == 115
+    assert estimate_cost({'additions': None, 'deletions': None, 'files': 3}) == 270
+    assert estimate_cost(None) == estimate_cost({}) == DEFAULT_COST
+
+
+def test_shortest_job_first_lets_small_prs_overtake_a_giant(schedulers):
+    scheduler = schedulers(workers=1, aging=0)
+    jobs = [('repo', 1, 5000, 'normal'), ('repo', 2, 10, 'normal'), ('repo', 3, 200, 'normal')]
+
+    assert run_in_order(scheduler, jobs) == [2, 3, 1]
+
+
+def test_fifo_keeps_arrival_order(schedulers):
+    scheduler = schedulers(workers=1, policy='fifo')
+    jobs = [('repo', 1, 5000, 'normal'), ('repo', 2, 10, 'normal'), ('repo', 3, 200, 'normal')]
+
+    assert run_in_order(scheduler, jobs) == [1, 2, 3]
+
+
+def test_fair_alternates_between_repositories(schedulers):
+    scheduler = schedulers(workers=1, policy='fair', aging=0)
+    jobs = [('busy', 1, 10, 'normal'), ('busy', 2, 10, 'normal'), ('busy', 3, 10, 'normal'),
+            ('quiet', 4, 10, 'normal')]
+
+    assert run_in_order(scheduler, jobs) == [1, 4, 2, 3]
+    assert run_in_order(schedulers(workers=1, policy='sjf', aging=0), jobs) == [1, 2, 3, 4]
+
+
+def test_a_job_past_its_sla_target_goes_first(schedulers):
+    scheduler = schedulers(workers=1, aging=0, classes=parse_sla_targets('batch=0.01'))
+    gate = threading.Event()
+    started = []
+    blocker = scheduler.submit('gate', 0, gate.wait)
+    cheap = scheduler.submit('repo', 1, lambda: started.append(1), cost=10, sla='normal')
+    overdue = scheduler.submit('repo', 2, lambda: started.append(2), cost=5000, sla='batch')
+    time.sleep(0.05)
+    gate.set()
+    for future in (blocker, cheap, overdue):
+        future.result(timeout=5)
+
+    assert started == [2, 1]
+    snapshot = scheduler.snapshot()
+    assert snapshot['classes']['batch']['missed'] == 1
+    assert snapshot['classes']['normal']['started'] == 2
+
+
+def test_large_jobs_leave_a_worker_for_small_ones(schedulers):
+    scheduler = schedulers(workers=2, large_cost=1000, max_large=1)
+    release = threading.Event()
+    first_large = scheduler.submit('repo', 1, release.wait, cost=5000)
+    second_large = scheduler.submit('repo', 2, release.wait, cost=5000)
+    small = scheduler.submit('repo', 3, lambda: 'done', cost=10)
+
+    assert small.result(timeout=5) == 'done'
+    snapshot = scheduler.snapshot()
+    assert (snapshot['running_large'], snapshot['queue_depth']) == (1, 1)
+    assert snapshot['queue'][0]['pr_id'] == 2
+    release.set()
+    first_large.result(timeout=5)
+    second_large.result(timeout=5)
+
+
+def test_slot_holds_a_worker_in_the_calling_thread(schedulers):
+    scheduler = schedulers(workers=1)
+    with scheduler.slot('repo', 1, cost=10):
+        queued = scheduler.submit('repo', 2, lambda: 'ran')
+        time.sleep(0.05)
+        assert not queued.done()
+        assert scheduler.snapshot()['running'] == 1
+
+    assert queued.result(timeout=5) == 'ran'
+
+
+def test_unknown_policy_or_class_is_rejected(schedulers):
+    with pytest.raises(ValueError):
+        ReviewScheduler(policy='lottery')
+    with pytest.raises(ValueError):
+        schedulers(workers=1).submit('repo', 1, lambda: None, sla='urgent')
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from utils.cache import SearchCache
+
+
+def key(server='github', repo='https://github.com/o/r', query=None):
+    return SearchCache.key(server, query, None, repo, 'open', 10)
+
+
+def slow_load(started: threading.Event, release: threading.Event, value):
+    def load():
+        started.set()
+        release.wait(5)
+        return value
+    return load
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    cache = SearchCache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return ['pr']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(key(), load))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [['pr']] * 4
+    assert cache.get(key(), load) == (['pr'], 'fresh')
+
+
+def test_stale_entry_is_served_while_refreshing(monkeypatch):
+    cache = SearchCache(ttl=10, stale_ttl=100)
+    now = [1000.0]
+    monkeypatch.setattr('utils.cache.time.time', lambda: now[0])
+    cache.get(key(), lambda: ['old'])
+    now[0] += 50
+
+    refreshed = threading.Event()
+
+    def load():
+        refreshed.set()
+        return ['new']
+
+    assert cache.get(key(), load) == (['old'], 'stale')
+    assert refreshed.wait(5)
+    cache._executor.shutdown(wait=True)
+    assert cache.get(key(), load) == (['new'], 'fresh')
+
+
+def test_unrelated_invalidation_keeps_an_in_flight_load():
+    cache = SearchCache()
+    started, release = threading.Event(), threading.Event()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(
+        cache.get(key('github'), slow_load(started, release, ['gh']))))
+    thread.start()
+    assert started.wait(5)
+
+    cache.invalidate('gitlab', 'https://gitlab.com/g/p')
+    cache.invalidate('github', 'https://github.com/other/repo')
+    release.set()
+    thread.join()
+
+    assert cache.get(key('github'), lambda: pytest.fail('should be cached')) == (['gh'], 'fresh')
+
+
+def test_matching_invalidation_discards_an_in_flight_load():
+    cache = SearchCache()
+    started, release = threading.Event(), threading.Event()
+    thread = threading.Thread(target=lambda: cache.get(key(), slow_load(started, release, ['before'])))
+    thread.start()
+    assert started.wait(5)
+
+    cache.invalidate('github', 'https://github.com/O/R.git')
+    release.set()
+    thread.join()
+
+    assert cache.get(key(), lambda: ['after']) == (['after'], 'miss')
+
+
+def test_invalidate_scopes_by_server_and_repository():
+    cache = SearchCache()
+    cache.get(key('github', 'https://github.com/o/r'), lambda: 1)
+    cache.get(key('github', 'https://github.com/o/other'), lambda: 2)
+    cache.get(key('github', None, query='fix'), lambda: 3)
+    cache.get(key('gitlab', None, query='fix'), lambda: 4)
+
+    assert cache.invalidate('github', 'https://github.com/o/r') == 2
+    assert len(cache) == 2
+
+
+def test_size_is_bounded():
+    cache = SearchCache(max_entries=3)
+    for index in range(10):
+        cache.get(key(query=str(index)), lambda: index)
+    assert len(cache) == 3
+
+
+def test_stale_hits_share_one_refresh_and_a_failed_refresh_keeps_the_entry(monkeypatch):
+    cache = SearchCache(ttl=10, stale_ttl=100)
+    now = [1000.0]
+    monkeypatch.setattr('utils.cache.time.time', lambda: now[0])
+    cache.get(key(), lambda: ['old'])
+    now[0] += 50
+
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError('host down')
+
+    for _ in range(5):
+        assert cache.get(key(), failing) == (['old'], 'stale')
+    assert started.wait(5)
+    release.set()
+    # time.time is frozen above
+    deadline = time.perf_counter() + 5
+    while key() in cache._loading and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+    assert len(calls) == 1
+    # Still served, and the next hit tries again
+    assert cache.get(key(), lambda: ['new']) == (['old'], 'stale')
+
+
+def test_entries_past_the_stale_window_are_loaded_again(monkeypatch):
+    cache = SearchCache(ttl=10, stale_ttl=100)
+    now = [1000.0]
+    monkeypatch.setattr('utils.cache.time.time', lambda: now[0])
+    cache.get(key(), lambda: ['old'])
+
+    now[0] += 10
+    assert cache.get(key(), lambda: ['unused']) == (['old'], 'fresh')
+    now[0] += 101
+    assert cache.get(key(), lambda: ['new']) == (['new'], 'miss')
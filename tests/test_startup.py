@@ -0,0 +1,55 @@
+import json
+import sys
+
+import pytest
+
+from adapters import registry
+from benchmarks import startup
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:        80 |         80 |     _abc
+import time:       300 |        500 | utils
+import time:        40 |         40 |   utils.logger
+noise from the program itself
+"""
+
+
+def test_importtime_output_is_parsed_into_top_level_totals_and_modules():
+    top_level, modules = startup.parse_importtime(IMPORTTIME)
+
+    # Only unindented rows are top level; their cumulative time includes the children
+    assert top_level == {'utils': 500}
+    assert modules == {'_io', '_abc', 'utils', 'utils.logger'}
+
+
+def test_cli_scenarios_load_no_forbidden_module(tmp_path):
+    out = tmp_path / 'startup.json'
+
+    # Times depend on the machine; only which modules load is checked here
+    startup.main(['--repeat', '1', '--json', str(out)])
+
+    results = json.loads(out.read_text())
+    assert set(results) == set(startup.SCENARIOS)
+    for name, stats in results.items():
+        assert stats['forbidden_loaded'] == [], name
+        assert stats['import_ms'] > 0 and stats['budget_ms'] == startup.SCENARIOS[name]['budget_ms']
+
+
+def test_adapters_are_imported_on_first_lookup(monkeypatch, tmp_path):
+    (tmp_path / 'gitea_plugin.py').write_text(
+        "from adapters.base_adapter import GitServerAdapter\n\n"
+        "class GiteaAdapter(GitServerAdapter):\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(registry._adapters, 'gitea', 'gitea_plugin:GiteaAdapter')
+
+    assert 'gitea' in registry.available_adapters()
+    assert 'gitea_plugin' not in sys.modules
+    adapter = registry.get_adapter_class('Gitea')
+    assert adapter.__name__ == 'GiteaAdapter' and 'gitea_plugin' in sys.modules
+    monkeypatch.delitem(sys.modules, 'gitea_plugin')
+    with pytest.raises(ValueError, match='available: .*github'):
+        registry.get_adapter_class('forgejo')
+
+    from adapters import GitHubAdapter
+    assert registry.get_adapter_class('github') is GitHubAdapter
@@ -0,0 +1,21 @@
+from utils.symbol_index import parse_python
+
+
+def test_definitions_imports_and_calls_are_extracted():
+    symbols, imports, calls = parse_python(
+        "import os\n"
+        "class A:\n"
+        "    def f(self):\n"
+        "        return os.path.join('a')\n"
+    )
+    assert {(name, qualname) for name, qualname, *_ in symbols} == {('A', 'A'), ('f', 'A.f')}
+    assert imports and calls
+
+
+def test_syntax_errors_yield_nothing():
+    assert parse_python("def broken(:\n") == ([], [], [])
+
+
+def test_pathologically_nested_files_are_skipped():
+    assert parse_python("x = " + "+".join(["1"] * 200000)) == ([], [], [])
+    assert parse_python("x = " + "-" * 100000 + "1") == ([], [], [])
@@ -0,0 +1,79 @@
+import pytest
+
+from analyzers.code_analyzer import CodeAnalyzer
+from analyzers.llm_providers import HedgedProvider, LLMProvider, LLMResult
+from utils.tokens import estimate_tokens
+from utils.usage import UsageTracker, call_cost, summarize_calls
+
+
+def file_diff(path, added):
+    lines = ''.join(f'+{line}\n' for line in added)
+    return f'diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -0,0 +1,{len(added)} @@\n{lines}'
+
+
+class Backend(LLMProvider):
+    """Answers with fixed token counts; prompts for broken.py fail"""
+    name = 'stub'
+
+    def generate(self, prompt, generation_config):
+        if '+++ b/broken.py' in prompt:
+            raise RuntimeError('backend down')
+        return LLMResult(text='[]', provider=self.name, model=self.model, prompt_tokens=1200, output_tokens=300,
+                         finish_reason='STOP', http_status=200)
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    for name in ('FINDINGS_CACHE_DISABLED', 'SYMBOL_INDEX_DISABLED'):
+        monkeypatch.setenv(name, 'true')
+    for name in ('LLM_PRICE_INPUT', 'LLM_PRICE_OUTPUT'):
+        monkeypatch.delenv(name, raising=False)
+    analyzer = CodeAnalyzer(gemini_api_key='k')
+    analyzer.gemini_analyzer.provider = HedgedProvider([Backend('gemini-2.0-flash')])
+    return analyzer
+
+
+def test_each_call_reports_tokens_cost_and_latency(analyzer):
+    list(analyzer.iter_diff(file_diff('shop/cart.py', ['total = 0']) + file_diff('broken.py', ['x = 1'])))
+
+    usage = analyzer.report['llm_usage']
+    assert (usage['calls'], usage['errors']) == (2, 1)
+    assert (usage['prompt_tokens'], usage['output_tokens']) == (1200, 300)
+    assert usage['cost_usd'] == pytest.approx((1200 * 0.10 + 300 * 0.40) / 1_000_000)
+    ok = next(call for call in usage['calls_detail'] if call['status'] == 'ok')
+    assert ok['path'] == 'shop/cart.py' and ok['http_status'] == 200 and ok['latency_ms'] >= 0
+    # The failed call's estimate is left out, so the ratio compares actual and estimated tokens of the same calls
+    assert usage['estimate_ratio'] == pytest.approx(1200 / ok['estimated_prompt_tokens'], abs=1e-3)
+
+
+def test_usage_rolls_up_per_repository_and_day():
+    tracker = UsageTracker()
+    ok = {'status': 'ok', 'prompt_tokens': 100, 'output_tokens': 10, 'estimated_prompt_tokens': 80,
+          'cost_usd': 0.5, 'latency_ms': 40.0}
+    failed = {'status': 'error', 'estimated_prompt_tokens': 500, 'latency_ms': 900.0}
+
+    tracker.record_review('https://github.com/o/a', [ok, failed], day='2024-05-01')
+    tracker.record_review('https://github.com/o/b', [ok], day='2024-05-02')
+    snapshot = tracker.snapshot()
+
+    totals = snapshot['totals']
+    assert (totals['reviews'], totals['calls'], totals['errors']) == (2, 3, 1)
+    assert totals['estimate_ratio'] == 1.25
+    assert (totals['latency_ms_max'], totals['latency_ms_avg']) == (900.0, 326.7)
+    assert snapshot['by_repo']['https://github.com/o/a']['calls'] == 2
+    assert list(snapshot['by_day']) == ['2024-05-01', '2024-05-02']
+    assert summarize_calls([])['estimate_ratio'] is None
+
+
+def test_prices_and_token_estimates(monkeypatch):
+    monkeypatch.delenv('LLM_PRICE_INPUT', raising=False)
+    monkeypatch.delenv('LLM_PRICE_OUTPUT', raising=False)
+    assert call_cost('gemini-1.5-pro', 1_000_000, 0) == 1.25
+    assert call_cost('unknown-model', 1000, 1000) == 0.0
+    monkeypatch.setenv('LLM_PRICE_INPUT', '2')
+    assert call_cost('unknown-model', 500_000, 0) == 1.0
+
+    assert estimate_tokens('') == 0
+    # A word, a symbol and a number; a long identifier counts one token per six characters
+    assert estimate_tokens('total = 42') == 3
+    assert estimate_tokens('averylongidentifier') == 4
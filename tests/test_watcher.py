@@ -0,0 +1,247 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils.scheduler import ReviewScheduler
+from watcher import MAX_ATTEMPTS, Watcher, WatchState
+
+REPO = 'https://github.com/octo/shop'
+
+
+class FakeHost:
+    """poll_prs answers from ``prs`` (PR id -> head SHA), listing only PRs updated after ``since``.
+
+    A push is the only kind of update; ``not_modified`` when the open PRs did not change since the last poll.
+    """
+
+    def __init__(self, prs=None):
+        self.prs = dict(prs or {})
+        self.polls = 0
+        self.last_call = None
+        self._served = None
+        self._heads = {}
+        self._updated = {}
+
+    def poll_prs(self, repo_url, since=None, etag=None):
+        self.polls += 1
+        self.last_call = (since, etag)
+        for pr_id, head in self.prs.items():
+            if self._heads.get(pr_id) != head:
+                self._heads[pr_id] = head
+                self._updated[pr_id] = f'2026-10-01T12:00:{self.polls:02d}Z'
+        if self._served == self.prs and etag:
+            return {'not_modified': True, 'prs': [], 'etag': etag}
+        self._served = dict(self.prs)
+        return {'not_modified': False, 'etag': f'"{self.polls}"',
+                'prs': [{'id': pr_id, 'head_sha': head, 'updated_at': self._updated[pr_id]}
+                        for pr_id, head in self.prs.items() if not since or self._updated[pr_id] > since],
+                'rate_limit': None}
+
+
+class Reviews:
+    """Records reviews; PRs listed in ``failing`` raise"""
+
+    def __init__(self):
+        self.done = []
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, repo_url, pr_id):
+        with self.lock:
+            self.done.append(pr_id)
+        if pr_id in self.failing:
+            raise RuntimeError('review failed')
+
+
+@pytest.fixture
+def make_watcher(tmp_path):
+    created = []
+
+    def make(host, reviews, **kwargs):
+        watcher = Watcher(host, reviews, [REPO], WatchState(str(tmp_path / 'watch.json')),
+                          scheduler=ReviewScheduler(workers=2), **kwargs)
+        created.append(watcher)
+        return watcher
+
+    yield make
+    for watcher in created:
+        if watcher._pricing:
+            watcher._pricing.shutdown(wait=False)
+        watcher.scheduler.shutdown(wait=False)
+
+
+def drain(watcher):
+    """Wait for every queued review to finish"""
+    deadline = time.monotonic() + 5
+    while watcher._in_flight or watcher.scheduler.snapshot()['running']:
+        assert time.monotonic() < deadline, 'reviews did not finish'
+        time.sleep(0.01)
+
+
+def test_first_poll_baselines_and_only_later_pushes_are_reviewed(make_watcher, tmp_path):
+    host, reviews = FakeHost({1: 'a1', 2: 'b1'}), Reviews()
+    watcher = make_watcher(host, reviews)
+
+    watcher.poll(REPO)
+    drain(watcher)
+    assert reviews.done == []
+
+    host.prs[2] = 'b2'
+    watcher.poll(REPO)
+    drain(watcher)
+    assert reviews.done == [2]
+
+    # Nothing moved: not re-reviewed, and the saved state has the reviewed head
+    watcher.poll(REPO)
+    drain(watcher)
+    assert reviews.done == [2]
+    saved = json.loads((tmp_path / 'watch.json').read_text())
+    assert saved['repos'][REPO]['prs']['2']['reviewed_head'] == 'b2'
+
+
+def test_review_existing_reviews_open_prs_on_the_first_poll(make_watcher):
+    host, reviews = FakeHost({1: 'a1', 2: 'b1'}), Reviews()
+    watcher = make_watcher(host, reviews, review_existing=True)
+
+    watcher.poll(REPO)
+    drain(watcher)
+
+    assert sorted(reviews.done) == [1, 2]
+
+
+def test_failed_reviews_are_retried_until_the_attempt_limit(make_watcher):
+    host, reviews = FakeHost({1: 'a1'}), Reviews()
+    reviews.failing.add(1)
+    watcher = make_watcher(host, reviews, review_existing=True)
+
+    for _ in range(MAX_ATTEMPTS + 2):
+        watcher.poll(REPO)
+        drain(watcher)
+    assert reviews.done == [1] * MAX_ATTEMPTS
+
+    # A new push resets the attempts
+    reviews.failing.clear()
+    host.prs[1] = 'a2'
+    watcher.poll(REPO)
+    drain(watcher)
+    assert reviews.done == [1] * (MAX_ATTEMPTS + 1)
+    assert watcher.state.repo(REPO)['prs']['1']['reviewed_head'] == 'a2'
+
+
+def test_a_pr_in_flight_is_not_queued_twice(make_watcher):
+    host, reviews = FakeHost({1: 'a1'}), Reviews()
+    release = threading.Event()
+    watcher = make_watcher(host, lambda repo_url, pr_id: (reviews(repo_url, pr_id), release.wait(5)),
+                           review_existing=True)
+
+    watcher.poll(REPO)
+    host.prs[1] = 'a2'
+    watcher.poll(REPO)
+    release.set()
+    drain(watcher)
+
+    assert reviews.done == [1]
+
+
+def test_poll_interval_adapts_to_activity_and_rate_limit(make_watcher):
+    host, reviews = FakeHost({1: 'a1'}), Reviews()
+    watcher = make_watcher(host, reviews, interval=60, min_interval=15, max_interval=900, jitter=0)
+    repo = watcher.state.repo(REPO)
+
+    assert watcher._schedule(repo, 'active') == 30
+    assert watcher._schedule(repo, 'quiet') == 45
+    assert watcher._schedule(repo, 'error') == 90
+
+    # 100 requests left for an hour (10 held in reserve): one repository may poll every 40 s at most
+    watcher.rate_limit = {'limit': 100, 'remaining': 100, 'reset': time.time() + 3600}
+    repo['interval'] = 30
+    assert watcher._schedule(repo, 'active') == pytest.approx(40, rel=0.01)
+
+
+def test_concurrent_saves_do_not_collide(tmp_path):
+    state = WatchState(str(tmp_path / 'watch.json'))
+    state.repo(REPO)['prs']['1'] = {'reviewed_head': 'a1'}
+    errors = []
+
+    def save():
+        try:
+            for _ in range(50):
+                state.save()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert WatchState(str(tmp_path / 'watch.json')).repos[REPO]['prs']['1'] == {'reviewed_head': 'a1'}
+
+
+def test_closed_prs_are_forgotten_at_the_next_full_listing(make_watcher):
+    host, reviews = FakeHost({1: 'a1', 2: 'b1'}), Reviews()
+    watcher = make_watcher(host, reviews, full_sync=3600)
+    watcher.poll(REPO)
+    del host.prs[2]
+
+    # Incremental polls only see updated PRs, so a missing one may just be idle
+    watcher.poll(REPO)
+    assert host.last_call[0] is not None
+    assert sorted(watcher.state.repo(REPO)['prs']) == ['1', '2']
+
+    watcher.full_sync = 0
+    watcher.poll(REPO)
+    assert host.last_call == (None, None)
+    assert sorted(watcher.state.repo(REPO)['prs']) == ['1']
+
+
+def test_prs_not_seen_for_too_long_are_forgotten(make_watcher):
+    host, reviews = FakeHost({1: 'a1', 2: 'b1'}), Reviews()
+    watcher = make_watcher(host, reviews, full_sync=3600, max_pr_age=600)
+    watcher.poll(REPO)
+    watcher.state.repo(REPO)['prs']['2']['seen_at'] -= 601
+    host.prs[3] = 'c1'
+
+    watcher.poll(REPO)
+
+    assert sorted(watcher.state.repo(REPO)['prs']) == ['1', '3']
+
+
+def test_a_pr_under_review_is_kept_until_its_review_ends(make_watcher):
+    host, reviews = FakeHost({1: 'a1'}), Reviews()
+    release = threading.Event()
+    watcher = make_watcher(host, lambda repo_url, pr_id: release.wait(5), review_existing=True, full_sync=0)
+    watcher.poll(REPO)
+    del host.prs[1]
+
+    watcher.poll(REPO)
+    assert list(watcher.state.repo(REPO)['prs']) == ['1']
+    release.set()
+    drain(watcher)
+    watcher.poll(REPO)
+    assert watcher.state.repo(REPO)['prs'] == {}
+
+
+def test_pricing_runs_off_the_poll_thread(make_watcher):
+    host, reviews = FakeHost({1: 'a1', 2: 'b1'}), Reviews()
+    release = threading.Event()
+    priced = []
+
+    def cost(repo_url, pr_id):
+        priced.append((pr_id, threading.current_thread().name))
+        release.wait(5)
+        return 10
+
+    watcher = make_watcher(host, reviews, review_existing=True, cost=cost)
+    started = time.monotonic()
+    watcher.poll(REPO)
+    assert time.monotonic() - started < 1
+    release.set()
+    drain(watcher)
+
+    assert sorted(reviews.done) == [1, 2]
+    assert all(name.startswith('watch-price') for _, name in priced)
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from utils.logger import get_logger
+from utils.metrics import CACHE_LOOKUPS
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def __contains__(self, key: str) -> bool:
+        """Whether ``key`` holds an unexpired value, without counting as a use"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[0] is None or entry[0] >= time.time())
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class FindingsCache:
+    """Two-level cache for LLM findings: an LRU in front of a SQLite store"""
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_bytes: int = 256 * 1024 * 1024,
+                 memory_entries: int = 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(memory_entries)
+        self.logger = get_logger()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_findings_accessed ON findings (accessed_at)")
+        self._conn.commit()
+        self._evict()
+
+    @classmethod
+    def from_env(cls) -> Optional['FindingsCache']:
+        """Build the cache from environment settings, or None if disabled"""
+        if os.environ.get('FINDINGS_CACHE_DISABLED', 'false').lower() == 'true':
+            return None
+        path = os.path.expanduser(os.environ.get('FINDINGS_CACHE_PATH', '')) or os.path.join(
+            os.path.expanduser('~'), '.cache', 'pr_review_agent', 'findings.db')
+        try:
+            return cls(
+                path,
+                ttl=float(os.environ.get('FINDINGS_CACHE_TTL', 7 * 24 * 3600)),
+                max_bytes=int(float(os.environ.get('FINDINGS_CACHE_MAX_MB', 256)) * 1024 * 1024)
+            )
+        except (sqlite3.Error, OSError) as e:
+            get_logger().warning(f"Findings cache unavailable, continuing without it: {e}")
+            return None
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM findings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE findings SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        value = json.loads(row[0])
+        self.memory.set(key, value, row[1] + self.ttl)
+        self.hits += 1
+        return value
+
+    def contains(self, key: str) -> bool:
+        """Whether ``key`` has unexpired findings, without counting a hit or miss or refreshing its access time"""
+        if key in self.memory:
+            return True
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM findings WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] + self.ttl >= time.time()
+
+    def set(self, key: str, value: List[Dict[str, Any]]):
+        now = time.time()
+        encoded = json.dumps(value)
+        self.memory.set(key, value, now + self.ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO findings (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def _evict(self):
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """Drop expired entries, then least recently used ones until under the size cap"""
+        self._conn.execute("DELETE FROM findings WHERE created_at < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM findings").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            stale_keys = []
+            for key, size in self._conn.execute("SELECT key, size FROM findings ORDER BY accessed_at"):
+                stale_keys.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self._conn.executemany("DELETE FROM findings WHERE key = ?", stale_keys)
+            self.logger.debug(f"Evicted {len(stale_keys)} cached findings ({freed} bytes)")
+        self._conn.commit()
+
+
+def normalize_repo_url(repo_url: Optional[str]) -> Optional[str]:
+    """Repository URL as a cache key: webhooks and users spell the same repository differently"""
+    if not repo_url:
+        return None
+    repo_url = repo_url.strip().rstrip('/').lower()
+    return repo_url[:-4] if repo_url.endswith('.git') else repo_url
+
+
+class SearchCache:
+    """Stale-while-revalidate cache for PR search and listing results.
+
+    Entries younger than ``ttl`` are served as is. Older ones, up to
+    ``ttl + stale_ttl``, are still served while a background refresh replaces
+    them, so callers never wait on the git host for a key they have seen
+    recently. Concurrent misses and refreshes of one key share a single
+    upstream call. Keys are (server, query, user, repo, state, limit).
+    """
+
+    def __init__(self, ttl: float = 30, stale_ttl: float = 300, max_entries: int = 512, refresh_workers: int = 2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.logger = get_logger()
+        # key -> (loaded_at, value), least recently used first
+        self._data: "OrderedDict[Tuple, tuple]" = OrderedDict()
+        self._loading: Dict[Tuple, Future] = {}
+        # Keys whose running load started before an invalidate() covering them; its result is not stored
+        self._outdated: Set[Tuple] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='search-refresh')
+
+    @classmethod
+    def from_env(cls) -> Optional['SearchCache']:
+        """Build the cache from environment settings, or None if disabled"""
+        if os.environ.get('SEARCH_CACHE_DISABLED', 'false').lower() == 'true':
+            return None
+        return cls(
+            ttl=float(os.environ.get('SEARCH_CACHE_TTL', 30)),
+            stale_ttl=float(os.environ.get('SEARCH_CACHE_STALE_TTL', 300)),
+            max_entries=int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 512))
+        )
+
+    @staticmethod
+    def key(server: str, query: Optional[str], user: Optional[str], repo_url: Optional[str], state: str,
+            limit: int) -> Tuple:
+        return (server, query or None, user or None, normalize_repo_url(repo_url), state, limit)
+
+    def get(self, key: Tuple, load: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, str]:
+        """The value for ``key`` and whether it was 'fresh', 'stale' or a 'miss' loaded now.
+
+        A miss that joins another caller's load waits at most ``timeout`` seconds
+        (concurrent.futures.TimeoutError); the load itself carries on and is stored.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now - entry[0] > self.ttl + self.stale_ttl:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                status = 'fresh' if now - entry[0] <= self.ttl else 'stale'
+                if status == 'stale' and key not in self._loading:
+                    self._loading[key] = future = Future()
+                    self._executor.submit(self._load, key, load, future)
+            else:
+                status = 'miss'
+                future = self._loading.get(key)
+                owner = future is None
+                if owner:
+                    self._loading[key] = future = Future()
+        CACHE_LOOKUPS.inc(cache='search', result=status)
+        if entry is not None:
+            return entry[1], status
+
+        if owner:
+            self._load(key, load, future)
+        return future.result(timeout), status
+
+    def _load(self, key: Tuple, load: Callable[[], Any], future: Future):
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+                self._outdated.discard(key)
+            if self._data.get(key) is not None:
+                # A failed refresh keeps serving the stale entry until it expires
+                self.logger.warning(f"Refreshing cached search {key} failed: {e}")
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._loading.pop(key, None)
+            if key in self._outdated:
+                self._outdated.discard(key)
+            else:
+                self._data[key] = (time.time(), value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+        future.set_result(value)
+
+    def invalidate(self, server: Optional[str] = None, repo_url: Optional[str] = None) -> int:
+        """Drop entries a change to ``repo_url`` on ``server`` can affect; with no arguments, everything.
+
+        Searches by query or user are not scoped to a repository, so they go too.
+        """
+        repo_url = normalize_repo_url(repo_url)
+
+        def affected(key: Tuple) -> bool:
+            return (server is None or key[0] == server) and (repo_url is None or key[3] in (None, repo_url))
+
+        with self._lock:
+            # Only loads of affected keys may hold pre-change results; the rest still get stored
+            self._outdated.update(key for key in self._loading if affected(key))
+            stale = [key for key in self._data if affected(key)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,188 @@
+import io
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Bump when the file layout changes; older cassettes must be re-recorded
+CASSETTE_VERSION = 1
+
+# Never written to disk: credentials in query strings and cookie headers in responses
+SECRET_PARAMS = {'key', 'access_token', 'token', 'private_token', 'sig', 'signature'}
+DROPPED_RESPONSE_HEADERS = {'set-cookie', 'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+class CassetteMiss(requests.ConnectionError):
+    """A replayed request has no recorded counterpart"""
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, 'REDACTED' if k.lower() in SECRET_PARAMS else v) for k, v in parse_qsl(parts.query, True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """Match key of a request: method, URL without secrets, Accept and a digest of the body.
+
+    Other headers are left out on purpose; they carry the credentials. Accept
+    stays because the same URL serves e.g. a PR as JSON or as a diff.
+    """
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha256(body or b'').hexdigest()[:16]
+    return f"{request.method.upper()} {redact_url(request.url)} {request.headers.get('Accept', '')} {digest}"
+
+
+class Cassette:
+    """Recorded HTTP exchanges, stored as versioned JSON"""
+
+    def __init__(self, interactions: Optional[List[Dict[str, Any]]] = None, meta: Optional[Dict[str, Any]] = None):
+        self.interactions = interactions or []
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"{path}: cassette version {data.get('version')}, expected {CASSETTE_VERSION}; "
+                             f"re-record it")
+        return cls(data['interactions'], data.get('meta'))
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'version': CASSETTE_VERSION, 'meta': self.meta, 'interactions': self.interactions}, f, indent=1)
+            f.write('\n')
+
+
+class RecordingTransport(HTTPAdapter):
+    """Talks to the network and records every exchange into a cassette"""
+
+    def __init__(self, cassette: Optional[Cassette] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette or Cassette()
+        self._lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        started = time.perf_counter()
+        response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        # Read the whole body; requests serves later iter_content/iter_lines calls from memory
+        body = response.content
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        recorded = {
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_RESPONSE_HEADERS},
+            'elapsed_ms': elapsed_ms,
+        }
+        try:
+            recorded['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            recorded['body_b64'] = base64.b64encode(body).decode('ascii')
+
+        interaction = {
+            'request': {'method': request.method, 'url': redact_url(request.url),
+                        'key': request_key(request)},
+            'response': recorded,
+        }
+        with self._lock:
+            self.cassette.interactions.append(interaction)
+        return response
+
+
+class ReplayTransport(BaseAdapter):
+    """Serves recorded responses without touching the network.
+
+    Identical requests get their recordings in order, wrapping around, so a
+    cassette can be replayed any number of times. ``latency_ms`` plus up to
+    ``jitter_ms`` is added to each call, or the recorded time multiplied by
+    ``latency_scale`` when that is set. With probability ``error_rate`` a call
+    fails instead: with ``error_status``, or a connection error if it is 0.
+    """
+
+    def __init__(self, cassettes: List[Cassette], latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 latency_scale: Optional[float] = None, error_rate: float = 0.0, error_status: int = 503,
+                 seed: Optional[int] = None):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._served: Counter = Counter()
+        for cassette in cassettes:
+            for interaction in cassette.interactions:
+                self._index[interaction['request']['key']].append(interaction['response'])
+
+        self.calls: Counter = Counter()  # by host
+        self.injected_errors = 0
+        self.misses = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = request_key(request)
+        host = urlsplit(request.url).hostname or ''
+        with self._lock:
+            self.calls[host] += 1
+            recordings = self._index.get(key)
+            if not recordings:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for {request.method} {redact_url(request.url)}",
+                                   request=request)
+            recorded = recordings[self._served[key] % len(recordings)]
+            self._served[key] += 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+            if self.latency_scale is not None:
+                delay_ms = recorded.get('elapsed_ms', 0.0) * self.latency_scale
+            else:
+                delay_ms = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if fail and not self.error_status:
+            raise requests.ConnectionError(f"Injected connection error for {request.method} {host}",
+                                           request=request)
+        if fail:
+            recorded = {'status': self.error_status, 'reason': 'Injected', 'headers': {}, 'body': ''}
+        return self._build_response(request, recorded, delay_ms)
+
+    def close(self):
+        pass
+
+    def _build_response(self, request, recorded: Dict[str, Any], delay_ms: float) -> requests.Response:
+        if 'body_b64' in recorded:
+            body = base64.b64decode(recorded['body_b64'])
+        else:
+            body = recorded.get('body', '').encode('utf-8')
+
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response.reason = recorded.get('reason')
+        response.headers = CaseInsensitiveDict(recorded.get('headers', {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(milliseconds=delay_ms)
+        response.raw = io.BytesIO(body)
+        # Served from memory, like a response whose body was already read
+        response._content = body
+        response._content_consumed = True
+        return response
@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from utils.logger import get_logger
+
+
+class LimiterSlot:
+    """Outcome of one request made under an AdaptiveLimiter"""
+
+    def __init__(self):
+        self.outcome = 'ok'
+        self.retry_after: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.size: Optional[float] = None
+
+    def throttled(self, retry_after: Optional[float] = None):
+        self.outcome = 'throttled'
+        self.retry_after = retry_after
+
+    def timed_out(self):
+        self.outcome = 'timeout'
+
+    def failed(self):
+        self.outcome = 'error'
+
+    def mark_latency(self, seconds: float, size: Optional[float] = None):
+        """Record latency now (e.g. time to first byte of a stream) instead of at release.
+
+        ``size`` is the work those seconds covered, e.g. the request's length.
+        """
+        self.latency = seconds
+        self.size = size
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a latency gradient.
+
+    The limit grows by one per round trip while recent latency stays near
+    the long-run baseline, shrinks gently when it inflates and is halved on
+    throttling or timeouts. Retry-After pauses new requests.
+
+    Long prompts and answers are slow without any queueing, so latency is
+    taken per unit of the request's ``size`` when one is given, and recent
+    and baseline latency are moving averages over the same mix of requests
+    (``short_window`` and ``window`` samples).
+    """
+
+    def __init__(self, name: str, initial: float = 4, min_limit: float = 1, max_limit: float = 64,
+                 tolerance: float = 2.0, backoff: float = 0.5, window: int = 100, short_window: int = 10):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {'requests': 0, 'throttled': 0, 'timeouts': 0, 'errors': 0}
+        # Exponential moving averages of successful latencies, per unit of size
+        self._long_alpha = 2.0 / (window + 1)
+        self._short_alpha = 2.0 / (short_window + 1)
+        self._long: Optional[float] = None
+        self._short: Optional[float] = None
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        self.logger = get_logger()
+
+    @property
+    def baseline(self) -> Optional[float]:
+        """Long-run average latency, per unit of size where requests have one"""
+        return self._long
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait_for = None
+                    if now < self._blocked_until:
+                        wait_for = self._blocked_until - now
+                    elif self.in_flight < int(self.limit):
+                        self.in_flight += 1
+                        return True
+                    if deadline is not None:
+                        if now >= deadline:
+                            return False
+                        wait_for = min(wait_for or deadline - now, deadline - now)
+                    self._cond.wait(wait_for)
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency: float, outcome: str = 'ok', retry_after: Optional[float] = None,
+                size: Optional[float] = None):
+        if size:
+            latency /= size
+        with self._cond:
+            self.in_flight -= 1
+            self.stats['requests'] += 1
+
+            if outcome in ('throttled', 'timeout'):
+                self.stats['throttled' if outcome == 'throttled' else 'timeouts'] += 1
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                self.logger.debug(f"Limiter {self.name}: {outcome}, limit now {self.limit:.1f}")
+            elif outcome == 'error':
+                self.stats['errors'] += 1
+            else:
+                if self._long is None:
+                    self._long = self._short = latency
+                else:
+                    self._short += self._short_alpha * (latency - self._short)
+                    # While overloaded the baseline barely moves, so it does not learn the queueing delay
+                    overloaded = self._short > self._long * self.tolerance
+                    self._long += self._long_alpha * (0.1 if overloaded else 1) * (latency - self._long)
+                if self._short > self._long * self.tolerance:
+                    # Queueing upstream: shrink in proportion to the latency gradient
+                    gradient = self._long * self.tolerance / self._short
+                    self.limit = max(self.min_limit, self.limit * (0.9 + 0.1 * gradient))
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[LimiterSlot]:
+        """Hold a concurrency slot for the duration of a request"""
+        self.acquire()
+        slot = LimiterSlot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            if slot.outcome == 'ok':
+                slot.failed()
+            raise
+        finally:
+            latency = slot.latency if slot.latency is not None else time.monotonic() - started
+            self.release(latency, slot.outcome, slot.retry_after, slot.size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'baseline_ms': round(self.baseline * 1000, 1) if self.baseline is not None else None,
+                'blocked_for_s': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+                **self.stats
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """Process-wide limiter per upstream, so concurrent reviews share one quota"""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveLimiter(
+                name,
+                initial=float(os.environ.get('LLM_INITIAL_CONCURRENCY', 4)),
+                min_limit=float(os.environ.get('LLM_MIN_CONCURRENCY', 1)),
+                max_limit=float(os.environ.get('LLM_MAX_CONCURRENCY', 32)),
+                tolerance=float(os.environ.get('LLM_LATENCY_TOLERANCE', 2.0))
+            )
+        return _limiters[name]
+
+
+def limiter_snapshots() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.snapshot() for name, limiter in limiters.items()}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -10,5 +10,8 @@ def load_config():
         'GITLAB_TOKEN': os.environ.get('GITLAB_TOKEN'),
         'GITLAB_URL': os.environ.get('GITLAB_URL', 'https://gitlab.com'),
         'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY'),
+        'WATCH_STATE_PATH': os.environ.get('WATCH_STATE_PATH', '~/.cache/pr_review_agent/watch.json'),
+        'REVIEW_SCHEDULER_POLICY': os.environ.get('REVIEW_SCHEDULER_POLICY', 'sjf'),
+        'REVIEW_LARGE_COST': float(os.environ.get('REVIEW_LARGE_COST', 2000)),
         'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO')
     }
\ No newline at end of file
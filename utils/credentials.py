@@ -0,0 +1,215 @@
+import re
+import time
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Union
+from utils.logger import get_logger
+from utils.metrics import registry
+
+if TYPE_CHECKING:
+    import requests
+
+CREDENTIAL_REQUESTS = registry.counter('pr_review_credential_requests_total',
+                                       'Git host requests per pooled credential by outcome', ('credential', 'outcome'))
+
+# Seconds a credential sits out when the server gives no hint: throttled without a reset time, or rejected
+THROTTLE_BENCH = 60
+REVOKED_BENCH = 900
+
+
+def rate_limit_from_headers(headers) -> Optional[Dict[str, float]]:
+    """Remaining, limit and reset (epoch seconds) from GitHub- or GitLab-style rate-limit headers"""
+    for prefix in ('X-RateLimit-', 'RateLimit-'):
+        remaining = headers.get(f'{prefix}Remaining')
+        if remaining is not None:
+            try:
+                return {
+                    'remaining': float(remaining),
+                    'limit': float(headers.get(f'{prefix}Limit') or 0),
+                    'reset': float(headers.get(f'{prefix}Reset') or 0)
+                }
+            except ValueError:
+                return None
+    return None
+
+
+def parse_tokens(value: Union[None, str, Sequence[str]]) -> List[str]:
+    """Tokens from a list or a comma/whitespace separated string such as ``GITHUB_TOKEN=tok1,tok2``"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r'[,\s]+', value)
+    return list(dict.fromkeys(token.strip() for token in value if token and token.strip()))
+
+
+class Credential:
+    """One token and what the server last told us about its quota"""
+
+    __slots__ = ('token', 'name', 'remaining', 'limit', 'reset', 'benched_until', 'bench_reason', 'uses')
+
+    def __init__(self, token: str, name: str):
+        self.token = token
+        self.name = name
+        # Unknown until the first response; untried tokens are preferred so every quota gets measured
+        self.remaining: Optional[float] = None
+        self.limit: Optional[float] = None
+        self.reset: Optional[float] = None
+        self.benched_until = 0.0
+        self.bench_reason: Optional[str] = None
+        self.uses = 0
+
+    def available(self, now: float) -> float:
+        """Requests this credential can still make now, by the last known quota"""
+        if self.reset and now >= self.reset:
+            # The window rolled over since the last response
+            self.remaining, self.reset = self.limit, None
+        return float('inf') if self.remaining is None else self.remaining
+
+
+class CredentialPool:
+    """Several tokens for one git host, used as a requests ``auth`` callable.
+
+    Every request goes out with the credential that has the most remaining
+    quota, so throughput grows with the number of tokens. Each response
+    updates that credential's quota from the rate-limit headers. A throttled
+    credential is benched until its quota resets and a rejected (revoked or
+    expired) one for a while; AuthSession then retries the request once with
+    another credential (see should_retry).
+
+    Pools are shared process-wide through get_credential_pool, so what one
+    review learns about a token holds for every other review.
+    """
+
+    def __init__(self, tokens: Sequence[str], header: str = 'Authorization', template: str = '{token}',
+                 label: str = 'token'):
+        self.header = header
+        self.template = template
+        self.credentials = [Credential(token, f"{label}-{index + 1}") for index, token in enumerate(tokens)]
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.credentials)
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def select(self) -> Optional[Credential]:
+        """The usable credential with the most remaining quota, or the one back soonest if all are benched"""
+        now = time.time()
+        with self._lock:
+            if not self.credentials:
+                return None
+            usable = [credential for credential in self.credentials if credential.benched_until <= now]
+            if not usable:
+                return min(self.credentials, key=lambda credential: credential.benched_until)
+            # Least used first among equals, so untried tokens are probed in turn
+            chosen = max(usable, key=lambda credential: (credential.available(now), -credential.uses))
+            chosen.uses += 1
+            if chosen.remaining is not None:
+                # Count it now so concurrent requests spread instead of all picking the same token
+                chosen.remaining -= 1
+            return chosen
+
+    def __call__(self, request: 'requests.PreparedRequest') -> 'requests.PreparedRequest':
+        credential = self.select()
+        if credential is None:
+            return request
+        request.headers[self.header] = self.template.format(token=credential.token)
+        request.register_hook('response', self._response_hook(credential))
+        return request
+
+    def _response_hook(self, credential: Credential):
+        def hook(response: 'requests.Response', **kwargs):
+            outcome = self.observe(credential, response)
+            CREDENTIAL_REQUESTS.inc(credential=credential.name, outcome=outcome)
+            response.credential_outcome = outcome
+            return response
+        return hook
+
+    def should_retry(self, response: 'requests.Response') -> bool:
+        """Whether ``response`` was refused for its credential and another credential is usable now"""
+        if getattr(response, 'credential_outcome', 'ok') == 'ok':
+            return False
+        now = time.time()
+        with self._lock:
+            # The refusing credential was just benched, so any usable one is a different token
+            return any(credential.benched_until <= now for credential in self.credentials)
+
+    def observe(self, credential: Credential, response: 'requests.Response') -> str:
+        """Update the credential from ``response`` and return 'ok', 'throttled' or 'rejected'"""
+        now = time.time()
+        rate_limit = rate_limit_from_headers(response.headers)
+        retry_after = response.headers.get('Retry-After')
+        with self._lock:
+            if rate_limit:
+                credential.remaining = rate_limit['remaining']
+                credential.limit = rate_limit['limit'] or credential.limit
+                credential.reset = rate_limit['reset'] or credential.reset
+
+            status = response.status_code
+            throttled = status == 429 or (status == 403 and (retry_after is not None or
+                                                              (rate_limit is not None and rate_limit['remaining'] <= 0)))
+            if throttled:
+                if retry_after and retry_after.isdigit():
+                    until = now + int(retry_after)
+                elif rate_limit and rate_limit['reset'] > now:
+                    until = rate_limit['reset']
+                else:
+                    until = now + THROTTLE_BENCH
+                self._bench(credential, until, 'throttled')
+                return 'throttled'
+            if status == 401:
+                self._bench(credential, now + REVOKED_BENCH, 'rejected')
+                return 'rejected'
+        return 'ok'
+
+    def _bench(self, credential: Credential, until: float, reason: str):
+        credential.benched_until = max(credential.benched_until, until)
+        credential.bench_reason = reason
+        self.logger.warning(f"Benching {credential.name} ({reason}) for {until - time.time():.0f}s")
+
+    def best_token(self) -> Optional[str]:
+        """Token for a single long operation outside the pool, such as a git fetch"""
+        credential = self.select()
+        return credential.token if credential else None
+
+    def rate_limit(self) -> Optional[Dict[str, float]]:
+        """Combined quota of the credentials that are not benched, in the rate_limit_from_headers shape"""
+        now = time.time()
+        with self._lock:
+            known = [credential for credential in self.credentials
+                     if credential.benched_until <= now and credential.remaining is not None and credential.limit]
+            if not known:
+                return None
+            return {
+                'remaining': sum(max(0.0, credential.available(now)) for credential in known),
+                'limit': sum(credential.limit for credential in known),
+                # The latest reset, so a caller pacing itself against it never runs dry early
+                'reset': max(credential.reset or 0 for credential in known)
+            }
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [{
+                'name': credential.name,
+                'remaining': credential.remaining,
+                'limit': credential.limit,
+                'reset': credential.reset,
+                'benched_for': round(credential.benched_until - now, 1) if credential.benched_until > now else 0,
+                'bench_reason': credential.bench_reason if credential.benched_until > now else None
+            } for credential in self.credentials]
+
+
+_pools: Dict[tuple, CredentialPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_credential_pool(host: Optional[str], tokens: Sequence[str], header: str = 'Authorization',
+                        template: str = '{token}', label: str = 'token') -> CredentialPool:
+    """Process-wide pool per host and token set, so every adapter of that host shares quota and bench state"""
+    key = (host or '', header, template, frozenset(tokens))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = CredentialPool(tokens, header, template, label)
+        return _pools[key]
@@ -0,0 +1,189 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+GIT_HEADER = re.compile(r'^diff --git a/(.*?) b/(.*)$')
+
+
+@dataclass
+class Hunk:
+    """A single hunk of a unified diff"""
+    path: str
+    header: str
+    start: int  # index of the @@ line within the diff
+    new_start: int  # first line number of the hunk in the new file
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        """Index of the last line of the hunk within the diff"""
+        return self.start + len(self.lines)
+
+    @property
+    def text(self) -> str:
+        return '\n'.join([self.header] + self.lines)
+
+    def normalized(self) -> str:
+        """Hunk body without position info or trailing whitespace"""
+        return '\n'.join(line.rstrip() for line in self.lines)
+
+
+@dataclass
+class FileDiff:
+    """All diff lines belonging to one file, headers included"""
+    path: str
+    start: int  # index of the first line of the section within the diff
+    lines: List[str] = field(default_factory=list)
+    is_binary: bool = False
+
+    @property
+    def header(self) -> List[str]:
+        """Lines before the first hunk"""
+        for i, line in enumerate(self.lines):
+            if line.startswith('@@'):
+                return self.lines[:i]
+        return list(self.lines)
+
+    @property
+    def added_lines(self) -> List[str]:
+        return [line[1:] for kind, line in _classify(self.lines) if kind == 'added']
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+
+def walk_diff(lines: List[str]) -> Iterator[Tuple[int, str, str]]:
+    """Yield (index, kind, line) for every diff line.
+
+    Kinds are 'git' (diff --git), 'old'/'new' (file headers), 'hunk' (@@),
+    'added', 'removed', 'context' and 'meta'. Hunk bodies are tracked by the
+    line counts in their header, so content such as a removed '-- comment'
+    is never mistaken for a file header.
+    """
+    for i, (kind, line) in enumerate(_classify(lines)):
+        yield i, kind, line
+
+
+def _classify(lines: List[str]) -> Iterator[Tuple[str, str]]:
+    old_left = new_left = 0
+    for line in lines:
+        if old_left > 0 or new_left > 0:
+            if line.startswith('+'):
+                new_left -= 1
+                yield 'added', line
+                continue
+            if line.startswith('-'):
+                old_left -= 1
+                yield 'removed', line
+                continue
+            if line.startswith(' ') or line == '':
+                old_left -= 1
+                new_left -= 1
+                yield 'context', line
+                continue
+            if line.startswith('\\'):
+                yield 'meta', line
+                continue
+            old_left = new_left = 0
+
+        if line.startswith('@@'):
+            match = HUNK_HEADER.match(line)
+            if match:
+                old_left = int(match.group(2) if match.group(2) is not None else 1)
+                new_left = int(match.group(4) if match.group(4) is not None else 1)
+            yield 'hunk', line
+        elif line.startswith('diff --git '):
+            yield 'git', line
+        elif line.startswith('--- '):
+            yield 'old', line
+        elif line.startswith('+++ '):
+            yield 'new', line
+        elif line.startswith('\\'):
+            yield 'meta', line
+        elif line.startswith('+'):
+            # Hunk without line counts (hand-built diffs)
+            yield 'added', line
+        elif line.startswith('-'):
+            yield 'removed', line
+        else:
+            yield 'meta', line
+
+
+def split_files(diff: str) -> List[FileDiff]:
+    """Split a unified diff into per-file sections"""
+    lines = diff.split('\n')
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    old_path: Optional[str] = None
+
+    for i, kind, line in walk_diff(lines):
+        if kind == 'git' or (kind == 'old' and (current is None or _has_hunks(current))):
+            match = GIT_HEADER.match(line) if kind == 'git' else None
+            old_path = _strip_prefix(line[4:]) if kind == 'old' else None
+            current = FileDiff(path=match.group(2) if match else (old_path or ''), start=i)
+            files.append(current)
+        elif current is None:
+            # Preamble before the first file (e.g. mail headers)
+            continue
+        elif kind == 'old':
+            old_path = _strip_prefix(line[4:])
+            current.path = current.path or old_path
+        elif kind == 'new':
+            new_path = _strip_prefix(line[4:])
+            current.path = old_path if new_path == '/dev/null' else new_path
+        elif kind == 'meta' and (line.startswith('Binary files ') or line == 'GIT binary patch'):
+            current.is_binary = True
+        current.lines.append(line)
+
+    return files
+
+
+def parse_hunks(diff: str, first_line: int = 0) -> List[Hunk]:
+    """Split a unified diff into hunks tagged with their file path; positions start at ``first_line``"""
+    hunks = []
+    for file_diff in split_files(diff):
+        current: Optional[Hunk] = None
+        for offset, kind, line in walk_diff(file_diff.lines):
+            if kind == 'hunk':
+                match = HUNK_HEADER.match(line)
+                new_start = int(match.group(3)) if match else 1
+                current = Hunk(path=file_diff.path, header=line, start=first_line + file_diff.start + offset,
+                               new_start=new_start)
+                hunks.append(current)
+            elif current is not None and kind in ('added', 'removed', 'context', 'meta'):
+                current.lines.append(line)
+
+    for hunk in hunks:
+        # Drop the trailing blank line produced by a final newline
+        while hunk.lines and hunk.lines[-1] == '':
+            hunk.lines.pop()
+
+    return hunks
+
+
+def new_file_positions(diff: str) -> Dict[int, Tuple[str, int]]:
+    """Map 1-based diff positions of added and context lines to (path, new-file line)"""
+    positions = {}
+    for file_diff in split_files(diff):
+        new_line = 1
+        for offset, kind, line in walk_diff(file_diff.lines):
+            if kind == 'hunk':
+                match = HUNK_HEADER.match(line)
+                new_line = int(match.group(3)) if match else 1
+            elif kind in ('added', 'context'):
+                positions[file_diff.start + offset + 1] = (file_diff.path, new_line)
+                new_line += 1
+    return positions
+
+
+def _has_hunks(file_diff: FileDiff) -> bool:
+    return any(line.startswith('@@') for line in file_diff.lines)
+
+
+def _strip_prefix(path: str) -> str:
+    path = path.split('\t')[0].strip()
+    if path.startswith(('a/', 'b/')):
+        return path[2:]
+    return path
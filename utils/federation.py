@@ -0,0 +1,87 @@
+import re
+import time
+import heapq
+import threading
+import contextvars
+from datetime import datetime, timezone
+from concurrent.futures import Future, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+# Names whose call outlived its caller's deadline and still runs. A hung host then holds one thread,
+# not one per search: later searches report it at once instead of starting another call that would hang
+_lingering: Set[str] = set()
+_lingering_lock = threading.Lock()
+
+_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:?\d{2})?$')
+
+
+def timestamp(value: Optional[str]) -> float:
+    """Epoch seconds of an ISO 8601 time as git hosts write it (Z or offset, up to 7 fraction digits); 0 if unknown"""
+    match = _TIMESTAMP.match(value or '')
+    if not match:
+        return 0.0
+    seconds, fraction, zone = match.groups()
+    parsed = datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S')
+    if zone and zone != 'Z':
+        zone = zone.replace(':', '')
+        offset = (int(zone[1:3]) * 60 + int(zone[3:5])) * (1 if zone[0] == '+' else -1)
+    else:
+        offset = 0
+    return parsed.replace(tzinfo=timezone.utc).timestamp() - offset * 60 + float(fraction or 0)
+
+
+def run_federated(calls: Dict[str, Callable[[], Any]], timeout: float) -> Dict[str, Dict[str, Any]]:
+    """Run every call concurrently, each on its own thread, and wait up to ``timeout`` seconds in total.
+
+    Returns per name ``value`` (None on failure), ``error`` and ``ms``. A call
+    still running at the deadline is reported as timed out and left to finish
+    in the background (e.g. to fill a cache); until it does, that name is
+    reported as busy instead of being called again.
+    """
+    started = time.perf_counter()
+
+    def timed(call: Callable[[], Any], future: Future):
+        try:
+            outcome = {'value': call(), 'error': None}
+        except Exception as e:
+            outcome = {'value': None, 'error': str(e) or type(e).__name__}
+        outcome['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        future.set_result(outcome)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    futures: Dict[str, Future] = {}
+    for name, call in calls.items():
+        with _lingering_lock:
+            busy = name in _lingering
+        if busy:
+            results[name] = {'value': None, 'error': 'previous call has not returned yet', 'ms': 0.0}
+            continue
+        futures[name] = Future()
+        # Each call runs in a copy of this context, so its spans nest under the caller's
+        threading.Thread(target=contextvars.copy_context().run, args=(timed, call, futures[name]),
+                         name=f'federated-{name}', daemon=True).start()
+    wait(list(futures.values()), timeout=timeout)
+
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+            continue
+        results[name] = {'value': None, 'error': f"timed out after {timeout:g}s",
+                         'ms': round((time.perf_counter() - started) * 1000, 1)}
+        with _lingering_lock:
+            _lingering.add(name)
+        # Runs at once if the call finished in the meantime
+        future.add_done_callback(lambda _, name=name: _release(name))
+    return {name: results[name] for name in calls}
+
+
+def _release(name: str):
+    with _lingering_lock:
+        _lingering.discard(name)
+
+
+def merge_by_updated(result_lists: Iterable[List[Dict[str, Any]]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """K-way merge of PR lists into one list, most recently updated first"""
+    runs = [sorted(results, key=lambda pr: timestamp(pr.get('updated_at')), reverse=True) for results in result_lists]
+    merged = heapq.merge(*runs, key=lambda pr: timestamp(pr.get('updated_at')), reverse=True)
+    return [pr for pr, _ in zip(merged, range(limit))] if limit is not None else list(merged)
@@ -0,0 +1,33 @@
+import os
+import subprocess
+from typing import BinaryIO, Dict, List, Optional, Union
+
+
+class GitError(RuntimeError):
+    """A git command failed or git is unavailable"""
+
+
+def run_git(args: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+            timeout: float = 300, text: bool = True, input: Optional[bytes] = None,
+            output: Optional[BinaryIO] = None) -> Union[str, bytes]:
+    """Run git and return its stdout, raising GitError on failure.
+    
+    With ``output``, stdout goes straight to that file and nothing is returned.
+    """
+    full_env = {**os.environ, 'GIT_TERMINAL_PROMPT': '0', **(env or {})}
+    try:
+        result = subprocess.run(['git', *args], cwd=cwd, env=full_env, timeout=timeout, input=input,
+                                stdout=output or subprocess.PIPE, stderr=subprocess.PIPE)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise GitError(f"git {args[0]} failed: {e}") from e
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', errors='replace').strip()
+        raise GitError(f"git {args[0]} failed ({result.returncode}): {stderr}")
+    if output is not None:
+        return '' if text else b''
+    return result.stdout.decode('utf-8', errors='replace') if text else result.stdout
+
+
+def local_diff(revision_range: Optional[str] = None, cwd: Optional[str] = None) -> str:
+    """Diff of a commit range, or of the working tree (staged and unstaged) against HEAD"""
+    return run_git(['diff', '--no-color', '--no-ext-diff', '--find-renames', revision_range or 'HEAD'], cwd=cwd)
@@ -0,0 +1,114 @@
+import os
+import re
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Union
+from utils.git import GitError, run_git
+from utils.mapped_diff import MappedDiff, load_diff_file
+from utils.logger import get_logger
+
+
+class GitMirror:
+    """Bare mirrors of reviewed repositories, used to compute diffs without the REST API"""
+
+    def __init__(self, cache_dir: str, fetch_timeout: float = 600):
+        self.cache_dir = cache_dir
+        self.fetch_timeout = fetch_timeout
+        self.logger = get_logger()
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional['GitMirror']:
+        """Build the mirror from environment settings, or None unless enabled"""
+        if os.environ.get('GIT_MIRROR_ENABLED', 'false').lower() != 'true':
+            return None
+        cache_dir = os.path.expanduser(os.environ.get('GIT_MIRROR_DIR', '')) or os.path.join(
+            os.path.expanduser('~'), '.cache', 'pr_review_agent', 'mirrors')
+        try:
+            run_git(['--version'])
+            return cls(cache_dir, fetch_timeout=float(os.environ.get('GIT_MIRROR_FETCH_TIMEOUT', 600)))
+        except (GitError, OSError) as e:
+            get_logger().warning(f"Git mirror unavailable, using the REST API for diffs: {e}")
+            return None
+
+    def path_for(self, repo_url: str) -> str:
+        name = re.sub(r'^[a-z+]+://', '', repo_url.rstrip('/'))
+        name = re.sub(r'\.git$', '', name)
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9._-]+', '_', name) + '.git')
+
+    def fetch(self, repo_url: str, remote_url: str, refs: List[str], auth_header: Optional[str] = None) -> str:
+        """Create the mirror of ``repo_url`` if needed and fetch ``refs`` from ``remote_url`` into it; returns its path.
+
+        ``remote_url`` must come from the adapter's configured host (GitServerAdapter.git_remote_url),
+        never from the caller, since ``auth_header`` is sent to it. Fetches are incremental: only
+        objects missing from the mirror are transferred.
+        """
+        path = self.path_for(repo_url)
+        with self._locks[path]:
+            if not os.path.isdir(path):
+                self.logger.info(f"Creating bare mirror of {remote_url}")
+                run_git(['init', '--bare', '--quiet', path])
+
+            env = {}
+            if auth_header:
+                # Passed through the environment so the token never shows up in process listings
+                env = {'GIT_CONFIG_COUNT': '1', 'GIT_CONFIG_KEY_0': 'http.extraHeader',
+                       'GIT_CONFIG_VALUE_0': f"Authorization: {auth_header}"}
+            refspecs = [f"+{ref}:{ref}" for ref in refs]
+            self.logger.debug(f"Fetching {', '.join(refs)} into {path}")
+            # Fetched by URL rather than a stored remote, so a mirror's config can never redirect the token
+            run_git(['fetch', '--quiet', '--no-tags', remote_url, *refspecs], cwd=path, env=env,
+                    timeout=self.fetch_timeout)
+        return path
+
+    def has_commit(self, repo_url: str, sha: str) -> bool:
+        try:
+            run_git(['cat-file', '-e', f"{sha}^{{commit}}"], cwd=self.path_for(repo_url))
+            return True
+        except GitError:
+            return False
+
+    def diff(self, repo_url: str, base_sha: str, head_sha: str) -> Union[str, MappedDiff]:
+        """PR diff: changes on ``head_sha`` since its merge base with ``base_sha``.
+
+        git writes straight to a temp file, which is mapped if the diff is large.
+        """
+        file = tempfile.TemporaryFile(prefix='pr-diff-')
+        try:
+            run_git(['diff', '--no-color', '--no-ext-diff', '--find-renames', f"{base_sha}...{head_sha}"],
+                    cwd=self.path_for(repo_url), output=file)
+        except GitError:
+            file.close()
+            raise
+        return load_diff_file(file)
+
+    def interdiff(self, repo_url: str, old_head: str, new_head: str) -> str:
+        """Straight diff between two heads of the same PR"""
+        return self._diff(repo_url, old_head, new_head)
+
+    def file_content(self, repo_url: str, sha: str, path: str) -> Optional[bytes]:
+        """Contents of ``path`` at ``sha``, or None if it does not exist there"""
+        try:
+            return run_git(['show', f"{sha}:{path}"], cwd=self.path_for(repo_url), text=False)
+        except GitError:
+            return None
+
+    def _diff(self, repo_url: str, *revisions: str) -> str:
+        return run_git(['diff', '--no-color', '--no-ext-diff', '--find-renames', *revisions],
+                       cwd=self.path_for(repo_url))
+
+
+_mirrors: Dict[tuple, Optional[GitMirror]] = {}
+_mirrors_lock = threading.Lock()
+
+
+def shared_mirror() -> Optional[GitMirror]:
+    """Process-wide mirror for the current settings, so its per-repository locks hold across agents"""
+    settings = ('GIT_MIRROR_ENABLED', 'GIT_MIRROR_DIR', 'GIT_MIRROR_FETCH_TIMEOUT')
+    key = tuple(os.environ.get(name, '') for name in settings)
+    with _mirrors_lock:
+        if key not in _mirrors:
+            _mirrors[key] = GitMirror.from_env()
+        return _mirrors[key]
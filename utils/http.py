@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import Optional
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib.parse import urlsplit
+from utils.ledger import record_response
+from utils.metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+# Seconds to connect and between bytes read; a git host that hangs must not hold a thread forever
+DEFAULT_TIMEOUT = (float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10)), float(os.environ.get('HTTP_READ_TIMEOUT', 60)))
+
+
+def _default_transport() -> HTTPAdapter:
+    size = int(os.environ.get('HTTP_POOL_SIZE', 64))
+    return HTTPAdapter(pool_connections=16, pool_maxsize=size)
+
+
+def _observe(response: requests.Response, *args, **kwargs):
+    host = urlsplit(response.url).hostname or ''
+    UPSTREAM_REQUESTS.inc(host=host, status=response.status_code)
+    if response.elapsed is not None:
+        UPSTREAM_SECONDS.observe(response.elapsed.total_seconds(), host=host)
+
+
+def get_session() -> requests.Session:
+    """Process-wide Session used by the adapters and LLM providers.
+
+    Sharing it keeps connections to each host alive between calls, gives one
+    place to swap the transport (see ``set_transport``), counts every
+    upstream response by host and status code, and feeds review ledgers.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.hooks['response'] += [_observe, record_response]
+            transport = _default_transport()
+            _session.mount('https://', transport)
+            _session.mount('http://', transport)
+        return _session
+
+
+def set_transport(transport: Optional[BaseAdapter] = None):
+    """Send every request through ``transport`` (e.g. a cassette); None restores the network"""
+    session = get_session()
+    transport = transport or _default_transport()
+    session.mount('https://', transport)
+    session.mount('http://', transport)
+
+
+class AuthSession:
+    """The shared session with ``auth`` (e.g. a CredentialPool) and DEFAULT_TIMEOUT applied to every request.
+
+    When the auth's ``should_retry`` says the credential was refused (throttled
+    or revoked), the request is sent once more through the whole session, so
+    metrics and the review ledger count both attempts.
+    """
+
+    def __init__(self, auth):
+        self.auth = auth
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('auth', self.auth)
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        response = get_session().request(method, url, **kwargs)
+        should_retry = getattr(kwargs['auth'], 'should_retry', None)
+        if should_retry is not None and should_retry(response):
+            response.close()
+            response = get_session().request(method, url, **kwargs)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
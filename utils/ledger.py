@@ -0,0 +1,191 @@
+import re
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+from urllib.parse import quote, urlsplit
+
+if TYPE_CHECKING:
+    import requests
+
+_SHA = re.compile(r'\b[0-9a-f]{7,40}\b')
+# Git hosts report quota under these names; GitLab without the X- prefix
+RATE_LIMIT_PREFIXES = ('x-ratelimit-', 'ratelimit-')
+
+
+def endpoint_template(url: str, repo_url: Optional[str] = None) -> str:
+    """Path of ``url`` with ids, SHAs and the reviewed repository replaced by placeholders"""
+    repo_parts = [part for part in urlsplit(repo_url).path.strip('/').split('/') if part] if repo_url else []
+    if repo_parts and repo_parts[-1].endswith('.git'):
+        repo_parts[-1] = repo_parts[-1][:-4]
+    project = quote('/'.join(repo_parts), safe='') if len(repo_parts) > 1 else None
+
+    segments = []
+    for segment in urlsplit(url).path.split('/'):
+        if project and segment == project:
+            segment = '{project}'
+        elif repo_parts and segment == repo_parts[-1]:
+            segment = '{repo}'
+        elif segment in repo_parts[:-1]:
+            segment = '{owner}'
+        elif segment.isdigit():
+            segment = '{id}'
+        else:
+            segment = _SHA.sub('{sha}', segment)
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+class RequestLedger:
+    """Git host requests made by one review, with an optional request budget.
+
+    Requests are recorded only while the ledger is active (see ``recording``),
+    which the agent does around adapter calls, so LLM traffic is not counted.
+    Nor are git fetches into the local mirror: they go over git, not the
+    host's rate-limited API.
+    """
+
+    def __init__(self, repo_url: Optional[str] = None, budget: Optional[int] = None):
+        self.repo_url = repo_url
+        self.budget = budget
+        self.entries: List[Dict[str, Any]] = []
+        # Steps the review skipped or downgraded to stay within the budget
+        self.degraded: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        return len(self.entries)
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return None if self.budget is None else max(0, self.budget - self.used)
+
+    def allows(self, requests_needed: int = 1) -> bool:
+        return self.budget is None or self.used + requests_needed <= self.budget
+
+    def degrade(self, reason: str):
+        self.degraded.append(reason)
+
+    def record(self, response: 'requests.Response', stream: bool = False):
+        if stream:
+            # Body not read yet; fall back to what the server announced
+            length = response.headers.get('Content-Length')
+            size = int(length) if length and length.isdigit() else None
+        else:
+            size = len(response.content)
+        entry = {
+            'method': response.request.method if response.request is not None else None,
+            'endpoint': endpoint_template(response.url, self.repo_url),
+            'status': response.status_code,
+            'bytes': size,
+            'latency_ms': round(response.elapsed.total_seconds() * 1000, 1) if response.elapsed else None,
+        }
+        rate_limit = {key.lower(): value for key, value in response.headers.items()
+                      if key.lower().startswith(RATE_LIMIT_PREFIXES) or key.lower() == 'retry-after'}
+        if rate_limit:
+            entry['rate_limit'] = rate_limit
+        with self._lock:
+            self.entries.append(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self.entries)
+        by_endpoint: Dict[str, int] = Counter(f"{entry['method']} {entry['endpoint']}" for entry in entries)
+        rate_limit = {}
+        for entry in entries:
+            # Latest values win; they describe the quota left after this review
+            rate_limit.update(entry.get('rate_limit', {}))
+        return {
+            'requests': len(entries),
+            'budget': self.budget,
+            'remaining': self.remaining,
+            'degraded': list(self.degraded),
+            'bytes': sum(entry['bytes'] or 0 for entry in entries),
+            'latency_ms_total': round(sum(entry['latency_ms'] or 0 for entry in entries), 1),
+            'by_status': dict(Counter(str(entry['status']) for entry in entries)),
+            'by_endpoint': dict(by_endpoint),
+            'rate_limit': rate_limit,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self.entries)
+        return {**self.summary(), 'entries': entries}
+
+
+_active: contextvars.ContextVar = contextvars.ContextVar('pr_review_ledger', default=None)
+
+
+@contextmanager
+def recording(ledger: Optional[RequestLedger]) -> Iterator[Optional[RequestLedger]]:
+    """Record HTTP responses received in this block into ``ledger``"""
+    token = _active.set(ledger)
+    try:
+        yield ledger
+    finally:
+        try:
+            _active.reset(token)
+        except ValueError:
+            # A generator holding the block was closed from another context
+            pass
+
+
+def record_response(response: 'requests.Response', *args, **kwargs):
+    """Session response hook: adds the response to the active ledger, if any"""
+    ledger = _active.get()
+    if ledger is not None:
+        ledger.record(response, stream=kwargs.get('stream', False))
+
+
+class LedgerTracker:
+    """Process-wide git host request totals per repository"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_repo: Dict[str, Dict[str, Any]] = defaultdict(_empty_rollup)
+
+    def record_review(self, repo_url: str, ledger: RequestLedger):
+        summary = ledger.summary()
+        with self._lock:
+            rollup = self._by_repo[repo_url]
+            rollup['reviews'] += 1
+            rollup['requests'] += summary['requests']
+            rollup['bytes'] += summary['bytes']
+            rollup['latency_ms_total'] = round(rollup['latency_ms_total'] + summary['latency_ms_total'], 1)
+            rollup['degraded_reviews'] += 1 if summary['degraded'] else 0
+            rollup['max_requests_per_review'] = max(rollup['max_requests_per_review'], summary['requests'])
+            for status, count in summary['by_status'].items():
+                rollup['by_status'][status] = rollup['by_status'].get(status, 0) + count
+            for endpoint, count in summary['by_endpoint'].items():
+                rollup['by_endpoint'][endpoint] = rollup['by_endpoint'].get(endpoint, 0) + count
+            if summary['rate_limit']:
+                rollup['rate_limit'] = summary['rate_limit']
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {repo: {**rollup, 'by_status': dict(rollup['by_status']),
+                           'by_endpoint': dict(rollup['by_endpoint'])}
+                    for repo, rollup in self._by_repo.items()}
+
+    def reset(self):
+        with self._lock:
+            self._by_repo.clear()
+
+
+def _empty_rollup() -> Dict[str, Any]:
+    return {
+        'reviews': 0,
+        'requests': 0,
+        'bytes': 0,
+        'latency_ms_total': 0.0,
+        'degraded_reviews': 0,
+        'max_requests_per_review': 0,
+        'by_status': {},
+        'by_endpoint': {},
+        'rate_limit': {}
+    }
+
+
+ledger_tracker = LedgerTracker()
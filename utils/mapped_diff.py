@@ -0,0 +1,174 @@
+import os
+import re
+import mmap
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+FILE_START = re.compile(rb'^diff --git ', re.MULTILINE)
+OLD_HEADER = re.compile(rb'^--- .*\n\+\+\+ ', re.MULTILINE)
+
+
+class MappedDiff:
+    """A diff spilled to a temporary file and read through mmap.
+
+    Line starts are kept in a compact ``array`` so lines and file sections can
+    be sliced out on demand; the diff is never held in memory as a whole.
+    """
+
+    INDEX_CHUNK = 1 << 20
+    # Bytes decoded at a time when iterating lines
+    LINES_CHUNK = 1 << 16
+
+    def __init__(self, file: BinaryIO):
+        file.flush()
+        self._file = file
+        self.size = os.fstat(file.fileno()).st_size
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        # Byte offset of the start of every line, as str.split('\n') would produce them
+        self.offsets = array('q', [0])
+        self._index()
+
+    def _index(self):
+        for start in range(0, self.size, self.INDEX_CHUNK):
+            parts = self._mmap[start:start + self.INDEX_CHUNK].split(b'\n')
+            self.offsets.extend(islice(accumulate((len(part) + 1 for part in parts[:-1]), initial=start), 1, None))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> 'MappedDiff':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets)
+
+    def line(self, index: int) -> str:
+        return self.text(index, index + 1)
+
+    def lines(self, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+        end = self.line_count if end is None else min(end, self.line_count)
+        for chunk_start, chunk_end in self.chunks(start, end, self.LINES_CHUNK):
+            yield from self.text(chunk_start, chunk_end).split('\n')
+
+    def byte_size(self, start: int, end: int) -> int:
+        return self._offset(end) - self.offsets[start]
+
+    def text(self, start: int, end: int) -> str:
+        """Lines ``start`` to ``end`` (exclusive) joined with newlines"""
+        if not self._mmap:
+            return ''
+        data = self._mmap[self.offsets[start]:self._offset(end)]
+        if end < self.line_count and data.endswith(b'\n'):
+            data = data[:-1]
+        return data.decode('utf-8', errors='replace')
+
+    def sections(self, preamble: bool = False) -> List[Tuple[int, int]]:
+        """(start, end) line ranges of the per-file sections, and of the lines before the first one if ``preamble``"""
+        if not self._mmap:
+            return []
+        positions = [match.start() for match in FILE_START.finditer(self._mmap)]
+        if not positions:
+            positions = [match.start() for match in OLD_HEADER.finditer(self._mmap)]
+        starts = [bisect_left(self.offsets, position) for position in positions]
+        if preamble and (not starts or starts[0] > 0):
+            starts.insert(0, 0)
+        return list(zip(starts, starts[1:] + [self.line_count]))
+
+    def chunks(self, start: int, end: int, max_bytes: int) -> Iterator[Tuple[int, int]]:
+        """Split lines ``start`` to ``end`` into ranges of whole lines of about ``max_bytes`` each"""
+        while start < end:
+            stop = min(end, max(start + 1, bisect_right(self.offsets, self.offsets[start] + max_bytes) - 1))
+            yield start, stop
+            start = stop
+
+    def close(self):
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def _offset(self, line: int) -> int:
+        return self.offsets[line] if line < self.line_count else self.size
+
+
+class MappedSections:
+    """Line ranges of a MappedDiff read as one diff, as if the ranges were joined with newlines.
+
+    Consumers read it one section at a time through ``iter_sections``; line
+    numbers count from the first line of the first range.
+    """
+
+    def __init__(self, diff: MappedDiff, ranges: Optional[List[Tuple[int, int]]] = None):
+        self.diff = diff
+        self.ranges = diff.sections(preamble=True) if ranges is None else ranges
+
+    def __len__(self) -> int:
+        return sum(self.diff.byte_size(start, end) for start, end in self.ranges)
+
+    @property
+    def line_count(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+
+def iter_sections(diff: Union[str, MappedDiff, MappedSections],
+                  max_bytes: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """(first line, text) of each file section of a diff; an in-memory diff is a single section.
+
+    Mapped diffs are decoded one section at a time, and sections above
+    ``max_bytes`` in chunks of whole lines, so only one is ever held as text.
+    """
+    if isinstance(diff, str):
+        yield 0, diff
+        return
+    if isinstance(diff, MappedDiff):
+        diff = MappedSections(diff)
+    first = 0
+    for start, end in diff.ranges:
+        for chunk_start, chunk_end in (diff.diff.chunks(start, end, max_bytes) if max_bytes else [(start, end)]):
+            yield first + chunk_start - start, diff.diff.text(chunk_start, chunk_end)
+        first += end - start
+
+
+def spill_threshold() -> int:
+    """Diffs above this many bytes are spilled to disk (DIFF_SPILL_THRESHOLD_MB)"""
+    return int(float(os.environ.get('DIFF_SPILL_THRESHOLD_MB', 32)) * 1024 * 1024)
+
+
+def spool_diff(chunks: Iterable[bytes], threshold: Optional[int] = None) -> Union[str, MappedDiff]:
+    """Collect a streamed diff in memory, or in a mapped temp file once it exceeds ``threshold`` bytes"""
+    threshold = spill_threshold() if threshold is None else threshold
+    buffered: List[bytes] = []
+    size = 0
+    file = None
+    for chunk in chunks:
+        if file is None:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                file = tempfile.TemporaryFile(prefix='pr-diff-')
+                file.writelines(buffered)
+                buffered = []
+        else:
+            file.write(chunk)
+    if file is None:
+        return b''.join(buffered).decode('utf-8', errors='replace')
+    return MappedDiff(file)
+
+
+def load_diff_file(file: BinaryIO, threshold: Optional[int] = None) -> Union[str, MappedDiff]:
+    """Map a diff already written to ``file``, or read it back if it is small"""
+    threshold = spill_threshold() if threshold is None else threshold
+    file.flush()
+    if os.fstat(file.fileno()).st_size > threshold:
+        return MappedDiff(file)
+    with file:
+        file.seek(0)
+        return file.read().decode('utf-8', errors='replace')
+
@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from utils.logger import get_logger
+
+# Seconds; covers a cached lookup up to a slow LLM call or a huge diff download
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, '')) for name in self.label_names), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(name, '')) for name in self.label_names))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('pr_review_stage_duration_seconds',
+                                   'Time spent per review stage and adapter call', ('stage',))
+STAGE_ERRORS = registry.counter('pr_review_stage_errors_total', 'Review stages that raised', ('stage',))
+DIFF_BYTES = registry.histogram('pr_review_diff_bytes', 'Size of reviewed diffs', ('source',), SIZE_BUCKETS)
+FINDINGS_PER_REVIEW = registry.histogram('pr_review_findings', 'Findings per review', ('type',), COUNT_BUCKETS)
+CACHE_LOOKUPS = registry.counter('pr_review_cache_lookups_total', 'Cache lookups by cache and result',
+                                 ('cache', 'result'))
+UPSTREAM_REQUESTS = registry.counter('pr_review_upstream_requests_total',
+                                     'HTTP requests to git platforms and LLM backends by status code',
+                                     ('host', 'status'))
+UPSTREAM_SECONDS = registry.histogram('pr_review_upstream_request_duration_seconds',
+                                      'Time to response headers of upstream HTTP requests', ('host',))
+
+
+class Span:
+    """One timed operation within a trace.
+
+    ``timings`` is shared by every span of the trace: total seconds per span
+    name, filled in as spans finish, so the root can report its stages.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error', 'timings')
+
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = parent.timings if parent else {}
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('pr_review_span', default=None)
+# Spans of one trace finish on several threads (LLM requests) and add to the same timings
+_timings_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a stage as a child of the current span; the duration feeds STAGE_SECONDS.
+
+    Work handed to other threads keeps its parent when submitted through
+    ``contextvars.copy_context().run``.
+    """
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    if trace_exporter:
+        trace_exporter.started(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.error = f"{type(e).__name__}: {e}"
+            STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        with _timings_lock:
+            current.timings[name] = current.timings.get(name, 0.0) + elapsed
+        current.end_ns = time.time_ns()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator holding the span was closed from another context
+            pass
+        if trace_exporter:
+            trace_exporter.finished(current)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class TraceFileExporter:
+    """Writes finished traces as OTLP/JSON lines, one ExportTraceServiceRequest per trace.
+
+    The file can be replayed into an OpenTelemetry collector (``otlpjsonfile``
+    receiver) or read directly.
+    """
+
+    def __init__(self, path: str, service_name: str = 'pr-review-agent'):
+        self.path = path
+        self.service_name = service_name
+        self.logger = get_logger()
+        self._open: Dict[str, int] = defaultdict(int)
+        self._finished: Dict[str, List[Span]] = defaultdict(list)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional['TraceFileExporter']:
+        """Build the exporter from TRACE_EXPORT_PATH, or None if unset"""
+        path = os.path.expanduser(os.environ.get('TRACE_EXPORT_PATH', ''))
+        if not path:
+            return None
+        return cls(path, os.environ.get('TRACE_SERVICE_NAME', 'pr-review-agent'))
+
+    def started(self, span: Span):
+        with self._lock:
+            self._open[span.trace_id] += 1
+
+    def finished(self, span: Span):
+        with self._lock:
+            self._finished[span.trace_id].append(span)
+            self._open[span.trace_id] -= 1
+            if self._open[span.trace_id] > 0:
+                return
+            # Written once every span of the trace has ended, including ones on worker threads
+            del self._open[span.trace_id]
+            spans = self._finished.pop(span.trace_id)
+        self._write(spans)
+
+    def _write(self, spans: List[Span]):
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': 'pr_review_agent'},
+                'spans': [self._encode(span) for span in spans]
+            }]
+        }]}
+        try:
+            with self._lock, open(self.path, 'a') as f:
+                f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+        except OSError as e:
+            self.logger.warning(f"Could not write trace to {self.path}: {e}")
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [_attribute(key, value) for key, value in span.attributes.items() if value is not None],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+        }
+        if span.parent_id:
+            encoded['parentSpanId'] = span.parent_id
+        return encoded
+
+
+trace_exporter = TraceFileExporter.from_env()
+
+
+def set_trace_exporter(exporter: Optional[TraceFileExporter]):
+    """Replace the exporter picked up from the environment (None disables tracing output)"""
+    global trace_exporter
+    trace_exporter = exporter
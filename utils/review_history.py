@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from utils.logger import get_logger
+
+FINDING_TYPES = ('error', 'warning', 'info', 'suggestion')
+
+# Queries by repository, author, time and rule read these indexes or the daily rollups, never the raw findings JSON
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS reviews ("
+    "id INTEGER PRIMARY KEY, repo_url TEXT NOT NULL, pr_id TEXT NOT NULL, platform TEXT, author TEXT, "
+    "head_sha TEXT, reviewed_at REAL NOT NULL, day TEXT NOT NULL, score REAL NOT NULL, findings INTEGER NOT NULL, "
+    "errors INTEGER NOT NULL, warnings INTEGER NOT NULL, infos INTEGER NOT NULL, suggestions INTEGER NOT NULL, "
+    "duration_ms REAL, timings TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_repo_time ON reviews (repo_url, reviewed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_author_time ON reviews (author, reviewed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_time ON reviews (reviewed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_pr ON reviews (repo_url, pr_id, reviewed_at)",
+    # Repository, author and time repeated from the review so rule queries need no join
+    "CREATE TABLE IF NOT EXISTS findings ("
+    "review_id INTEGER NOT NULL, repo_url TEXT NOT NULL, author TEXT, reviewed_at REAL NOT NULL, "
+    "rule TEXT NOT NULL, type TEXT NOT NULL, path TEXT, line INTEGER, message TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_rule_time ON findings (rule, reviewed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_repo_rule ON findings (repo_url, rule, reviewed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_review ON findings (review_id)",
+    "CREATE TABLE IF NOT EXISTS daily_reviews ("
+    "day TEXT NOT NULL, repo_url TEXT NOT NULL, author TEXT NOT NULL, reviews INTEGER NOT NULL, "
+    "score_sum REAL NOT NULL, score_min REAL NOT NULL, score_max REAL NOT NULL, findings INTEGER NOT NULL, "
+    "errors INTEGER NOT NULL, warnings INTEGER NOT NULL, duration_ms_sum REAL NOT NULL, "
+    "PRIMARY KEY (day, repo_url, author))",
+    "CREATE INDEX IF NOT EXISTS idx_daily_reviews_repo ON daily_reviews (repo_url, day)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_reviews_author ON daily_reviews (author, day)",
+    "CREATE TABLE IF NOT EXISTS daily_rules ("
+    "day TEXT NOT NULL, repo_url TEXT NOT NULL, author TEXT NOT NULL, rule TEXT NOT NULL, type TEXT NOT NULL, "
+    "findings INTEGER NOT NULL, PRIMARY KEY (day, repo_url, author, rule, type))",
+    "CREATE INDEX IF NOT EXISTS idx_daily_rules_rule ON daily_rules (rule, day)",
+)
+
+# Dimensions top() can rank, and the column each maps to
+TOP_BY = {'rule': 'rule', 'author': 'author', 'repo': 'repo_url'}
+
+# Seconds between retention sweeps made by record()
+PRUNE_INTERVAL = 3600
+
+
+def rule_id(item) -> str:
+    """Rule of a finding; AI findings without one are grouped per type as llm.<type>"""
+    return item.rule or f"llm.{item.type}"
+
+
+def _day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+
+def _first_day(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+
+class ReviewHistory:
+    """Every review's score, findings and stage timings, with daily rollups for trend and top-N queries.
+
+    Rollups are updated in the same transaction as the raw rows, so they
+    always agree and aggregate queries read a few rows per day. Raw reviews
+    and findings older than ``retention_days`` are pruned (None keeps them);
+    the rollups are kept, so trends and top-N still reach further back.
+    """
+
+    def __init__(self, path: str, retention_days: Optional[float] = 90):
+        self.path = path
+        self.retention_days = retention_days
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional['ReviewHistory']:
+        """Build the store from environment settings, or None if disabled"""
+        if os.environ.get('REVIEW_HISTORY_DISABLED', 'false').lower() == 'true':
+            return None
+        path = os.path.expanduser(os.environ.get('REVIEW_HISTORY_PATH', '')) or os.path.join(
+            os.path.expanduser('~'), '.cache', 'pr_review_agent', 'history.db')
+        retention = float(os.environ.get('REVIEW_HISTORY_RETENTION_DAYS', 90))
+        try:
+            return cls(path, retention_days=retention or None)
+        except (sqlite3.Error, OSError) as e:
+            get_logger().warning(f"Review history unavailable, reviews will not be recorded: {e}")
+            return None
+
+    def record(self, repo_url: str, pr_id: int, score: float, feedback: Iterable, platform: Optional[str] = None,
+               author: Optional[str] = None, head_sha: Optional[str] = None,
+               timings: Optional[Dict[str, float]] = None, reviewed_at: Optional[float] = None) -> int:
+        """Store one review and add it to the daily rollups; returns the review id"""
+        reviewed_at = reviewed_at or time.time()
+        day = _day(reviewed_at)
+        timings = timings or {}
+        items = list(feedback)
+        counts = {feedback_type: 0 for feedback_type in FINDING_TYPES}
+        rules: Dict[tuple, int] = {}
+        for item in items:
+            counts[item.type] = counts.get(item.type, 0) + 1
+            key = (rule_id(item), item.type)
+            rules[key] = rules.get(key, 0) + 1
+        duration_ms = timings.get('review')
+
+        with self._lock, self._conn:
+            review_id = self._conn.execute(
+                "INSERT INTO reviews (repo_url, pr_id, platform, author, head_sha, reviewed_at, day, score, findings, "
+                "errors, warnings, infos, suggestions, duration_ms, timings) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo_url, str(pr_id), platform, author, head_sha, reviewed_at, day, score, len(items),
+                 counts['error'], counts['warning'], counts['info'], counts['suggestion'], duration_ms,
+                 json.dumps(timings))
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO findings (review_id, repo_url, author, reviewed_at, rule, type, path, line, message) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(review_id, repo_url, author, reviewed_at, rule_id(item), item.type, item.path, item.line,
+                  item.message) for item in items]
+            )
+            # Rollups key on '' for an unknown author: NULLs would never conflict and so never aggregate
+            self._conn.execute(
+                "INSERT INTO daily_reviews (day, repo_url, author, reviews, score_sum, score_min, score_max, findings, "
+                "errors, warnings, duration_ms_sum) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (day, repo_url, author) DO UPDATE SET reviews = reviews + 1, "
+                "score_sum = score_sum + excluded.score_sum, score_min = MIN(score_min, excluded.score_min), "
+                "score_max = MAX(score_max, excluded.score_max), findings = findings + excluded.findings, "
+                "errors = errors + excluded.errors, warnings = warnings + excluded.warnings, "
+                "duration_ms_sum = duration_ms_sum + excluded.duration_ms_sum",
+                (day, repo_url, author or '', score, score, score, len(items), counts['error'], counts['warning'],
+                 duration_ms or 0.0)
+            )
+            self._conn.executemany(
+                "INSERT INTO daily_rules (day, repo_url, author, rule, type, findings) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (day, repo_url, author, rule, type) DO UPDATE SET findings = findings + excluded.findings",
+                [(day, repo_url, author or '', rule, feedback_type, count)
+                 for (rule, feedback_type), count in rules.items()]
+            )
+        if self.retention_days and time.time() - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune()
+        return review_id
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete raw reviews and findings past the retention period; returns the number of reviews removed"""
+        if not self.retention_days:
+            return 0
+        now = now or time.time()
+        cutoff = now - self.retention_days * 86400
+        with self._lock, self._conn:
+            self._pruned_at = now
+            self._conn.execute(
+                "DELETE FROM findings WHERE review_id IN (SELECT id FROM reviews WHERE reviewed_at < ?)", (cutoff,))
+            removed = self._conn.execute("DELETE FROM reviews WHERE reviewed_at < ?", (cutoff,)).rowcount
+        if removed:
+            self.logger.debug(f"Pruned {removed} reviews older than {self.retention_days:g} days from the history")
+        return removed
+
+    def trend(self, repo_url: Optional[str] = None, author: Optional[str] = None,
+              days: int = 30) -> List[Dict[str, Any]]:
+        """Per day: reviews, average/min/max score, findings, errors and average review time"""
+        where, params = self._filters(days, repo_url=repo_url, author=author)
+        rows = self._query(
+            "SELECT day, SUM(reviews), SUM(score_sum), MIN(score_min), MAX(score_max), SUM(findings), SUM(errors), "
+            f"SUM(duration_ms_sum) FROM daily_reviews WHERE {where} GROUP BY day ORDER BY day", params
+        )
+        return [{
+            'day': day,
+            'reviews': reviews,
+            'avg_score': round(score_sum / reviews, 2),
+            'min_score': score_min,
+            'max_score': score_max,
+            'findings': findings,
+            'errors': errors,
+            'avg_duration_ms': round(duration_sum / reviews, 1)
+        } for day, reviews, score_sum, score_min, score_max, findings, errors, duration_sum in rows]
+
+    def top(self, by: str = 'rule', repo_url: Optional[str] = None, author: Optional[str] = None,
+            rule: Optional[str] = None, days: int = 30, limit: int = 10) -> List[Dict[str, Any]]:
+        """The rules, authors or repositories with the most findings over the last ``days``"""
+        if by not in TOP_BY:
+            raise ValueError(f"Cannot rank by {by} (choose from {', '.join(TOP_BY)})")
+        column = TOP_BY[by]
+        where, params = self._filters(days, repo_url=repo_url, author=author, rule=rule)
+        rows = self._query(
+            f"SELECT {column}, SUM(findings), SUM(CASE WHEN type = 'error' THEN findings ELSE 0 END) "
+            f"FROM daily_rules WHERE {where} GROUP BY {column} ORDER BY SUM(findings) DESC, {column} LIMIT ?",
+            params + [limit]
+        )
+        return [{by: key or None, 'findings': findings, 'errors': errors} for key, findings, errors in rows]
+
+    def reviews(self, repo_url: Optional[str] = None, author: Optional[str] = None, pr_id: Optional[int] = None,
+                limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent reviews, newest first"""
+        clauses, params = [], []
+        for column, value in (('repo_url', repo_url), ('author', author), ('pr_id', pr_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(str(value) if column == 'pr_id' else value)
+        rows = self._query(
+            "SELECT id, repo_url, pr_id, platform, author, head_sha, reviewed_at, score, findings, errors, warnings, "
+            "infos, suggestions, duration_ms, timings FROM reviews "
+            f"{'WHERE ' + ' AND '.join(clauses) if clauses else ''} ORDER BY reviewed_at DESC LIMIT ?",
+            params + [limit]
+        )
+        columns = ('id', 'repo_url', 'pr_id', 'platform', 'author', 'head_sha', 'reviewed_at', 'score', 'findings',
+                   'errors', 'warnings', 'infos', 'suggestions', 'duration_ms', 'timings')
+        return [{**dict(zip(columns, row)), 'timings': json.loads(row[-1])} for row in rows]
+
+    def _filters(self, days: int, **equals) -> tuple:
+        clauses, params = ["day >= ?"], [_first_day(days)]
+        for column, value in equals.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return ' AND '.join(clauses), params
+
+    def _query(self, sql: str, params: List[Any]) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from utils.logger import get_logger
+
+
+class ReviewStateStore:
+    """Per-PR review state: last reviewed head, AI findings by file and posted comment IDs"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "repo_url TEXT NOT NULL, pr_id TEXT NOT NULL, base_sha TEXT, head_sha TEXT, "
+            "findings TEXT NOT NULL, comments TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (repo_url, pr_id))"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional['ReviewStateStore']:
+        """Build the store from environment settings, or None if disabled"""
+        if os.environ.get('REVIEW_STATE_DISABLED', 'false').lower() == 'true':
+            return None
+        path = os.path.expanduser(os.environ.get('REVIEW_STATE_PATH', '')) or os.path.join(
+            os.path.expanduser('~'), '.cache', 'pr_review_agent', 'reviews.db')
+        try:
+            return cls(path)
+        except (sqlite3.Error, OSError) as e:
+            get_logger().warning(f"Review state unavailable, every review will be a full one: {e}")
+            return None
+
+    def get(self, repo_url: str, pr_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT base_sha, head_sha, findings, comments, updated_at FROM reviews "
+                "WHERE repo_url = ? AND pr_id = ?", (repo_url, str(pr_id))
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'base_sha': row[0],
+            'head_sha': row[1],
+            'findings': json.loads(row[2]),
+            'comments': json.loads(row[3]),
+            'updated_at': row[4]
+        }
+
+    def save(self, repo_url: str, pr_id: int, base_sha: Optional[str], head_sha: Optional[str],
+             findings: Dict[str, List[Dict[str, Any]]], comments: Dict[str, Any]):
+        """Replace the state of a PR; ``findings`` maps file path to AI findings"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (repo_url, pr_id, base_sha, head_sha, findings, comments, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo_url, str(pr_id), base_sha, head_sha, json.dumps(findings), json.dumps(comments), time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, repo_url: str, pr_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM reviews WHERE repo_url = ? AND pr_id = ?", (repo_url, str(pr_id)))
+            self._conn.commit()
+
+
+_stores: Dict[tuple, Optional[ReviewStateStore]] = {}
+_stores_lock = threading.Lock()
+
+
+def shared_state_store() -> Optional[ReviewStateStore]:
+    """Process-wide store for the current settings, so agents share one connection instead of each opening its own"""
+    key = (os.environ.get('REVIEW_STATE_DISABLED', ''), os.environ.get('REVIEW_STATE_PATH', ''))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ReviewStateStore.from_env()
+        return _stores[key]
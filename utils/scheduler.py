@@ -0,0 +1,287 @@
+import os
+import time
+import threading
+import itertools
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from utils.logger import get_logger
+from utils.metrics import registry
+
+# Seconds; from an idle queue up to a release-day backlog
+WAIT_BUCKETS = (0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+QUEUE_WAIT = registry.histogram('pr_review_queue_wait_seconds', 'Time reviews waited for a worker by SLA class',
+                                ('sla',), WAIT_BUCKETS)
+QUEUE_MISSED = registry.counter('pr_review_queue_missed_total', 'Reviews that started after their SLA target wait',
+                                ('sla',))
+
+# Target wait in seconds, and how much cheaper a job of the class looks to shortest-job-first
+SLA_CLASSES = {
+    'interactive': {'target': 30.0, 'weight': 4.0},
+    'normal': {'target': 300.0, 'weight': 1.0},
+    'batch': {'target': 3600.0, 'weight': 0.25},
+}
+POLICIES = ('sjf', 'fair', 'fifo')
+
+# Cost is in changed lines; each file adds a fixed charge for fetching its context and prompting for it
+FILE_COST = 50
+# Lines assumed per file when the server only reports a file count
+LINES_PER_FILE = 40
+# A PR of unknown size is treated as a middling one
+DEFAULT_COST = 500.0
+
+
+def estimate_cost(size: Optional[Dict[str, Any]]) -> float:
+    """Review cost of a PR from its ``additions``, ``deletions`` and ``files`` (any may be None)"""
+    if not size:
+        return DEFAULT_COST
+    files = size.get('files') or 0
+    if size.get('additions') is None and size.get('deletions') is None:
+        lines = files * LINES_PER_FILE
+    else:
+        lines = (size.get('additions') or 0) + (size.get('deletions') or 0)
+    return float(lines + FILE_COST * files) or DEFAULT_COST
+
+
+def parse_sla_targets(value: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """SLA classes with target waits overridden by ``interactive=30,normal=300,batch=3600``"""
+    classes = {name: dict(options) for name, options in SLA_CLASSES.items()}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        name, target = item.split('=', 1)
+        classes.setdefault(name.strip(), {'weight': 1.0})['target'] = float(target)
+    return classes
+
+
+class Ticket:
+    """One review waiting for, or holding, a worker"""
+
+    __slots__ = ('repo_url', 'pr_id', 'cost', 'sla', 'large', 'seq', 'enqueued', 'run', 'future', 'granted')
+
+    def __init__(self, repo_url: str, pr_id: Any, cost: float, sla: str, large: bool, seq: int,
+                 run: Optional[Callable[[], Any]] = None):
+        self.repo_url = repo_url
+        self.pr_id = pr_id
+        self.cost = cost
+        self.sla = sla
+        self.large = large
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.run = run
+        self.future: Optional[Future] = Future() if run is not None else None
+        self.granted = False
+
+
+class ReviewScheduler:
+    """Orders queued reviews so one giant PR cannot hold up dozens of small ones.
+
+    Policies: ``sjf`` runs the cheapest job first, where waiting lowers the
+    cost by ``aging`` per second so large jobs still get their turn; ``fair``
+    serves the repository that has received the least review cost so far,
+    cheapest job first within it; ``fifo`` keeps arrival order. Under every
+    policy a job whose wait exceeds its SLA class target goes first, and at
+    most ``max_large`` workers run jobs costing ``large_cost`` or more, so
+    small jobs always have a worker.
+
+    Jobs either run on the scheduler's workers (submit) or in the caller's
+    thread once admitted (slot).
+    """
+
+    def __init__(self, workers: int = 4, policy: str = 'sjf', aging: float = 10.0, large_cost: float = 2000,
+                 max_large: Optional[int] = None, classes: Optional[Dict[str, Dict[str, float]]] = None,
+                 window: int = 500):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy {policy} (choose from {', '.join(POLICIES)})")
+        self.workers = workers
+        self.policy = policy
+        self.aging = aging
+        self.large_cost = large_cost
+        self.max_large = max_large if max_large is not None else max(1, workers - 1)
+        self.classes = classes or {name: dict(options) for name, options in SLA_CLASSES.items()}
+        self.logger = get_logger()
+        self._waiting: List[Ticket] = []
+        self._running = 0
+        self._running_large = 0
+        self._running_by_repo: Dict[str, int] = defaultdict(int)
+        # Review cost each repository has been given, the virtual time of the fair policy
+        self._served: Dict[str, float] = defaultdict(float)
+        self._waits = {name: deque(maxlen=window) for name in self.classes}
+        self._stats = {name: {'started': 0, 'missed': 0} for name in self.classes}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='review')
+
+    @classmethod
+    def from_env(cls) -> Optional['ReviewScheduler']:
+        """Build the scheduler from environment settings, or None if disabled"""
+        if os.environ.get('REVIEW_SCHEDULER_DISABLED', 'false').lower() == 'true':
+            return None
+        max_large = os.environ.get('REVIEW_MAX_LARGE')
+        return cls(
+            workers=int(os.environ.get('REVIEW_WORKERS', 4)),
+            policy=os.environ.get('REVIEW_SCHEDULER_POLICY', 'sjf'),
+            aging=float(os.environ.get('REVIEW_SCHEDULER_AGING', 10.0)),
+            large_cost=float(os.environ.get('REVIEW_LARGE_COST', 2000)),
+            max_large=int(max_large) if max_large else None,
+            classes=parse_sla_targets(os.environ.get('REVIEW_SLA_TARGETS'))
+        )
+
+    def submit(self, repo_url: str, pr_id: Any, run: Callable[[], Any], cost: float = DEFAULT_COST,
+               sla: str = 'normal') -> Future:
+        """Queue ``run`` to execute on a worker when its turn comes"""
+        ticket = self._enqueue(repo_url, pr_id, cost, sla, run)
+        return ticket.future
+
+    @contextmanager
+    def slot(self, repo_url: str, pr_id: Any, cost: float = DEFAULT_COST, sla: str = 'interactive') -> Iterator[Ticket]:
+        """Wait for this job's turn, then hold a worker for the duration of the block in the calling thread"""
+        ticket = self._enqueue(repo_url, pr_id, cost, sla)
+        try:
+            with self._cond:
+                while not ticket.granted:
+                    self._cond.wait()
+        except BaseException:
+            with self._cond:
+                if not ticket.granted:
+                    self._waiting.remove(ticket)
+                    raise
+            self._finish(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self._finish(ticket)
+
+    def _enqueue(self, repo_url: str, pr_id: Any, cost: float, sla: str,
+                 run: Optional[Callable[[], Any]] = None) -> Ticket:
+        if sla not in self.classes:
+            raise ValueError(f"Unknown SLA class {sla} (choose from {', '.join(self.classes)})")
+        with self._cond:
+            active = {ticket.repo_url for ticket in self._waiting} | {
+                repo for repo, running in self._running_by_repo.items() if running}
+            if repo_url not in active and active:
+                # A repository coming back from idle starts level with the others instead of owing its past share
+                self._served[repo_url] = max(self._served[repo_url], min(self._served[repo] for repo in active))
+            ticket = Ticket(repo_url, pr_id, cost, sla, cost >= self.large_cost, next(self._seq), run)
+            self._waiting.append(ticket)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        """Start the best eligible tickets while workers are free; called with the lock held"""
+        now = time.monotonic()
+        while self._running < self.workers:
+            ticket = self._pick(now)
+            if ticket is None:
+                return
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._running += 1
+            self._running_large += ticket.large
+            self._running_by_repo[ticket.repo_url] += 1
+            self._served[ticket.repo_url] += ticket.cost
+
+            waited = now - ticket.enqueued
+            self._waits[ticket.sla].append(waited)
+            self._stats[ticket.sla]['started'] += 1
+            QUEUE_WAIT.observe(waited, sla=ticket.sla)
+            if waited > self.classes[ticket.sla]['target']:
+                self._stats[ticket.sla]['missed'] += 1
+                QUEUE_MISSED.inc(sla=ticket.sla)
+            if ticket.run is not None:
+                self._executor.submit(self._execute, ticket)
+            else:
+                self._cond.notify_all()
+
+    def _pick(self, now: float) -> Optional[Ticket]:
+        # A linear scan: aging changes every ticket's priority over time, so a heap would go stale
+        best, best_key = None, None
+        for ticket in list(self._waiting):
+            if ticket.future is not None and ticket.future.cancelled():
+                self._waiting.remove(ticket)
+                continue
+            if ticket.large and self._running_large >= self.max_large:
+                continue
+            key = self._priority(ticket, now)
+            if best_key is None or key < best_key:
+                best, best_key = ticket, key
+        return best
+
+    def _priority(self, ticket: Ticket, now: float) -> tuple:
+        """Sort key of a waiting ticket; lowest starts first"""
+        sla = self.classes[ticket.sla]
+        waited = now - ticket.enqueued
+        if waited > sla['target']:
+            # Past its target: most overdue relative to the target first, whatever the policy
+            return (0, -waited / sla['target'], ticket.seq)
+        if self.policy == 'fifo':
+            return (1, ticket.seq)
+        shortest = ticket.cost / sla.get('weight', 1.0) - self.aging * waited
+        if self.policy == 'fair':
+            return (1, self._served[ticket.repo_url], shortest, ticket.seq)
+        return (1, shortest, ticket.seq)
+
+    def _execute(self, ticket: Ticket):
+        try:
+            if ticket.future.set_running_or_notify_cancel():
+                try:
+                    ticket.future.set_result(ticket.run())
+                except BaseException as e:
+                    ticket.future.set_exception(e)
+        finally:
+            self._finish(ticket)
+
+    def _finish(self, ticket: Ticket):
+        with self._cond:
+            self._running -= 1
+            self._running_large -= ticket.large
+            self._running_by_repo[ticket.repo_url] -= 1
+            if not self._running_by_repo[ticket.repo_url]:
+                del self._running_by_repo[ticket.repo_url]
+            self._dispatch()
+            self._cond.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers; with ``wait``, only after every queued and running job is done"""
+        if wait:
+            with self._cond:
+                while self._waiting or self._running:
+                    self._cond.wait()
+        self._executor.shutdown(wait=wait)
+
+    def snapshot(self, queued: int = 20) -> Dict[str, Any]:
+        """Workers in use, the next queued jobs in start order, and queue wait per SLA class"""
+        now = time.monotonic()
+        with self._cond:
+            waiting = sorted(self._waiting, key=lambda ticket: self._priority(ticket, now))
+            classes = {}
+            for name, options in self.classes.items():
+                waits = sorted(self._waits[name])
+                classes[name] = {
+                    'target_s': options['target'],
+                    'waiting': sum(1 for ticket in waiting if ticket.sla == name),
+                    **self._stats[name],
+                    'wait_p50_s': round(waits[len(waits) // 2], 2) if waits else None,
+                    'wait_p95_s': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+                    'wait_max_s': round(waits[-1], 2) if waits else None,
+                }
+            return {
+                'policy': self.policy,
+                'workers': self.workers,
+                'running': self._running,
+                'running_large': self._running_large,
+                'max_large': self.max_large,
+                'queue_depth': len(waiting),
+                'classes': classes,
+                'queue': [{
+                    'repo_url': ticket.repo_url,
+                    'pr_id': ticket.pr_id,
+                    'sla': ticket.sla,
+                    'cost': ticket.cost,
+                    'large': ticket.large,
+                    'waited_s': round(now - ticket.enqueued, 1)
+                } for ticket in waiting[:queued]]
+            }
@@ -0,0 +1,345 @@
+import os
+import re
+import ast
+import time
+import keyword
+import builtins
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from utils.diff_parser import Hunk
+from utils.git import run_git
+from utils.tokens import estimate_tokens
+from utils.logger import get_logger
+
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+DEFINITION = re.compile(r'^\s*(?:async\s+)?(?:def|class)\s+([A-Za-z_][A-Za-z0-9_]*)')
+IGNORED_NAMES = set(keyword.kwlist) | set(dir(builtins)) | {'self', 'cls'}
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS trees (repo TEXT NOT NULL, commit_sha TEXT NOT NULL, indexed_at REAL NOT NULL, "
+    "PRIMARY KEY (repo, commit_sha))",
+    "CREATE TABLE IF NOT EXISTS files (repo TEXT NOT NULL, commit_sha TEXT NOT NULL, path TEXT NOT NULL, "
+    "blob TEXT NOT NULL, PRIMARY KEY (repo, commit_sha, path))",
+    "CREATE INDEX IF NOT EXISTS idx_files_blob ON files (blob)",
+    "CREATE TABLE IF NOT EXISTS blobs (blob TEXT PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS symbols (blob TEXT NOT NULL, name TEXT NOT NULL, qualname TEXT NOT NULL, "
+    "kind TEXT NOT NULL, line INTEGER NOT NULL, end_line INTEGER NOT NULL, snippet TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols (name)",
+    "CREATE INDEX IF NOT EXISTS idx_symbols_blob ON symbols (blob)",
+    "CREATE TABLE IF NOT EXISTS imports (blob TEXT NOT NULL, module TEXT NOT NULL, name TEXT, alias TEXT, "
+    "line INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_imports_blob ON imports (blob)",
+    "CREATE TABLE IF NOT EXISTS calls (blob TEXT NOT NULL, caller TEXT NOT NULL, callee TEXT NOT NULL, "
+    "line INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_calls_callee ON calls (callee)",
+    "CREATE INDEX IF NOT EXISTS idx_calls_blob ON calls (blob)",
+]
+
+
+class SymbolIndex:
+    """Per-repository index of Python definitions, imports and call sites.
+
+    Files are parsed once per blob SHA, so indexing a new commit only parses
+    the files it changed. Each indexed commit keeps its own file list; only
+    the most recent ``keep_trees`` commits per repository are retained.
+    """
+
+    SNIPPET_LINES = 15
+    MAX_FILE_BYTES = 512 * 1024
+    MAX_DEFINITIONS = 4
+    BATCH = 500
+
+    def __init__(self, path: str, token_budget: int = 800, keep_trees: int = 8):
+        self.path = path
+        self.token_budget = token_budget
+        self.keep_trees = keep_trees
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional['SymbolIndex']:
+        """Build the index from environment settings, or None if disabled"""
+        if os.environ.get('SYMBOL_INDEX_DISABLED', 'false').lower() == 'true':
+            return None
+        path = os.path.expanduser(os.environ.get('SYMBOL_INDEX_PATH', '')) or os.path.join(
+            os.path.expanduser('~'), '.cache', 'pr_review_agent', 'symbols.db')
+        try:
+            return cls(path, token_budget=int(os.environ.get('SYMBOL_INDEX_CONTEXT_TOKENS', 800)))
+        except (sqlite3.Error, OSError) as e:
+            get_logger().warning(f"Symbol index unavailable, prompts will carry no repository context: {e}")
+            return None
+
+    def update(self, repo: str, git_dir: str, commit: str = 'HEAD') -> Dict[str, Any]:
+        """Index ``commit`` of the repository at ``git_dir`` (bare or not), parsing only unseen blobs"""
+        started = time.perf_counter()
+        commit = run_git(['rev-parse', f"{commit}^{{commit}}"], cwd=git_dir).strip()
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM trees WHERE repo = ? AND commit_sha = ?",
+                                  (repo, commit)).fetchone():
+                return {'commit': commit, 'files': None, 'parsed': 0, 'seconds': 0.0}
+
+        entries = self._ls_tree(git_dir, commit)
+        with self._lock:
+            known = self._known_blobs({blob for _, blob, _ in entries})
+        pending = sorted({blob for _, blob, size in entries if blob not in known and size <= self.MAX_FILE_BYTES})
+        skipped = {blob for _, blob, size in entries if blob not in known and size > self.MAX_FILE_BYTES}
+
+        parsed = {}
+        for i in range(0, len(pending), self.BATCH):
+            for blob, content in self._read_blobs(git_dir, pending[i:i + self.BATCH]).items():
+                parsed[blob] = parse_python(content.decode('utf-8', errors='replace'))
+
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO blobs (blob) VALUES (?)",
+                                   [(blob,) for blob in list(parsed) + list(skipped)])
+            for blob, (symbols, imports, calls) in parsed.items():
+                self._conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       [(blob, *row) for row in symbols])
+                self._conn.executemany("INSERT INTO imports VALUES (?, ?, ?, ?, ?)",
+                                       [(blob, *row) for row in imports])
+                self._conn.executemany("INSERT INTO calls VALUES (?, ?, ?, ?)",
+                                       [(blob, *row) for row in calls])
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                   [(repo, commit, path, blob) for path, blob, _ in entries])
+            self._conn.execute("INSERT OR REPLACE INTO trees VALUES (?, ?, ?)", (repo, commit, time.time()))
+            self._prune_locked(repo)
+            self._conn.commit()
+
+        stats = {'commit': commit, 'files': len(entries), 'parsed': len(parsed),
+                 'seconds': round(time.perf_counter() - started, 3)}
+        self.logger.debug(f"Indexed {repo}@{commit[:12]}: {stats['files']} files, {stats['parsed']} parsed")
+        return stats
+
+    def context_for(self, repo: str, commit: str, hunk: Hunk, token_budget: Optional[int] = None) -> str:
+        """Definitions the hunk refers to and callers of what it defines, packed into a token budget"""
+        budget = self.token_budget if token_budget is None else token_budget
+        code = [line[1:] for line in hunk.lines if line[:1] in ('+', ' ')]
+        defined = {match.group(1) for line in code for match in [DEFINITION.match(line)] if match}
+        names = list(dict.fromkeys(
+            name for line in code for name in IDENTIFIER.findall(line)
+            if name not in IGNORED_NAMES and name not in defined
+        ))
+        if not names and not defined:
+            return ''
+
+        span = (hunk.new_start, hunk.new_start + sum(1 for line in hunk.lines if line[:1] in ('+', ' ')))
+        with self._lock:
+            definitions = self._definitions(repo, commit, names[:200])
+            callers = self._callers(repo, commit, sorted(defined))
+            imported = self._imported_paths(repo, commit, hunk.path)
+
+        ranked = []
+        by_name: Dict[str, List[Tuple]] = {}
+        for row in definitions:
+            path, line = row[0], row[4]
+            if path == hunk.path and span[0] <= line < span[1]:
+                continue  # the hunk itself
+            by_name.setdefault(row[1], []).append(row)
+        for name in names:
+            rows = by_name.get(name, [])
+            local = [row for row in rows if row[0] == hunk.path]
+            if len(rows) > self.MAX_DEFINITIONS:
+                # Too generic to guess which one is meant, unless it lives in the same file
+                rows = local
+            for row in rows:
+                priority = 0 if row[0] == hunk.path else 1 if _matches_module(row[0], imported) else 2
+                ranked.append((priority, row))
+        ranked.sort(key=lambda entry: entry[0])
+
+        sections = [f"# {path}:{line} {kind} {qualname}\n{snippet}"
+                    for priority, (path, _, qualname, kind, line, snippet) in ranked if priority < 2]
+        caller_lines = [f"{path}:{line} in {caller} calls {callee}" for path, caller, callee, line in callers
+                        if not (path == hunk.path and span[0] <= line < span[1])]
+        if caller_lines:
+            sections.append("# Call sites of names defined in this change\n" + '\n'.join(caller_lines))
+        sections.extend(f"# {path}:{line} {kind} {qualname}\n{snippet}"
+                        for priority, (path, _, qualname, kind, line, snippet) in ranked if priority == 2)
+
+        packed, spent = [], 0
+        for section in sections:
+            cost = estimate_tokens(section)
+            if spent + cost > budget:
+                continue
+            packed.append(section)
+            spent += cost
+        return '\n\n'.join(packed)
+
+    def _definitions(self, repo: str, commit: str, names: List[str]) -> List[Tuple]:
+        rows = []
+        for chunk in _chunks(names, self.BATCH):
+            rows.extend(self._conn.execute(
+                "SELECT f.path, s.name, s.qualname, s.kind, s.line, s.snippet FROM symbols s "
+                "JOIN files f ON f.blob = s.blob WHERE f.repo = ? AND f.commit_sha = ? "
+                f"AND s.name IN ({','.join('?' * len(chunk))}) ORDER BY f.path, s.line",
+                (repo, commit, *chunk)
+            ))
+        return rows
+
+    def _callers(self, repo: str, commit: str, names: List[str], limit: int = 30) -> List[Tuple]:
+        if not names:
+            return []
+        return self._conn.execute(
+            "SELECT f.path, c.caller, c.callee, c.line FROM calls c JOIN files f ON f.blob = c.blob "
+            f"WHERE f.repo = ? AND f.commit_sha = ? AND c.callee IN ({','.join('?' * len(names))}) "
+            "ORDER BY f.path, c.line LIMIT ?",
+            (repo, commit, *names, limit)
+        ).fetchall()
+
+    def _imported_paths(self, repo: str, commit: str, path: str) -> Set[str]:
+        """Path suffixes of modules imported by ``path``"""
+        suffixes = set()
+        package = os.path.dirname(path)
+        for module, name in self._conn.execute(
+            "SELECT i.module, i.name FROM imports i JOIN files f ON f.blob = i.blob "
+            "WHERE f.repo = ? AND f.commit_sha = ? AND f.path = ?", (repo, commit, path)
+        ):
+            level = len(module) - len(module.lstrip('.'))
+            base = module.lstrip('.').replace('.', '/')
+            if level:
+                parent = package
+                for _ in range(level - 1):
+                    parent = os.path.dirname(parent)
+                base = '/'.join(part for part in (parent, base) if part)
+            for target in ([base, f"{base}/{name}"] if name else [base]):
+                if target:
+                    suffixes.update({f"{target}.py", f"{target}/__init__.py"})
+        return suffixes
+
+    def _known_blobs(self, blobs: Set[str]) -> Set[str]:
+        known = set()
+        for chunk in _chunks(sorted(blobs), self.BATCH):
+            known.update(row[0] for row in self._conn.execute(
+                f"SELECT blob FROM blobs WHERE blob IN ({','.join('?' * len(chunk))})", chunk))
+        return known
+
+    def _prune_locked(self, repo: str):
+        stale = self._conn.execute(
+            "SELECT commit_sha FROM trees WHERE repo = ? ORDER BY indexed_at DESC LIMIT -1 OFFSET ?",
+            (repo, self.keep_trees)
+        ).fetchall()
+        if not stale:
+            return
+        for (commit,) in stale:
+            self._conn.execute("DELETE FROM files WHERE repo = ? AND commit_sha = ?", (repo, commit))
+            self._conn.execute("DELETE FROM trees WHERE repo = ? AND commit_sha = ?", (repo, commit))
+        for table in ('symbols', 'imports', 'calls', 'blobs'):
+            self._conn.execute(f"DELETE FROM {table} WHERE blob NOT IN (SELECT blob FROM files)")
+
+    def _ls_tree(self, git_dir: str, commit: str) -> List[Tuple[str, str, int]]:
+        """(path, blob, size) of every Python file in the commit"""
+        entries = []
+        output = run_git(['ls-tree', '-r', '-l', '-z', '--full-tree', commit], cwd=git_dir)
+        for record in output.split('\0'):
+            if not record:
+                continue
+            meta, path = record.split('\t', 1)
+            _, kind, blob, size = meta.split()
+            if kind == 'blob' and path.endswith('.py'):
+                entries.append((path, blob, int(size) if size.isdigit() else 0))
+        return entries
+
+    def _read_blobs(self, git_dir: str, blobs: List[str]) -> Dict[str, bytes]:
+        output = run_git(['cat-file', '--batch'], cwd=git_dir, text=False,
+                         input=('\n'.join(blobs) + '\n').encode())
+        contents, pos = {}, 0
+        while pos < len(output):
+            newline = output.index(b'\n', pos)
+            header = output[pos:newline].split()
+            if len(header) < 3:
+                pos = newline + 1
+                continue
+            size = int(header[2])
+            contents[header[0].decode()] = output[newline + 1:newline + 1 + size]
+            pos = newline + 1 + size + 1
+        return contents
+
+
+def parse_python(source: str) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+    """(symbols, imports, calls) rows for one Python file; empty if it does not parse"""
+    try:
+        tree = ast.parse(source)
+        visitor = _SymbolVisitor(source.splitlines())
+        visitor.visit(tree)
+    except (SyntaxError, ValueError):
+        return [], [], []
+    except (RecursionError, MemoryError):
+        # Deeply nested expressions (e.g. generated code) exhaust the parser or the visitor's recursion
+        get_logger().debug("Skipping a Python file too deeply nested to index")
+        return [], [], []
+    return visitor.symbols, visitor.imports, visitor.calls
+
+
+class _SymbolVisitor(ast.NodeVisitor):
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.scope: List[Tuple[str, str]] = []
+        self.symbols: List[Tuple] = []
+        self.imports: List[Tuple] = []
+        self.calls: List[Tuple] = []
+
+    @property
+    def qualname(self) -> str:
+        return '.'.join(name for name, _ in self.scope) or '<module>'
+
+    def _snippet(self, start: int, end: int) -> str:
+        return '\n'.join(self.lines[start - 1:min(end, start - 1 + SymbolIndex.SNIPPET_LINES)])
+
+    def _define(self, node, kind: str):
+        start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+        end = getattr(node, 'end_lineno', None) or node.lineno
+        qualname = '.'.join([name for name, _ in self.scope] + [node.name])
+        self.symbols.append((node.name, qualname, kind, node.lineno, end, self._snippet(start, end)))
+        self.scope.append((node.name, kind))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_ClassDef(self, node):
+        self._define(node, 'class')
+
+    def visit_FunctionDef(self, node):
+        self._define(node, 'method' if self.scope and self.scope[-1][1] == 'class' else 'function')
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        if not self.scope:
+            end = getattr(node, 'end_lineno', None) or node.lineno
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.symbols.append((target.id, target.id, 'variable', node.lineno, end,
+                                         self._snippet(node.lineno, end)))
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.append((alias.name, None, alias.asname, node.lineno))
+
+    def visit_ImportFrom(self, node):
+        module = '.' * node.level + (node.module or '')
+        for alias in node.names:
+            self.imports.append((module, alias.name, alias.asname, node.lineno))
+
+    def visit_Call(self, node):
+        func = node.func
+        callee = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if callee:
+            self.calls.append((self.qualname, callee, node.lineno))
+        self.generic_visit(node)
+
+
+def _matches_module(path: str, suffixes: Set[str]) -> bool:
+    return any(path == suffix or path.endswith('/' + suffix) for suffix in suffixes)
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,15 @@
+import re
+
+# Words, numbers and individual symbols roughly track how BPE tokenizers split code
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate for budgeting before an LLM call.
+
+    Long identifiers usually split into several tokens, so each word counts
+    one token per six characters; every symbol counts as one token.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // 6 for piece in _PIECES.findall(text))
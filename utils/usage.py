@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# USD per million tokens as (input, output); override with LLM_PRICE_INPUT/LLM_PRICE_OUTPUT
+MODEL_PRICING = {
+    'gemini-2.0-flash': (0.10, 0.40),
+    'gemini-2.0-flash-lite': (0.075, 0.30),
+    'gemini-1.5-flash': (0.075, 0.30),
+    'gemini-1.5-pro': (1.25, 5.00),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-pro': (1.25, 10.00),
+}
+
+
+def call_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of one LLM call"""
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    input_price = float(os.environ.get('LLM_PRICE_INPUT', input_price))
+    output_price = float(os.environ.get('LLM_PRICE_OUTPUT', output_price))
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Roll up per-call usage records into a single summary"""
+    summary = _empty_rollup()
+    del summary['reviews']
+    for call in calls:
+        _add_call(summary, call)
+    return _finish(summary)
+
+
+class UsageTracker:
+    """Process-wide LLM usage rollups per repository and per day"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = _empty_rollup()
+        self._by_repo: Dict[str, Dict[str, Any]] = defaultdict(_empty_rollup)
+        self._by_day: Dict[str, Dict[str, Any]] = defaultdict(_empty_rollup)
+
+    def record_review(self, repo_url: str, calls: List[Dict[str, Any]], day: Optional[str] = None):
+        day = day or datetime.now(timezone.utc).date().isoformat()
+        with self._lock:
+            for rollup in (self._totals, self._by_repo[repo_url], self._by_day[day]):
+                rollup['reviews'] += 1
+                for call in calls:
+                    _add_call(rollup, call)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'totals': _finish(dict(self._totals)),
+                'by_repo': {repo: _finish(dict(rollup)) for repo, rollup in self._by_repo.items()},
+                'by_day': {day: _finish(dict(rollup)) for day, rollup in sorted(self._by_day.items())}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._totals = _empty_rollup()
+            self._by_repo.clear()
+            self._by_day.clear()
+
+
+def _empty_rollup() -> Dict[str, Any]:
+    return {
+        'reviews': 0,
+        'calls': 0,
+        'errors': 0,
+        'prompt_tokens': 0,
+        'output_tokens': 0,
+        'estimated_prompt_tokens': 0,
+        'cost_usd': 0.0,
+        'latency_ms_total': 0.0,
+        'latency_ms_max': 0.0
+    }
+
+
+def _add_call(rollup: Dict[str, Any], call: Dict[str, Any]):
+    rollup['calls'] += 1
+    if call.get('status') != 'ok':
+        rollup['errors'] += 1
+    rollup['prompt_tokens'] += call.get('prompt_tokens') or 0
+    rollup['output_tokens'] += call.get('output_tokens') or 0
+    if call.get('prompt_tokens'):
+        # Only calls with actual counts, so estimate_ratio compares like with like
+        rollup['estimated_prompt_tokens'] += call.get('estimated_prompt_tokens') or 0
+    rollup['cost_usd'] += call.get('cost_usd') or 0.0
+    latency = call.get('latency_ms') or 0.0
+    rollup['latency_ms_total'] += latency
+    rollup['latency_ms_max'] = max(rollup['latency_ms_max'], latency)
+
+
+def _finish(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    calls = rollup['calls']
+    rollup['cost_usd'] = round(rollup['cost_usd'], 6)
+    rollup['latency_ms_total'] = round(rollup['latency_ms_total'], 1)
+    rollup['latency_ms_avg'] = round(rollup['latency_ms_total'] / calls, 1) if calls else 0.0
+    # How far the local estimator is off; > 1 means it underestimates
+    rollup['estimate_ratio'] = (
+        round(rollup['prompt_tokens'] / rollup['estimated_prompt_tokens'], 3)
+        if rollup['estimated_prompt_tokens'] and rollup['prompt_tokens'] else None
+    )
+    return rollup
+
+
+usage_tracker = UsageTracker()
@@ -0,0 +1,290 @@
+# watcher.py
+import os
+import json
+import time
+import heapq
+import functools
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from utils.logger import get_logger
+from utils.metrics import registry, span
+from utils.scheduler import DEFAULT_COST, ReviewScheduler
+
+WATCH_POLLS = registry.counter('pr_review_watch_polls_total', 'Watch-mode polls by result', ('result',))
+WATCH_REVIEWS = registry.counter('pr_review_watch_reviews_total', 'Reviews started by watch mode by outcome',
+                                 ('outcome',))
+
+# A head that failed this often is left alone until the PR gets a new push
+MAX_ATTEMPTS = 3
+
+# Seconds between full listings of a repository's open PRs, which drop closed and merged ones from the state
+FULL_SYNC_INTERVAL = 86400
+# PRs not seen in any listing for this many seconds are dropped even if no full listing succeeded
+MAX_PR_AGE = 30 * 86400
+
+
+class WatchState:
+    """Poll cursors per repository and the last reviewed head of each PR, kept in a JSON file"""
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.repos: Dict[str, Dict[str, Any]] = {}
+        # Held by the watcher while it changes entries, so saves from review threads see a consistent state
+        self.lock = threading.RLock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.repos = data.get('repos', {})
+            else:
+                get_logger().warning(f"Ignoring watch state {path} with version {data.get('version')}")
+
+    def repo(self, repo_url: str) -> Dict[str, Any]:
+        with self.lock:
+            return self.repos.setdefault(repo_url, {'etag': None, 'since': None, 'interval': None,
+                                                    'polled_at': None, 'prs': {}})
+
+    def save(self):
+        # Review threads and the poll thread save concurrently; one writer at a time shares the temp file
+        with self.lock:
+            payload = json.dumps({'version': self.VERSION, 'repos': self.repos}, indent=1, sort_keys=True)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                f.write(payload)
+            # Atomic, so a killed watcher never leaves a truncated file behind
+            os.replace(tmp, self.path)
+
+
+class Watcher:
+    """Polls repositories for PRs whose head moved and reviews them.
+
+    Each repository is polled on its own jittered interval: halved after a
+    poll that found new heads, grown by half after a quiet one, and never
+    shorter than the share of the remaining rate limit this repository can
+    spend before the limit resets.
+    
+    Reviews are queued on a ReviewScheduler, priced by ``cost`` (e.g.
+    PRReviewAgent.estimate_cost), so a giant PR does not hold up the small
+    ones pushed after it. Pricing may call the server, so it runs on its own
+    threads and never delays the next poll.
+
+    Polls only ask for PRs updated since the last one, so every
+    ``full_sync`` seconds a repository is listed in full and PRs missing
+    from it (closed or merged) are forgotten, as are PRs not seen for
+    ``max_pr_age`` seconds.
+    """
+
+    def __init__(self, adapter, review: Callable[[str, int], Any], repos: List[str], state: WatchState,
+                 interval: float = 60, min_interval: float = 15, max_interval: float = 900, jitter: float = 0.2,
+                 workers: int = 2, rate_limit_reserve: float = 0.1, review_existing: bool = False,
+                 cost: Optional[Callable[[str, int], float]] = None, scheduler: Optional[ReviewScheduler] = None,
+                 sla: str = 'normal', full_sync: float = FULL_SYNC_INTERVAL, max_pr_age: float = MAX_PR_AGE):
+        self.adapter = adapter
+        self.review = review
+        self.repos = list(dict.fromkeys(repos))
+        self.state = state
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.rate_limit_reserve = rate_limit_reserve
+        self.review_existing = review_existing
+        self.cost = cost
+        self.sla = sla
+        self.full_sync = full_sync
+        self.max_pr_age = max_pr_age
+        self.rate_limit: Optional[Dict[str, float]] = None
+        self.logger = get_logger()
+        self.scheduler = scheduler or ReviewScheduler(workers=workers)
+        self._pricing = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watch-price') if cost else None
+        self._in_flight: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def run(self, once: bool = False, stop: Optional[threading.Event] = None):
+        """Poll until ``stop`` is set; with ``once``, poll every repository a single time and wait for the reviews"""
+        stop = stop or threading.Event()
+        try:
+            if once:
+                for repo_url in self.repos:
+                    self.poll(repo_url)
+                return
+
+            # Spread the first polls over one interval so hundreds of repositories do not start together
+            now = time.time()
+            due = [(now + self._random.uniform(0, self._interval_of(repo_url)), repo_url) for repo_url in self.repos]
+            heapq.heapify(due)
+            while due and not stop.is_set():
+                when, repo_url = due[0]
+                if stop.wait(max(0.0, when - time.time())):
+                    break
+                heapq.heappop(due)
+                delay = self.poll(repo_url)
+                heapq.heappush(due, (time.time() + delay, repo_url))
+        finally:
+            # Priced reviews reach the scheduler before it drains
+            if self._pricing:
+                self._pricing.shutdown(wait=True)
+            self.scheduler.shutdown(wait=True)
+            self.state.save()
+
+    def poll(self, repo_url: str) -> float:
+        """Poll one repository, queue reviews for moved heads, and return the delay until its next poll"""
+        repo = self.state.repo(repo_url)
+        first_poll = not repo.get('polled_at')
+        # Without a cursor or ETag, so a 304 cannot hide that a PR left the list
+        full = first_poll or time.time() - (repo.get('synced_at') or 0) >= self.full_sync
+        try:
+            with span('watch.poll', repo=repo_url, full=full):
+                result = self.adapter.poll_prs(repo_url, since=None if full else repo['since'],
+                                               etag=None if full else repo['etag'])
+        except NotImplementedError:
+            # The server cannot be watched at all; backing off would not help
+            raise
+        except Exception as e:
+            WATCH_POLLS.inc(result='error')
+            self.logger.warning(f"Polling {repo_url} failed: {e}")
+            return self._schedule(repo, 'error')
+
+        self.rate_limit = result.get('rate_limit') or self.rate_limit
+        if result['not_modified']:
+            WATCH_POLLS.inc(result='not_modified')
+            self._enqueue_pending(repo_url, repo)
+            return self._schedule(repo, 'quiet')
+
+        moved = 0
+        now = time.time()
+        with self.state.lock:
+            repo['etag'] = result.get('etag')
+            repo['polled_at'] = now
+            for pr in result['prs']:
+                entry = repo['prs'].setdefault(str(pr['id']), {'reviewed_head': None, 'attempts': 0})
+                entry['seen_at'] = now
+                if entry.get('head_sha') != pr['head_sha']:
+                    entry.update(head_sha=pr['head_sha'], attempts=0)
+                    if first_poll and not self.review_existing:
+                        # Baseline: only pushes after the watch started are reviewed
+                        entry['reviewed_head'] = pr['head_sha']
+                    elif pr['head_sha'] != entry['reviewed_head']:
+                        moved += 1
+                entry['updated_at'] = pr['updated_at']
+                # The server's clock, so skew between hosts cannot make the cursor skip updates
+                if not repo['since'] or pr['updated_at'] > repo['since']:
+                    repo['since'] = pr['updated_at']
+            if full:
+                repo['synced_at'] = now
+            self._forget_closed(repo_url, repo, {str(pr['id']) for pr in result['prs']} if full else None, now)
+
+        WATCH_POLLS.inc(result='changed' if moved else 'unchanged')
+        if moved:
+            self.logger.info(f"{repo_url}: {moved} PRs with new commits")
+        self._enqueue_pending(repo_url, repo)
+        self.state.save()
+        return self._schedule(repo, 'active' if moved else 'quiet')
+
+    def _forget_closed(self, repo_url: str, repo: Dict[str, Any], listed: Optional[Set[str]], now: float):
+        """Drop PRs missing from a full listing (``listed``) or not seen for max_pr_age; called with the state lock"""
+        with self._lock:
+            forgotten = [pr_id for pr_id, entry in repo['prs'].items()
+                         if (repo_url, pr_id) not in self._in_flight
+                         and ((listed is not None and pr_id not in listed)
+                              or now - entry.get('seen_at', now) > self.max_pr_age)]
+        for pr_id in forgotten:
+            del repo['prs'][pr_id]
+        if forgotten:
+            self.logger.debug(f"{repo_url}: forgot {len(forgotten)} closed or inactive PRs")
+
+    def _enqueue_pending(self, repo_url: str, repo: Dict[str, Any]):
+        """Queue every PR whose known head is not reviewed yet, including retries of failed reviews"""
+        with self.state.lock:
+            entries = list(repo['prs'].items())
+        for pr_id, entry in entries:
+            head = entry.get('head_sha')
+            if not head or head == entry['reviewed_head'] or entry['attempts'] >= MAX_ATTEMPTS:
+                continue
+            key = (repo_url, pr_id)
+            # State lock first, as everywhere: saves from review threads must not see a half-updated entry
+            with self.state.lock, self._lock:
+                if key in self._in_flight:
+                    continue
+                self._in_flight[key] = head
+                entry['attempts'] += 1
+            WATCH_REVIEWS.inc(outcome='queued')
+            if self._pricing:
+                self._pricing.submit(self._price_and_submit, repo_url, pr_id, head, entry)
+            else:
+                self._submit(repo_url, pr_id, head, entry, DEFAULT_COST)
+
+    def _price_and_submit(self, repo_url: str, pr_id: str, head: str, entry: Dict[str, Any]):
+        try:
+            cost = self.cost(repo_url, int(pr_id))
+        except Exception as e:
+            self.logger.warning(f"Could not price {repo_url} #{pr_id}, queueing it at the default cost: {e}")
+            cost = DEFAULT_COST
+        try:
+            self._submit(repo_url, pr_id, head, entry, cost)
+        except Exception as e:
+            # Nobody waits on this thread's result, so say it here
+            self.logger.error(f"Could not queue the review of {repo_url} #{pr_id}: {e}")
+
+    def _submit(self, repo_url: str, pr_id: str, head: str, entry: Dict[str, Any], cost: float):
+        try:
+            self.scheduler.submit(repo_url, pr_id, functools.partial(self._review, repo_url, pr_id, head, entry),
+                                  cost=cost, sla=self.sla)
+        except Exception:
+            # Not queued after all, so the next poll may try again
+            with self._lock:
+                self._in_flight.pop((repo_url, pr_id), None)
+            raise
+
+    def _review(self, repo_url: str, pr_id: str, head: str, entry: Dict[str, Any]):
+        try:
+            self.logger.info(f"Reviewing {repo_url} #{pr_id} at {head[:12]}")
+            self.review(repo_url, int(pr_id))
+            with self.state.lock:
+                entry['reviewed_head'] = head
+            WATCH_REVIEWS.inc(outcome='ok')
+        except Exception as e:
+            WATCH_REVIEWS.inc(outcome='error')
+            self.logger.error(f"Review of {repo_url} #{pr_id} failed (attempt {entry['attempts']}): {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop((repo_url, pr_id), None)
+            try:
+                self.state.save()
+            except OSError as e:
+                # The next save writes this review's outcome too
+                self.logger.error(f"Could not save the watch state: {e}")
+
+    def _interval_of(self, repo_url: str) -> float:
+        return self.state.repo(repo_url).get('interval') or self.interval
+
+    def _schedule(self, repo: Dict[str, Any], outcome: str) -> float:
+        interval = repo.get('interval') or self.interval
+        if outcome == 'active':
+            interval = max(self.min_interval, interval / 2)
+        elif outcome == 'error':
+            interval = min(self.max_interval, interval * 2)
+        else:
+            interval = min(self.max_interval, interval * 1.5)
+        repo['interval'] = interval
+
+        delay = max(interval, self._rate_limit_floor())
+        return delay * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _rate_limit_floor(self) -> float:
+        """Shortest per-repository interval that keeps all repositories within the remaining quota"""
+        limit = self.rate_limit
+        if not limit or not limit.get('limit'):
+            return 0.0
+        until_reset = max(1.0, limit['reset'] - time.time()) if limit.get('reset') else 3600.0
+        available = limit['remaining'] - self.rate_limit_reserve * limit['limit']
+        if available <= 0:
+            # Leave the reserve to reviews and humans sharing the token
+            return until_reset
+        return len(self.repos) * until_reset / available